@@ -0,0 +1,28 @@
+import asyncio
+from typing import Optional
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentStep
+from pydantic import PrivateAttr
+
+
+class BoundedAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs at most `max_concurrent_tools` tool calls at once.
+
+    When the model emits several tool calls in one step (one search per
+    team or league), AgentExecutor already runs them with `asyncio.gather`
+    and hands the results back in call order, so the step costs about one
+    search rather than N. This bounds that fan-out: an executor serves a
+    single turn and its steps run one after another, so the cap applies
+    per step.
+    """
+
+    max_concurrent_tools: int = 4
+    _limit: Optional[asyncio.Semaphore] = PrivateAttr(default=None)
+
+    async def _aperform_agent_action(self, *args, **kwargs) -> AgentStep:
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrent_tools)
+        async with self._limit:
+            return await super()._aperform_agent_action(*args, **kwargs)
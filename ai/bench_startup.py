@@ -0,0 +1,146 @@
+"""
+Startup cost benchmark for the AI service.
+
+Imports `main` in fresh interpreters and reports how long the import and
+`build_models()` take, plus the slowest modules each of them pulls in
+(from `python -X importtime`):
+
+    python bench_startup.py --repeat 5
+    python bench_startup.py --max-import 1.5 --max-build 3 --json
+
+The `--max-*` gates exit with status 1 when the median is over budget,
+so the benchmark can track startup cost in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = """
+import json, os, time
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+os.environ.setdefault("TAVILY_API_KEY", "bench")
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.build_models()
+built = time.perf_counter()
+print(json.dumps({"import_s": imported - started, "build_s": built - imported}))
+"""
+
+
+def parse_importtime(stderr: str) -> tuple[list[tuple[str, float]], list[tuple[str, float]]]:
+    """
+    (module, cumulative seconds) for the modules `main` imports directly,
+    and for those `build_models()` imports later, from `-X importtime`.
+    """
+    pending: list[tuple[str, float]] = []
+    by_main: list[tuple[str, float]] = []
+    by_build: list[tuple[str, float]] = []
+    seen_main = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        name = name[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entry = (name.strip(), int(cumulative) / 1e6)
+        # A module is listed after everything it imported
+        if not seen_main:
+            if depth == 1:
+                pending.append(entry)
+            elif depth == 0:
+                if entry[0] == "main":
+                    by_main, seen_main = pending, True
+                pending = []
+        elif depth == 0:
+            by_build.append(entry)
+    return by_main, by_build
+
+
+def probe() -> tuple[dict, tuple[list, list]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing main failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def _slowest(samples: dict[str, list[float]], top: int) -> list[dict]:
+    medians = sorted(
+        ((name, statistics.median(values)) for name, values in samples.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return [{"module": name, "seconds": seconds} for name, seconds in medians[:top]]
+
+
+def run(repeat: int, top: int) -> dict:
+    timings = []
+    by_main: dict[str, list[float]] = {}
+    by_build: dict[str, list[float]] = {}
+    for _ in range(repeat):
+        timing, (main_imports, build_imports) = probe()
+        timings.append(timing)
+        for samples, imported in ((by_main, main_imports), (by_build, build_imports)):
+            for name, seconds in imported:
+                samples.setdefault(name, []).append(seconds)
+
+    def summary(key: str) -> dict:
+        values = [t[key] for t in timings]
+        return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+    return {
+        "repeat": repeat,
+        "import_s": summary("import_s"),
+        "build_s": summary("build_s"),
+        "slowest_imports": _slowest(by_main, top),
+        "deferred_imports": _slowest(by_build, top),
+    }
+
+
+def main_cli(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-import", type=float, help="fail if median `import main` (s) exceeds this")
+    parser.add_argument("--max-build", type=float, help="fail if median build_models() (s) exceeds this")
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, label in (("import_s", "import main"), ("build_s", "build_models()")):
+            t = report[key]
+            print(f"{label:<16} median {t['median'] * 1000:.0f} ms "
+                  f"(min {t['min'] * 1000:.0f}, max {t['max'] * 1000:.0f}, n={report['repeat']})")
+        for key, label in (("slowest_imports", "import main"), ("deferred_imports", "build_models()")):
+            print(f"slowest imports during {label}:")
+            for item in report[key]:
+                print(f"  {item['seconds'] * 1000:8.1f} ms  {item['module']}")
+
+    failures = [
+        f"{key} median {report[key]['median']:.3f}s exceeds {limit}s"
+        for key, limit in (("import_s", args.max_import), ("build_s", args.max_build))
+        if limit is not None and report[key]["median"] > limit
+    ]
+    for failure in failures:
+        print(f"GATE FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
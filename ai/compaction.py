@@ -0,0 +1,179 @@
+import json
+import math
+import re
+from collections import Counter
+from typing import Any
+from urllib.parse import urlsplit
+
+from context_window import TokenEstimator
+from metrics import SEARCH_RESULT_TOKENS, SEARCH_TOKENS_SAVED
+from response_cache import normalize
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+# Fragments shorter than this are joined to the next sentence
+_MIN_PASSAGE_CHARS = 40
+# BM25 term-frequency saturation and length normalisation
+_K1 = 1.2
+_B = 0.75
+# Words per shingle for near-duplicate detection
+_SHINGLE_WORDS = 3
+
+
+def canonical_url(url: str) -> str:
+    """Scheme, `www.`, query string and trailing slash insensitive URL key."""
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc.removeprefix("www.")
+    return host + parts.path.rstrip("/")
+
+
+def split_passages(text: str) -> list[str]:
+    passages: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        current = f"{current} {sentence}" if current else sentence
+        if len(current) >= _MIN_PASSAGE_CHARS:
+            passages.append(current)
+            current = ""
+    if current:
+        passages.append(current)
+    return passages
+
+
+def shingles(words: list[str]) -> frozenset[int]:
+    """Hashed `_SHINGLE_WORDS`-word shingles of `words` (the words themselves if fewer)."""
+    if len(words) < _SHINGLE_WORDS:
+        return frozenset(map(hash, words))
+    return frozenset(hash(tuple(words[i:i + _SHINGLE_WORDS])) for i in range(len(words) - _SHINGLE_WORDS + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+
+def bm25(query: list[str], documents: list[list[str]]) -> list[float]:
+    """Okapi BM25 score of each tokenised document against `query`."""
+    if not documents:
+        return []
+    df = Counter(term for doc in documents for term in set(doc))
+    avgdl = sum(len(doc) for doc in documents) / len(documents) or 1.0
+    n = len(documents)
+    idf = {term: math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5)) for term in set(query)}
+    scores = []
+    for doc in documents:
+        tf = Counter(doc)
+        norm = _K1 * (1 - _B + _B * len(doc) / avgdl)
+        scores.append(sum(idf[t] * tf[t] * (_K1 + 1) / (tf[t] + norm) for t in idf if tf[t]))
+    return scores
+
+
+class ResultCompactor:
+    """
+    Shrinks search results before they enter the agent scratchpad.
+
+    Results repeating an earlier one (same canonical URL, or word
+    shingles at least `max_similarity` Jaccard-similar) are dropped. The remaining
+    contents are split into sentence passages, ranked against the query
+    with BM25, and the best passages are kept, at most
+    `passages_per_result` per result, until the result set reaches
+    `max_tokens`. Kept passages stay in their original order, and only
+    title, URL and Tavily's own answer survive alongside them.
+    """
+
+    def __init__(
+        self,
+        estimator: TokenEstimator,
+        max_tokens: int = 600,
+        passages_per_result: int = 2,
+        max_similarity: float = 0.8,
+    ):
+        self.estimator = estimator
+        self.max_tokens = max_tokens
+        self.passages_per_result = passages_per_result
+        self.max_similarity = max_similarity
+        self.calls = 0
+        self.raw_tokens = 0
+        self.compacted_tokens = 0
+
+    def _count(self, value: Any) -> int:
+        return self.estimator.count(json.dumps(value, ensure_ascii=False))
+
+    def _dedupe(self, results: list[dict]) -> list[dict]:
+        urls: set[str] = set()
+        seen: list[frozenset[int]] = []
+        unique = []
+        for result in results:
+            url = canonical_url(result.get("url") or "")
+            if url and url in urls:
+                continue
+            words = shingles(normalize(f"{result.get('title', '')} {result.get('content', '')}"))
+            if any(jaccard(words, other) >= self.max_similarity for other in seen):
+                continue
+            urls.add(url)
+            seen.append(words)
+            unique.append(result)
+        return unique
+
+    def compact(self, query: str, result: Any) -> Any:
+        """`result` compacted for `query`; anything but a Tavily result set passes through."""
+        if not isinstance(result, dict) or not isinstance(result.get("results"), list):
+            return result
+        results = self._dedupe(result["results"])
+
+        passages = []  # (result index, passage index, text)
+        seen: set[tuple[str, ...]] = set()
+        for i, item in enumerate(results):
+            for j, text in enumerate(split_passages(item.get("content") or "")):
+                key = tuple(normalize(text))
+                if key and key not in seen:
+                    seen.add(key)
+                    passages.append((i, j, text))
+        scores = bm25(normalize(query), [normalize(text) for _, _, text in passages])
+
+        compacted: dict[str, Any] = {"query": result.get("query", query)}
+        if result.get("answer"):
+            compacted["answer"] = result["answer"]
+        budget = self.max_tokens - self._count(compacted)
+        kept: dict[int, list[tuple[int, str]]] = {}
+        # Best passages first; ties go to the higher-ranked result
+        for score, (i, j, text) in sorted(zip(scores, passages), key=lambda item: (-item[0], item[1][:2])):
+            if score <= 0 and kept:
+                break
+            if len(kept.get(i, ())) >= self.passages_per_result:
+                continue
+            cost = self.estimator.count(text)
+            if i not in kept:
+                cost += self._count({"title": results[i].get("title", ""), "url": results[i].get("url", "")})
+            if cost > budget:
+                continue
+            budget -= cost
+            kept.setdefault(i, []).append((j, text))
+
+        compacted["results"] = [
+            {
+                "title": results[i].get("title", ""),
+                "url": results[i].get("url", ""),
+                "content": " ".join(text for _, text in sorted(kept[i])),
+            }
+            for i in sorted(kept)
+        ]
+
+        raw, final = self._count(result), self._count(compacted)
+        self.calls += 1
+        self.raw_tokens += raw
+        self.compacted_tokens += final
+        SEARCH_RESULT_TOKENS.labels("raw").inc(raw)
+        SEARCH_RESULT_TOKENS.labels("compacted").inc(final)
+        SEARCH_TOKENS_SAVED.observe(max(raw - final, 0))
+        return compacted
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "raw_tokens": self.raw_tokens,
+            "compacted_tokens": self.compacted_tokens,
+            "saved_per_call": (self.raw_tokens - self.compacted_tokens) / self.calls if self.calls else 0.0,
+        }
@@ -0,0 +1,48 @@
+import os
+import random
+
+import pytest
+
+# main reads its configuration at import time
+os.environ.setdefault("SESSION_BACKEND", "memory")
+os.environ.setdefault("PREWARM_ENABLED", "false")
+os.environ.setdefault("LEDGER_ENABLED", "false")
+os.environ.setdefault("MEMORY_ENABLED", "false")
+
+
+@pytest.fixture(scope="session")
+def service():
+    """The app with every external backend stubbed (see loadtest.install_stubs), started once."""
+    from fastapi.testclient import TestClient
+
+    import loadtest
+
+    args = loadtest.parse_args(["--llm", "const:0.01", "--search", "const:0.01", "--django", "const:0"])
+    main = loadtest.install_stubs(args, random.Random(0))
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+@pytest.fixture
+def chat(service):
+    _, client = service
+    counter = iter(range(1, 1_000_000))
+
+    def send(message: str, path: str = "/chat", **fields) -> dict:
+        n = next(counter)
+        payload = {
+            "message": message,
+            "session_id": f"00000000-0000-0000-0000-{n:012d}",
+            "user_id": str(n),
+            "access_token": "test",
+            "plan": "PAID",
+            "schema_version": 2,
+            "history": [],
+            "profile": {"favorite_sport": "football", "details": ""},
+            **fields,
+        }
+        response = client.post(path, json=payload)
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return send
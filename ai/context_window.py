@@ -0,0 +1,171 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, get_buffer_string
+from langchain_core.outputs import LLMResult
+
+from session_cache import SessionEntry, Turn
+
+
+class TokenEstimator:
+    """
+    Local token counter calibrated per model against Gemini's own counts.
+
+    Gemini's tokenizer isn't available locally, and `count_tokens` is a
+    network round trip we can't afford per message on every turn. Instead
+    every LLM call reports its real `input_tokens`, and each model's
+    characters-per-token ratio follows those observations with an
+    exponential moving average, starting from `chars_per_token`. Counts
+    for text no particular model will read (`model=None`) use the prior.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0, alpha: float = 0.1):
+        self.chars_per_token = chars_per_token
+        self.alpha = alpha
+        self.ratios: dict[str, float] = {}
+
+    def ratio(self, model: Optional[str] = None) -> float:
+        return self.ratios.get(model, self.chars_per_token) if model else self.chars_per_token
+
+    def count(self, text: str, model: Optional[str] = None) -> int:
+        return math.ceil(len(text) / self.ratio(model))
+
+    def count_turn(self, turn: Turn, model: Optional[str] = None) -> int:
+        return self.count(turn.user_message, model) + self.count(turn.bot_message, model)
+
+    def observe(self, chars: int, tokens: int, model: Optional[str]) -> None:
+        if chars <= 0 or tokens <= 0 or not model:
+            return
+        current = self.ratio(model)
+        self.ratios[model] = current + self.alpha * (chars / tokens - current)
+
+
+@dataclass
+class ContextWindow:
+    messages: list[BaseMessage]
+    summary: str
+    # Estimated tokens of the summary plus the verbatim turns
+    tokens: int
+    # Confirmed turns that fell out of the window and should be summarised
+    overflow: list[Turn]
+
+
+def build_context(
+    entry: SessionEntry,
+    estimator: TokenEstimator,
+    budget: int,
+    recent_turns: int,
+    model: Optional[str] = None,
+) -> ContextWindow:
+    """
+    Pick the newest turns that fit in `budget` tokens of `model` (at most
+    `recent_turns` of them) next to the rolling summary.
+    """
+    turns = entry.all_turns()
+    used = estimator.count(entry.summary, model)
+    keep = 0
+    for turn in reversed(turns):
+        cost = estimator.count_turn(turn, model)
+        if keep >= recent_turns or used + cost > budget:
+            break
+        used += cost
+        keep += 1
+
+    window = turns[len(turns) - keep:] if keep else []
+    messages: list[BaseMessage] = []
+    for turn in window:
+        messages.append(HumanMessage(content=turn.user_message))
+        messages.append(AIMessage(content=turn.bot_message))
+
+    # Only turns Django has stored can move into the persisted summary
+    dropped = len(turns) - keep
+    overflow = [t for t in turns[:dropped] if t.created_at is not None]
+    return ContextWindow(messages=messages, summary=entry.summary, tokens=used, overflow=overflow)
+
+
+SUMMARY_PROMPT = (
+    "Progressively summarise the conversation between a user and SportMate, "
+    "a sports assistant. Extend the existing summary with the new lines and "
+    "return only the new summary. Keep the user's preferences, teams, "
+    "players and open questions; stay under 150 words.\n\n"
+    "Existing summary:\n{summary}\n\n"
+    "New lines:\n{lines}\n\n"
+    "New summary:"
+)
+
+
+async def fold_summary(llm, summary: str, turns: list[Turn]) -> str:
+    """Fold `turns` into `summary` with one call to a tool-free `llm`."""
+    lines = get_buffer_string(
+        [
+            message
+            for turn in turns
+            for message in (HumanMessage(content=turn.user_message), AIMessage(content=turn.bot_message))
+        ],
+        ai_prefix="SportMate",
+    )
+    result = await llm.ainvoke(SUMMARY_PROMPT.format(summary=summary or "(none)", lines=lines))
+    return result.content if isinstance(result.content, str) else str(result.content)
+
+
+class UsageCallback(AsyncCallbackHandler):
+    """
+    Collects Gemini's real token usage over every LLM call of one turn,
+    and the name, duration and error of every tool call the agent makes.
+    """
+
+    def __init__(self, estimator: Optional[TokenEstimator] = None):
+        self.estimator = estimator
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.tool_calls: list[dict] = []
+        # run id -> (prompt characters, model name)
+        self._prompts: dict[Any, tuple[int, Optional[str]]] = {}
+        self._tools: dict[Any, tuple[str, float]] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        self._prompts[run_id] = (
+            sum(len(get_buffer_string(batch)) for batch in messages),
+            (metadata or {}).get("ls_model_name"),
+        )
+
+    async def on_llm_end(self, response: LLMResult, *, run_id, **kwargs) -> None:
+        self.llm_calls += 1
+        chars, model = self._prompts.pop(run_id, (0, None))
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                self.prompt_tokens += usage.get("input_tokens", 0)
+                self.completion_tokens += usage.get("output_tokens", 0)
+                if self.estimator is not None:
+                    self.estimator.observe(chars, usage.get("input_tokens", 0), model)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        # The cached search tool runs Tavily's own tool inside it; count the outer call only
+        if parent_run_id not in self._tools:
+            self._tools[run_id] = ((serialized or {}).get("name") or kwargs.get("name", "tool"), time.perf_counter())
+
+    def _end_tool(self, run_id, error: Optional[BaseException]) -> None:
+        started = self._tools.pop(run_id, None)
+        if started is None:
+            return
+        name, at = started
+        self.tool_calls.append(
+            {
+                "name": name,
+                "seconds": round(time.perf_counter() - at, 4),
+                "error": None if error is None else str(error),
+            }
+        )
+
+    async def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end_tool(run_id, None)
+
+    async def on_tool_error(self, error: BaseException, *, run_id, **kwargs) -> None:
+        self._end_tool(run_id, error)
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from typing import Optional
+
+import httpx
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling Django while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    fail immediately for `reset_timeout` seconds. Then a single trial call
+    is let through (half-open): success closes the circuit, failure opens
+    it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Give up a trial call that ended without a verdict (e.g. cancelled)."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class DjangoClient:
+    """
+    The AI service's one connection pool to Django.
+
+    Keeps connections alive between calls, bounds every call by a total
+    deadline (connect + wait + read), and stops calling Django while
+    it is failing. Every error surfaces as an `httpx.HTTPError`.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        default_deadline: float = 5.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.default_deadline = default_deadline
+        self.breaker = breaker or CircuitBreaker()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self._limits,
+                timeout=self.default_deadline,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        token: Optional[str],
+        *,
+        deadline: Optional[float] = None,
+        headers: Optional[dict] = None,
+        **kwargs,
+    ) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Django circuit open, not calling {path}")
+
+        deadline = deadline or self.default_deadline
+        headers = dict(headers or {})
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+        client = self.open()
+        try:
+            response = await asyncio.wait_for(
+                client.request(
+                    method,
+                    path,
+                    headers=headers,
+                    timeout=deadline,
+                    **kwargs,
+                ),
+                timeout=deadline,
+            )
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            raise httpx.TimeoutException(f"Django {method} {path} exceeded its {deadline}s deadline")
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+
+        # Client errors are the caller's problem, not a sign Django is unhealthy
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def get(self, path: str, token: Optional[str], **kwargs) -> httpx.Response:
+        return await self.request("GET", path, token, **kwargs)
+
+    async def post(self, path: str, token: Optional[str], **kwargs) -> httpx.Response:
+        return await self.request("POST", path, token, **kwargs)
+
+    async def patch(self, path: str, token: Optional[str], **kwargs) -> httpx.Response:
+        return await self.request("PATCH", path, token, **kwargs)
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from metrics import HEDGES
+
+logger = logging.getLogger("sportmate")
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies with a percentile lookup."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def _cancel(*tasks: asyncio.Future) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _race(tasks: dict[str, asyncio.Future]) -> str:
+    """
+    Name of the first task to succeed (an exhausted stream counts as a
+    success); the first error if every task fails. Failed tasks are
+    removed from `tasks`.
+    """
+    error: Optional[BaseException] = None
+    while tasks:
+        done, _ = await asyncio.wait(set(tasks.values()), return_when=asyncio.FIRST_COMPLETED)
+        for name, task in list(tasks.items()):
+            if task not in done:
+                continue
+            exc = task.exception()
+            if exc is None or isinstance(exc, StopAsyncIteration):
+                return name
+            error = error or exc
+            del tasks[name]
+    raise error
+
+
+class HedgedModel(Runnable):
+    """
+    Chat model wrapper that hedges slow calls with a fallback model.
+
+    A call goes to `primary` first. If it has not answered after the
+    `percentile`-th percentile of recent primary latencies (clamped to
+    `min_delay`..`max_delay`; `initial_delay` until `min_samples` are
+    seen), the same call goes to `fallback` too and the first answer wins;
+    the other call is cancelled. A primary that fails outright fails over
+    to `fallback`. Streams are hedged on time to first chunk.
+
+    Primaries cancelled after losing are recorded at the time they had
+    run, which is enough to keep the percentile honest: they are above it
+    either way.
+    """
+
+    def __init__(
+        self,
+        primary: Runnable,
+        fallback: Runnable,
+        *,
+        percentile: float = 90.0,
+        min_delay: float = 1.0,
+        max_delay: float = 10.0,
+        initial_delay: float = 4.0,
+        min_samples: int = 20,
+        trackers: Optional[dict[str, LatencyTracker]] = None,
+        outcomes: Optional[Counter] = None,
+    ):
+        self.primary = primary
+        self.fallback = fallback
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        # Whole-call latency for invoke, time to first chunk for streams
+        self.trackers = trackers or {"invoke": LatencyTracker(), "stream": LatencyTracker()}
+        self.outcomes = outcomes if outcomes is not None else Counter()
+
+    def bind_tools(self, tools: list, **kwargs) -> "HedgedModel":
+        """Bind `tools` to both models, sharing latency history and counts."""
+        return HedgedModel(
+            self.primary.bind_tools(tools, **kwargs),
+            self.fallback.bind_tools(tools, **kwargs),
+            percentile=self.percentile,
+            min_delay=self.min_delay,
+            max_delay=self.max_delay,
+            initial_delay=self.initial_delay,
+            min_samples=self.min_samples,
+            trackers=self.trackers,
+            outcomes=self.outcomes,
+        )
+
+    def delay(self, mode: str) -> float:
+        tracker = self.trackers[mode]
+        if len(tracker) < self.min_samples:
+            return self.initial_delay
+        return min(max(tracker.percentile(self.percentile), self.min_delay), self.max_delay)
+
+    def _count(self, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+        HEDGES.labels(outcome).inc()
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        # Only the async paths serve requests
+        return self.primary.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        calls = {"primary": asyncio.ensure_future(self.primary.ainvoke(input, config, **kwargs))}
+        try:
+            winner = await self._hedge("invoke", calls, lambda: self.fallback.ainvoke(input, config, **kwargs))
+            return calls[winner].result()
+        finally:
+            await _cancel(*calls.values())
+
+    async def astream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs
+    ) -> AsyncIterator[Any]:
+        streams = {"primary": self.primary.astream(input, config, **kwargs).__aiter__()}
+        firsts = {"primary": asyncio.ensure_future(streams["primary"].__anext__())}
+
+        def fallback():
+            streams["fallback"] = self.fallback.astream(input, config, **kwargs).__aiter__()
+            return streams["fallback"].__anext__()
+
+        try:
+            winner = await self._hedge("stream", firsts, fallback)
+            await _cancel(*(task for name, task in firsts.items() if name != winner))
+            try:
+                yield firsts[winner].result()
+            except StopAsyncIteration:
+                return
+            async for chunk in streams[winner]:
+                yield chunk
+        finally:
+            # Cancelling a pending first chunk also ends that stream
+            await _cancel(*firsts.values())
+
+    async def _hedge(
+        self, mode: str, calls: dict[str, asyncio.Future], fallback: Callable[[], Awaitable[Any]]
+    ) -> str:
+        """Run the race for `calls["primary"]`, adding the fallback call as needed."""
+        started = time.monotonic()
+        done, _ = await asyncio.wait(set(calls.values()), timeout=self.delay(mode))
+        primary = calls["primary"]
+        if done and primary.exception() is not None and not isinstance(primary.exception(), StopAsyncIteration):
+            logger.warning("Primary model failed, failing over: %s", primary.exception())
+            del calls["primary"]
+            calls["fallback"] = asyncio.ensure_future(fallback())
+            winner = await _race(calls)
+            self._count("failover")
+            return winner
+        if not done:
+            calls["fallback"] = asyncio.ensure_future(fallback())
+        winner = await _race(dict(calls))
+        # A primary cancelled after losing has still taken this long
+        self.trackers[mode].observe(time.monotonic() - started)
+        self._count(winner if "fallback" in calls else "none")
+        return winner
+
+    def stats(self) -> dict:
+        calls = sum(self.outcomes.values())
+        fired = self.outcomes["primary"] + self.outcomes["fallback"]
+        return {
+            "calls": calls,
+            "outcomes": dict(self.outcomes),
+            "hedge_rate": fired / calls if calls else 0.0,
+            "fallback_win_rate": self.outcomes["fallback"] / fired if fired else 0.0,
+            "delay_s": {mode: round(self.delay(mode), 3) for mode in self.trackers},
+        }
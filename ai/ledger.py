@@ -0,0 +1,110 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+from metrics import ERRORS
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger("sportmate")
+
+
+class RotatingJsonlWriter:
+    """
+    Appends records as JSON lines to `path`, rotating it like
+    `logging.handlers.RotatingFileHandler`: once the file would exceed
+    `max_bytes` it becomes `path.1`, `path.1` becomes `path.2` and so on,
+    keeping `backup_count` old files. Blocking; run it off the event loop.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50_000_000, backup_count: int = 10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = None
+
+    def _rotate(self) -> None:
+        self.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def write(self, records: list[dict]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+            except Exception:
+                # One bad record must not cost the rest of the batch
+                ERRORS.labels("ledger").inc()
+                logger.exception("Skipping unserialisable ledger record")
+        data = "".join(lines).encode()
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+        if self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+            self._file = open(self.path, "ab")
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class TurnLedger:
+    """
+    One JSON line per chat turn, written behind the request.
+
+    `put` only queues the record; a `WriteBehindQueue` hands batches to a
+    worker thread that appends them to this process's rotating file, so a
+    slow disk never holds up a turn. Records still queued at shutdown are
+    flushed by `stop`. A record that cannot be serialised is skipped; any
+    other failed write is logged and its batch dropped.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        max_bytes: int = 50_000_000,
+        backup_count: int = 10,
+        max_batch: int = 200,
+        max_delay: float = 1.0,
+        max_queue: int = 10_000,
+    ):
+        # One file per worker process: rotation isn't safe across processes
+        self.writer = RotatingJsonlWriter(
+            os.path.join(directory, f"turns-{os.getpid()}.jsonl"), max_bytes, backup_count
+        )
+        self.queue = WriteBehindQueue(self._write, max_batch=max_batch, max_delay=max_delay, max_queue=max_queue)
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def put(self, record: dict) -> None:
+        self.queue.put(record)
+
+    async def _write(self, batch: list[dict]) -> None:
+        try:
+            await asyncio.to_thread(self.writer.write, batch)
+        except Exception:
+            ERRORS.labels("ledger").inc()
+            logger.exception("Writing %d ledger records failed", len(batch))
+
+    def start(self) -> None:
+        self.queue.start()
+
+    async def stop(self, timeout: Optional[float] = 10.0) -> None:
+        await self.queue.stop(timeout)
+        await asyncio.to_thread(self.writer.close)
+
+    def stats(self) -> dict:
+        return {"path": self.writer.path, "queued": len(self.queue), "written": self.queue.sent}
@@ -0,0 +1,246 @@
+"""
+Offline summary of the per-turn ledger written by the AI service.
+
+Reads the JSONL files `ledger.TurnLedger` writes (every worker's current
+and rotated files when given a directory) and reports latency percentiles
+per route and per model, token usage and its cost, tool call latencies,
+and the slowest and costliest sessions:
+
+    python ledger_report.py ledger/
+    python ledger_report.py ledger/ --since 2026-10-18T00:00 --top 10
+    python ledger_report.py ledger/turns-4242.jsonl --price gemini-2.5-flash=0.3,2.5 --json
+
+Prices are USD per million input and output tokens per model (Gemini 2.5
+Flash and Flash-Lite list prices by default; `--input-price` and
+`--output-price` for any other model) plus an optional flat price per
+tool call for search.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
+# USD per million (input, output) tokens
+PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+
+
+def ledger_files(paths: Iterable[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "turns-*.jsonl*"))))
+        else:
+            files.append(path)
+    return files
+
+
+def read_records(files: Iterable[str], since: Optional[str] = None) -> tuple[list[dict], int]:
+    """(records at or after `since`, number of unreadable lines)."""
+    records: list[dict] = []
+    bad = 0
+    for name in files:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A worker killed mid-write leaves a partial last line
+                    bad += 1
+                    continue
+                if since is None or record.get("ts", "") >= since:
+                    records.append(record)
+    records.sort(key=lambda record: record.get("ts", ""))
+    return records, bad
+
+
+def percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+
+    def pct(p: float) -> Optional[float]:
+        # Nearest-rank percentile
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else None
+
+    return {"p50_s": pct(50), "p95_s": pct(95), "p99_s": pct(99), "max_s": ordered[-1] if ordered else None}
+
+
+def summarize(records: list[dict], args: argparse.Namespace) -> dict:
+    prices = PRICES | dict(args.price)
+
+    def cost(record: dict) -> float:
+        input_price, output_price = prices.get(record.get("model"), (args.input_price, args.output_price))
+        return (
+            record.get("prompt_tokens", 0) * input_price / 1e6
+            + record.get("completion_tokens", 0) * output_price / 1e6
+            + len(record.get("tool_calls", ())) * args.tool_price
+        )
+
+    ok = [record for record in records if record.get("status") == 200]
+    by_route: dict[str, list[dict]] = defaultdict(list)
+    by_model: dict[str, list[dict]] = defaultdict(list)
+    for record in ok:
+        by_route[record.get("route") or "unknown"].append(record)
+        by_model[record.get("model") or "none"].append(record)
+
+    tools: dict[str, list[dict]] = defaultdict(list)
+    for record in records:
+        for call in record.get("tool_calls", ()):
+            tools[call["name"]].append(call)
+
+    sessions: dict[str, dict] = {}
+    for record in records:
+        session_id = record.get("session_id")
+        if session_id not in sessions:
+            sessions[session_id] = dict.fromkeys(("turns", "total_s", "max_s", "errors", "tokens", "cost_usd"), 0)
+            sessions[session_id]["session_id"] = session_id
+        session = sessions[session_id]
+        session["turns"] += 1
+        session["total_s"] += record.get("total_s", 0.0)
+        session["max_s"] = max(session["max_s"], record.get("total_s", 0.0))
+        session["errors"] += record.get("status") != 200
+        session["tokens"] += record.get("prompt_tokens", 0) + record.get("completion_tokens", 0)
+        session["cost_usd"] += cost(record)
+    for session in sessions.values():
+        session["mean_s"] = session["total_s"] / session["turns"]
+
+    def breakdown(groups: dict[str, list[dict]]) -> dict:
+        return {
+            key: {
+                "turns": len(items),
+                **percentiles([record["total_s"] for record in items]),
+                "mean_tokens": sum(r.get("prompt_tokens", 0) + r.get("completion_tokens", 0) for r in items)
+                / len(items),
+                "cost_usd": sum(cost(record) for record in items),
+            }
+            for key, items in sorted(groups.items())
+        }
+
+    prompt = sum(record.get("prompt_tokens", 0) for record in records)
+    completion = sum(record.get("completion_tokens", 0) for record in records)
+    total_cost = sum(cost(record) for record in records)
+    return {
+        "turns": len(records),
+        "first": records[0].get("ts") if records else None,
+        "last": records[-1].get("ts") if records else None,
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "statuses": {str(k): v for k, v in sorted(Counter(record.get("status") for record in records).items())},
+        "top_errors": Counter(record["error"] for record in records if record.get("error")).most_common(args.top),
+        "latency": percentiles([record["total_s"] for record in ok]),
+        "routes": breakdown(by_route),
+        "models": breakdown(by_model),
+        "tokens": {
+            "prompt": prompt,
+            "completion": completion,
+            "per_turn": (prompt + completion) / len(records) if records else 0.0,
+        },
+        "cost_usd": {"total": total_cost, "per_turn": total_cost / len(records) if records else 0.0},
+        "tools": {
+            name: {
+                "calls": len(calls),
+                "errors": sum(1 for call in calls if call.get("error")),
+                **percentiles([call["seconds"] for call in calls]),
+            }
+            for name, calls in sorted(tools.items())
+        },
+        "tool_calls_per_turn": sum(len(calls) for calls in tools.values()) / len(records) if records else 0.0,
+        "slowest_sessions": sorted(sessions.values(), key=lambda s: -s["max_s"])[: args.top],
+        "costliest_sessions": sorted(sessions.values(), key=lambda s: -s["cost_usd"])[: args.top],
+        "slowest_turns": [
+            {key: record.get(key) for key in ("ts", "session_id", "route", "model", "status", "total_s", "turn_id")}
+            | {"tool_s": round(sum(call["seconds"] for call in record.get("tool_calls", ())), 3)}
+            for record in sorted(records, key=lambda record: -record.get("total_s", 0.0))[: args.top]
+        ],
+    }
+
+
+def print_report(report: dict) -> None:
+    def fmt(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    def latency(stats: dict) -> str:
+        return (f"p50 {fmt(stats['p50_s'])}  p95 {fmt(stats['p95_s'])}  "
+                f"p99 {fmt(stats['p99_s'])}  max {fmt(stats['max_s'])}")
+
+    print(f"turns        {report['turns']} from {report['first']} to {report['last']}")
+    print(f"statuses     {report['statuses']} (error rate {report['error_rate']:.1%})")
+    for error, count in report["top_errors"]:
+        print(f"  {count:>6}x  {error[:100]}")
+    print(f"latency      {latency(report['latency'])}")
+    for route, stats in report["routes"].items():
+        print(f"  {route:<10} {stats['turns']:>6} turns  {latency(stats)}  "
+              f"{stats['mean_tokens']:.0f} tok/turn  ${stats['cost_usd']:.4f}")
+    print("models")
+    for model, stats in report["models"].items():
+        print(f"  {model:<22} {stats['turns']:>6} turns  {latency(stats)}  "
+              f"{stats['mean_tokens']:.0f} tok/turn  ${stats['cost_usd']:.4f}")
+    tokens, cost = report["tokens"], report["cost_usd"]
+    print(f"tokens       {tokens['prompt']} prompt + {tokens['completion']} completion "
+          f"({tokens['per_turn']:.0f} per turn)")
+    print(f"cost         ${cost['total']:.4f} (${cost['per_turn'] * 1000:.3f} per 1k turns)")
+    print(f"tools        {report['tool_calls_per_turn']:.2f} calls per turn")
+    for name, stats in report["tools"].items():
+        print(f"  {name:<20} {stats['calls']:>6} calls  {stats['errors']} errors  {latency(stats)}")
+    print("slowest sessions")
+    for s in report["slowest_sessions"]:
+        print(f"  {s['session_id']}  {s['turns']} turns  max {fmt(s['max_s'])}  mean {fmt(s['mean_s'])}  "
+              f"{s['errors']} errors")
+    print("costliest sessions")
+    for s in report["costliest_sessions"]:
+        print(f"  {s['session_id']}  {s['turns']} turns  {s['tokens']} tokens  ${s['cost_usd']:.4f}")
+    print("slowest turns")
+    for t in report["slowest_turns"]:
+        print(f"  {t['ts']}  {t['session_id']}  {t['route']}  {t['model']}  {t['status']}  {fmt(t['total_s'])} "
+              f"(tools {fmt(t['tool_s'])})")
+
+
+def _price(spec: str) -> tuple[str, tuple[float, float]]:
+    try:
+        model, prices = spec.split("=", 1)
+        input_price, output_price = (float(price) for price in prices.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected MODEL=IN,OUT, got {spec!r}") from None
+    return model, (input_price, output_price)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", default=[os.getenv("LEDGER_DIR", "ledger")],
+                        help="ledger files or directories (default: $LEDGER_DIR or ./ledger)")
+    parser.add_argument("--since", help="only turns at or after this ISO timestamp (UTC)")
+    parser.add_argument("--top", type=int, default=5, help="sessions, turns and errors to list")
+    parser.add_argument("--price", type=_price, action="append", default=[], metavar="MODEL=IN,OUT",
+                        help="USD per million prompt and completion tokens for MODEL (repeatable)")
+    parser.add_argument("--input-price", type=float, default=0.30,
+                        help="USD per million prompt tokens for models without a price")
+    parser.add_argument("--output-price", type=float, default=2.50,
+                        help="USD per million completion tokens for models without a price")
+    parser.add_argument("--tool-price", type=float, default=0.0, help="USD per tool call (e.g. a Tavily search)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main_cli(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    files = ledger_files(args.paths)
+    if not files:
+        print(f"No ledger files under {' '.join(args.paths)}", file=sys.stderr)
+        return 1
+    records, bad = read_records(files, args.since)
+    if bad:
+        print(f"Skipped {bad} unreadable lines", file=sys.stderr)
+    report = summarize(records, args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,440 @@
+"""
+Offline load generator for the AI service.
+
+Drives `/chat` in-process through httpx's ASGI transport, with Gemini,
+Tavily and the Django callbacks replaced by stubs whose latencies follow
+configurable distributions, so it needs no network or API keys:
+
+    python loadtest.py --concurrency 32 --requests 500
+    python loadtest.py --rate 20 --duration 60 --llm lognormal:0.8,0.5
+    python loadtest.py --concurrency 16 --max-p95 2.5 --min-rps 10
+    python loadtest.py --llm lognormal:0.8,1.0 --fallback-llm lognormal:0.5,0.3
+
+`--concurrency` runs a closed loop (N users, each sending its next
+message as soon as the last is answered); `--rate` runs an open loop of
+Poisson arrivals. Latency specs are `const:S`, `uniform:LO,HI`,
+`exp:MEAN` or `lognormal:MEDIAN,SIGMA`, all in seconds. With `--url` the
+same load is sent to a running service instead, without stubs. With
+`--fallback-llm`, LLM calls are hedged with a second stub model as in
+production (see hedging.HedgedModel) and the report says how often
+hedging fired and won on each model tier. `--plans` and `--lite-llm`
+shape the tier mix (see model_pool.ModelPool).
+
+The `--max-*` / `--min-rps` gates make the process exit with status 1
+when violated, so a run can fail a CI job.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Any, Optional
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+# Mix of messages the router sends to the agent and to the direct path
+MESSAGES = [
+    "what was the score of the arsenal game last night",
+    "latest transfer news for chelsea",
+    "who won the f1 race this weekend",
+    "is messi playing tonight",
+    "current premier league table",
+    "any updates on mbappe's injury",
+    "scores for arsenal and chelsea and liverpool today",
+    "explain the offside rule",
+    "how is a tennis tiebreak scored",
+    "give me tips to improve my free throws",
+    "what does lbw mean in cricket",
+    "recommend a workout for sprinters",
+    "tell me about the history of the world cup",
+]
+SPORTS = ["soccer", "basketball", "tennis", "cricket", "formula 1"]
+
+
+class Latency:
+    """Sampler for a latency spec such as `lognormal:0.8,0.5`."""
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, _, args = spec.partition(":")
+        params = [float(a) for a in args.split(",") if a]
+        samplers = {
+            "const": lambda s: s,
+            "uniform": lambda lo, hi: rng.uniform(lo, hi),
+            "exp": lambda mean: rng.expovariate(1 / mean),
+            "lognormal": lambda median, sigma: rng.lognormvariate(math.log(median), sigma),
+        }
+        if kind not in samplers:
+            raise argparse.ArgumentTypeError(f"Unknown latency distribution {kind!r}")
+        self._sample = lambda: samplers[kind](*params)
+        self._sample()
+
+    def __call__(self) -> float:
+        return max(0.0, self._sample())
+
+    async def sleep(self) -> None:
+        await asyncio.sleep(self())
+
+
+# ---------------------------------------------------------------------
+# Stub backends
+# ---------------------------------------------------------------------
+class StubChatModel(BaseChatModel):
+    """
+    Stand-in for Gemini. With tools bound (the agent binds them in OpenAI
+    format) it asks for one search per " and "-separated topic before
+    answering, as the agent does for live questions; without tools it
+    answers straight away. Reports usage like the real model.
+    """
+
+    latency: Any
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        raise NotImplementedError("StubChatModel is async-only")
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager=None,
+        tools: Optional[list[dict]] = None,
+        **kwargs,
+    ) -> ChatResult:
+        await self.latency.sleep()
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        if tools and not any(isinstance(m, ToolMessage) for m in messages):
+            # The question itself, without the profile lines the service appends
+            question = str(messages[-1].content).splitlines()[0][:200]
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {"name": tools[0]["function"]["name"], "args": {"query": topic}, "id": f"call_{uuid.uuid4().hex[:12]}"}
+                    for topic in question.split(" and ")
+                ],
+            )
+        else:
+            message = AIMessage(content=" ".join(["word"] * self.answer_words))
+        message.usage_metadata = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": len(str(message.content)) // 4,
+            "total_tokens": (prompt_chars + len(str(message.content))) // 4,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class StubSearch(BaseTool):
+    """Stand-in for TavilySearch returning a fixed-shape result set."""
+
+    name: str = "tavily_search"
+    description: str = "Search the web for current sports information."
+    latency: Any
+
+    def _run(self, query: str) -> dict:
+        raise NotImplementedError("StubSearch is async-only")
+
+    async def _arun(self, query: str) -> dict:
+        await self.latency.sleep()
+        results = [
+            {
+                "title": f"Result {i}",
+                "url": f"https://example.com/{i}",
+                "content": " ".join(
+                    f"Report {i}.{j} on {query}." if j % 3 == 0 else f"Unrelated filler sentence {i}.{j} for length."
+                    for j in range(12)
+                ),
+                "score": 0.9 - i / 10,
+                "raw_content": None,
+            }
+            for i in range(5)
+        ]
+        # Tavily often returns the same story syndicated on another site
+        results.append({**results[0], "url": "https://www.example.com/0/?utm_source=feed", "score": 0.35})
+        return {
+            "query": query,
+            "follow_up_questions": None,
+            "answer": None,
+            "images": [],
+            "results": results,
+            "response_time": 1.2,
+        }
+
+
+def django_stub(latency: Latency) -> httpx.MockTransport:
+    """Stand-in for the Django callbacks used by the AI service."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await latency.sleep()
+        path = request.url.path
+        if path.startswith("/auth/about/"):
+            return httpx.Response(200, json={"favorite_sport": "soccer", "details": "Plays on weekends"})
+        if path.startswith("/auth/favorite-sports/"):
+            return httpx.Response(200, json=[{"sport": sport, "users": 100 - i} for i, sport in enumerate(SPORTS)])
+        if path.startswith("/c/chat-summary/"):
+            return httpx.Response(200, json={"summary": "", "summary_until": None})
+        if path.startswith("/c/memory-turns/"):
+            # Every user has a few dozen turns spread over earlier sessions
+            return httpx.Response(200, json=[] if "after" in request.url.params else [
+                {
+                    "id": str(uuid.UUID(int=n)),
+                    "session_id": f"past-{n % 5}",
+                    "user_message": MESSAGES[n % len(MESSAGES)],
+                    "bot_message": " ".join(["word"] * 40),
+                    "created_at": f"2025-01-01T00:{n // 60:02d}:{n % 60:02d}Z",
+                }
+                for n in range(40)
+            ])
+        if path.startswith("/c/chat-history/bulk/"):
+            return httpx.Response(201, json={"created": len(json.loads(request.content)["turns"])})
+        if path.startswith("/c/chat-history/"):
+            return httpx.Response(200, json=[])
+        return httpx.Response(404, json={"detail": "Not found."})
+
+    return httpx.MockTransport(handler)
+
+
+def install_stubs(args: argparse.Namespace, rng: random.Random):
+    """Import the service with every external backend replaced by a stub."""
+    os.environ.setdefault("GOOGLE_API_KEY", "loadtest")
+    os.environ.setdefault("TAVILY_API_KEY", "loadtest")
+    # The Django stub accepts any service token; one is needed for turns to be mirrored
+    os.environ.setdefault("AI_SERVICE_TOKEN", "loadtest")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    main.search_tool = StubSearch(latency=Latency(args.search, rng))
+    main.tools = main.make_tools(main.search_tool)
+    tiers = {}
+    for tier, latency in ((main.STANDARD_TIER, args.llm), (main.LITE_TIER, args.lite_llm or args.llm)):
+        llm = StubChatModel(latency=Latency(latency, rng))
+        if tier is main.LITE_TIER:
+            main.summary_llm = llm
+        if args.fallback_llm:
+            llm = main.hedged(llm, StubChatModel(latency=Latency(args.fallback_llm, rng)))
+        tiers[tier.name] = main.tier_models(tier, llm)
+    main.models = main.ModelPool(tiers, main.MODEL_TIERS)
+    main.django_api._transport = django_stub(Latency(args.django, rng))
+    return main
+
+
+# ---------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.statuses: Counter = Counter()
+        self.routes: Counter = Counter()
+        self.models: Counter = Counter()
+        self.started = time.perf_counter()
+        self.finished = self.started
+
+    def record(self, status: int, seconds: float, body: Optional[dict]) -> None:
+        self.statuses[status] += 1
+        if status == 200:
+            self.latencies.append(seconds)
+            self.routes[(body or {}).get("route") or "unknown"] += 1
+            self.models[(body or {}).get("model") or "none"] += 1
+        self.finished = time.perf_counter()
+
+    def report(self) -> dict:
+        ordered = sorted(self.latencies)
+        total = sum(self.statuses.values())
+        elapsed = max(self.finished - self.started, 1e-9)
+
+        def pct(p: float) -> Optional[float]:
+            # Nearest-rank percentile
+            return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] if ordered else None
+
+        return {
+            "requests": total,
+            "ok": len(ordered),
+            "error_rate": (total - len(ordered)) / total if total else 0.0,
+            "elapsed_s": elapsed,
+            "throughput_rps": len(ordered) / elapsed,
+            "p50_s": pct(50),
+            "p95_s": pct(95),
+            "p99_s": pct(99),
+            "max_s": ordered[-1] if ordered else None,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "routes": dict(self.routes),
+            "models": dict(self.models),
+        }
+
+
+def make_payload(n: int, args: argparse.Namespace, rng: random.Random) -> dict:
+    session = n % args.sessions
+    payload = {
+        "message": rng.choice(MESSAGES),
+        "session_id": str(uuid.UUID(int=session + 1)),
+        "user_id": session + 1,
+        "access_token": "loadtest",
+        "plan": rng.choice(args.plans),
+    }
+    if not args.pull:
+        # Context pushed by Django as in production (schema v2)
+        payload.update(
+            schema_version=2,
+            history=[],
+            profile={"favorite_sport": SPORTS[session % len(SPORTS)], "details": ""},
+        )
+    return payload
+
+
+async def send(client: httpx.AsyncClient, payload: dict, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    try:
+        response = await client.post("/chat", json=payload)
+        body = response.json() if response.status_code == 200 else None
+        recorder.record(response.status_code, time.perf_counter() - started, body)
+    except httpx.HTTPError:
+        recorder.record(0, time.perf_counter() - started, None)
+
+
+async def closed_loop(client, args, rng, recorder, deadline: Optional[float]) -> None:
+    counter = itertools.count()
+
+    async def user() -> None:
+        while True:
+            n = next(counter)
+            if n >= args.requests or (deadline and time.perf_counter() > deadline):
+                return
+            await send(client, make_payload(n, args, rng), recorder)
+
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+
+async def open_loop(client, args, rng, recorder, deadline: Optional[float]) -> None:
+    tasks = []
+    for n in range(args.requests):
+        if deadline and time.perf_counter() > deadline:
+            break
+        tasks.append(asyncio.create_task(send(client, make_payload(n, args, rng), recorder)))
+        await asyncio.sleep(rng.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    main = lifespan = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        main = install_stubs(args, rng)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://loadtest", timeout=args.timeout
+        )
+        lifespan = main.lifespan(main.app)
+        await lifespan.__aenter__()
+
+    try:
+        async with client:
+            deadline = time.perf_counter() + args.duration if args.duration else None
+            recorder.started = time.perf_counter()
+            loop = open_loop if args.rate else closed_loop
+            await loop(client, args, rng, recorder, deadline)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    report = recorder.report()
+    if main is not None and args.fallback_llm:
+        report["hedging"] = {name: models.plain.stats() for name, models in main.models.tiers.items()}
+    return report
+
+
+def check_gates(report: dict, args: argparse.Namespace) -> list[str]:
+    failures = []
+    for key, limit in (("p95_s", args.max_p95), ("p99_s", args.max_p99)):
+        if limit is not None and (report[key] is None or report[key] > limit):
+            failures.append(f"{key}={report[key]} exceeds {limit}")
+    if args.min_rps is not None and report["throughput_rps"] < args.min_rps:
+        failures.append(f"throughput_rps={report['throughput_rps']:.2f} below {args.min_rps}")
+    if report["error_rate"] > args.max_error_rate:
+        failures.append(f"error_rate={report['error_rate']:.3f} exceeds {args.max_error_rate}")
+    return failures
+
+
+def print_report(report: dict) -> None:
+    def fmt(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    print(f"requests     {report['requests']} ({report['ok']} ok, error rate {report['error_rate']:.1%})")
+    print(f"throughput   {report['throughput_rps']:.2f} req/s over {report['elapsed_s']:.1f} s")
+    print(f"latency      p50 {fmt(report['p50_s'])}  p95 {fmt(report['p95_s'])}  "
+          f"p99 {fmt(report['p99_s'])}  max {fmt(report['max_s'])}")
+    print(f"statuses     {report['statuses']}")
+    print(f"routes       {report['routes']}")
+    print(f"models       {report['models']}")
+    for tier, hedging in report.get("hedging", {}).items():
+        print(f"hedging      {tier}: fired on {hedging['hedge_rate']:.1%} of {hedging['calls']} LLM calls, "
+              f"fallback won {hedging['fallback_win_rate']:.1%} ({hedging['outcomes']})")
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=16, help="closed loop: concurrent users")
+    load.add_argument("--rate", type=float, help="open loop: mean arrivals per second")
+    parser.add_argument("--requests", type=int, default=200, help="total requests to send")
+    parser.add_argument("--duration", type=float, help="stop sending after this many seconds")
+    parser.add_argument("--sessions", type=int, default=50, help="distinct chat sessions")
+    parser.add_argument("--plans", nargs="+", default=["PAID", "TRIAL", "FREE"])
+    parser.add_argument("--pull", action="store_true", help="send schema v1 payloads so context is fetched from Django")
+    parser.add_argument("--llm", default="lognormal:0.8,0.4", help="Gemini call latency (standard tier)")
+    parser.add_argument("--lite-llm", help="Gemini call latency on the lite tier (default: --llm)")
+    parser.add_argument("--fallback-llm", help="hedge LLM calls with a fallback model of this latency")
+    parser.add_argument("--search", default="lognormal:1.2,0.5", help="Tavily search latency")
+    parser.add_argument("--django", default="lognormal:0.03,0.5", help="Django callback latency")
+    parser.add_argument("--url", help="load a running service instead of the stubbed in-process app")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p95", type=float, help="fail if p95 latency (s) exceeds this")
+    parser.add_argument("--max-p99", type=float, help="fail if p99 latency (s) exceeds this")
+    parser.add_argument("--min-rps", type=float, help="fail if throughput falls below this")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="fail above this share of non-200s")
+    args = parser.parse_args(argv)
+    for name in ("llm", "search", "django"):
+        # Fail fast on a malformed spec
+        try:
+            Latency(getattr(args, name), random.Random())
+        except (argparse.ArgumentTypeError, ValueError, TypeError) as e:
+            parser.error(f"--{name}: bad latency spec {getattr(args, name)!r} ({e})")
+    return args
+
+
+def main_cli(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    failures = check_gates(report, args)
+    for failure in failures:
+        print(f"GATE FAILED: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,16 +1,54 @@
 import os
+import json
+import secrets
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import ExitStack, aclosing, asynccontextmanager, contextmanager, nullcontext
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Optional
 from dotenv import load_dotenv
 import httpx
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_tavily import TavilySearch
-from langchain.agents import create_openai_tools_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.memory import ConversationBufferMemory
-from langchain.memory.chat_message_histories import ChatMessageHistory
-from langchain.schema import HumanMessage, AIMessage
+
+from compaction import ResultCompactor
+from django_client import CircuitBreaker, DjangoClient
+from prewarm import Prewarmer
+from hedging import HedgedModel
+from ledger import TurnLedger
+from memory import HashingEmbedder, LongTermMemory, Memory
+from memprof import HeapProfiler, deep_sizeof, heap_summary
+from model_pool import ModelPool, ModelTier, TierModels, parse_plan_tiers
+from metrics import (
+    CACHE_ENTRIES,
+    DEADLINES_EXCEEDED,
+    ERRORS,
+    MODEL_TURNS,
+    ROUTES,
+    ROUTE_SECONDS,
+    SHED,
+    STAGE_SECONDS,
+    MetricsMiddleware,
+)
+from context_window import TokenEstimator, UsageCallback, build_context, fold_summary
+from schemas import BatchRequest, ChatResponse, HistoryTurn, Profile, UserMessage
+from response_cache import ResponseCache
+from router import Route, Router
+from scheduler import Overloaded, PriorityScheduler, Slot
+from search_cache import SearchCache, Speculation, cached_search_tool, classify_query, speculate
+from session_cache import SessionEntry, Turn
+from session_store import MemorySessionStore, open_session_store
+from write_behind import WriteBehindQueue
+
+if TYPE_CHECKING:
+    from agent_executor import BoundedAgentExecutor
 
 # ---------------------------------------------------------------------
 # 0.  Load secrets / config
@@ -19,146 +57,1419 @@ load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 DJANGO_BASE = os.getenv("DJANGO_BASE", "http://127.0.0.1:8000")
+# Where session context lives: "redis" (shared by all workers, falls back
+# to memory if Redis is unreachable at startup) or "memory" (per worker)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "redis")
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "1800"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "600"))
+# How long one worker may hold a session's summary fold before another can retry it
+SUMMARY_FOLD_TTL = float(os.getenv("SUMMARY_FOLD_TTL", "60"))
+# Long-term memory: up to MEMORY_TOP_K past exchanges from the user's other
+# sessions, the most similar to the new message (cosine >= MEMORY_MIN_SCORE),
+# go into the prompt within MEMORY_MAX_TOKENS. Each worker indexes the
+# latest MEMORY_MAX_TURNS turns of its MEMORY_MAX_USERS most active users,
+# at MEMORY_EMBEDDING_DIM x 4 bytes per turn (256 MB at most by default).
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() in ("1", "true", "yes")
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.15"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "400"))
+MEMORY_MAX_USERS = int(os.getenv("MEMORY_MAX_USERS", "256"))
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "500"))
+MEMORY_SYNC_INTERVAL = float(os.getenv("MEMORY_SYNC_INTERVAL", "300"))
+MEMORY_EMBEDDING_DIM = int(os.getenv("MEMORY_EMBEDDING_DIM", "512"))
+# Tokens allowed for the rolling summary plus verbatim history per turn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "8"))
+# Seconds a search result stays fresh, per query class
+SEARCH_TTLS = {
+    "live": float(os.getenv("SEARCH_TTL_LIVE", "60")),
+    "news": float(os.getenv("SEARCH_TTL_NEWS", "900")),
+    "general": float(os.getenv("SEARCH_TTL_GENERAL", "21600")),
+}
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+# Search results are deduplicated and cut to their passages most relevant
+# to the query, at most SEARCH_RESULT_MAX_TOKENS per search, as they are
+# cached; see compaction.ResultCompactor
+SEARCH_COMPACTION = os.getenv("SEARCH_COMPACTION", "true").lower() in ("1", "true", "yes")
+SEARCH_RESULT_MAX_TOKENS = int(os.getenv("SEARCH_RESULT_MAX_TOKENS", "600"))
+SEARCH_PASSAGES_PER_RESULT = int(os.getenv("SEARCH_PASSAGES_PER_RESULT", "2"))
+# Background refresh of hot searches: the most asked queries plus
+# standard queries for the PREWARM_SPORTS favourite sports with the most
+# recent turns, refreshed only while in demand. Each refresh costs a
+# Tavily call, so it is off unless set; see prewarm.Prewarmer.
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+PREWARM_MAX_QUERIES = int(os.getenv("PREWARM_MAX_QUERIES", "20"))
+PREWARM_SPORTS = int(os.getenv("PREWARM_SPORTS", "3"))
+PREWARM_MIN_INTERVAL = float(os.getenv("PREWARM_MIN_INTERVAL", "15"))
+# Opt-in: start the search for live-score questions alongside the first
+# LLM call; the agent's tool call reuses it if its query overlaps enough
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_MIN_OVERLAP = float(os.getenv("SPECULATIVE_MIN_OVERLAP", "0.5"))
+# Connection pool and per-call deadline budgets (seconds) for Django traffic
+DJANGO_MAX_CONNECTIONS = int(os.getenv("DJANGO_MAX_CONNECTIONS", "100"))
+DJANGO_MAX_KEEPALIVE = int(os.getenv("DJANGO_MAX_KEEPALIVE", "20"))
+DJANGO_KEEPALIVE_EXPIRY = float(os.getenv("DJANGO_KEEPALIVE_EXPIRY", "30"))
+DJANGO_DEADLINES = {
+    "history": float(os.getenv("DJANGO_DEADLINE_HISTORY", "2.0")),
+    "summary": float(os.getenv("DJANGO_DEADLINE_SUMMARY", "2.0")),
+    "profile": float(os.getenv("DJANGO_DEADLINE_PROFILE", "1.5")),
+    "mirror": float(os.getenv("DJANGO_DEADLINE_MIRROR", "3.0")),
+    "summary_update": float(os.getenv("DJANGO_DEADLINE_SUMMARY_UPDATE", "5.0")),
+    "memory": float(os.getenv("DJANGO_DEADLINE_MEMORY", "2.0")),
+}
+DJANGO_BREAKER_FAILURES = int(os.getenv("DJANGO_BREAKER_FAILURES", "5"))
+DJANGO_BREAKER_RESET = float(os.getenv("DJANGO_BREAKER_RESET", "10"))
+# Near-duplicate cache for answers that needed no tool call
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "4096"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_DISTANCE = int(os.getenv("RESPONSE_CACHE_MAX_DISTANCE", "3"))
+# Admission control in front of the agent: concurrent turns, then per plan
+# the longest queue wait (seconds) and the most queued turns before shedding
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_QUEUE_TIMEOUTS = {
+    "PAID": float(os.getenv("CHAT_QUEUE_TIMEOUT_PAID", "20")),
+    "TRIAL": float(os.getenv("CHAT_QUEUE_TIMEOUT_TRIAL", "10")),
+    "FREE": float(os.getenv("CHAT_QUEUE_TIMEOUT_FREE", "5")),
+}
+CHAT_MAX_QUEUED = {
+    "PAID": int(os.getenv("CHAT_MAX_QUEUED_PAID", "200")),
+    "TRIAL": int(os.getenv("CHAT_MAX_QUEUED_TRIAL", "100")),
+    "FREE": int(os.getenv("CHAT_MAX_QUEUED_FREE", "50")),
+}
+# /chat/batch: items in flight per batch (default and hard cap), batch
+# size limit, and how often an item shed with a 429 is retried
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_OVERLOAD_RETRIES = int(os.getenv("BATCH_OVERLOAD_RETRIES", "3"))
+# Seconds a turn may take end to end; past it /chat answers 504 and
+# /chat/stream ends with an error event instead of waiting on Gemini
+TURN_DEADLINE = float(os.getenv("TURN_DEADLINE", "60"))
+# Model tiers. Each turn runs on one tier, picked from the user's plan and
+# the turn's estimated difficulty (see Router.difficulty: up to
+# ROUTER_TRIVIAL_WORDS words or small talk is trivial; analysis, plans or
+# over ROUTER_HARD_WORDS words is hard). MODEL_TIERS_<PLAN> names the tier
+# for trivial, normal and hard turns, or one tier for all. FREE traffic
+# stays on the lite tier, about a third of the standard tier's price per
+# input token and a sixth per output token, without thinking. A
+# MODEL_*_MAX_OUTPUT_TOKENS or MODEL_*_THINKING_BUDGET of -1 keeps the
+# model's default.
+MODEL_ID = os.getenv("MODEL_ID", "gemini-2.5-flash")
+MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0.7"))
+MODEL_MAX_OUTPUT_TOKENS = int(os.getenv("MODEL_MAX_OUTPUT_TOKENS", "-1"))
+MODEL_THINKING_BUDGET = int(os.getenv("MODEL_THINKING_BUDGET", "-1"))
+MODEL_LITE_ID = os.getenv("MODEL_LITE_ID", "gemini-2.5-flash-lite")
+MODEL_LITE_TEMPERATURE = float(os.getenv("MODEL_LITE_TEMPERATURE", "0.7"))
+MODEL_LITE_MAX_OUTPUT_TOKENS = int(os.getenv("MODEL_LITE_MAX_OUTPUT_TOKENS", "1024"))
+MODEL_LITE_THINKING_BUDGET = int(os.getenv("MODEL_LITE_THINKING_BUDGET", "0"))
+MODEL_TIERS = {
+    "PAID": parse_plan_tiers(os.getenv("MODEL_TIERS_PAID", "lite,standard,standard")),
+    "TRIAL": parse_plan_tiers(os.getenv("MODEL_TIERS_TRIAL", "lite,standard,standard")),
+    "FREE": parse_plan_tiers(os.getenv("MODEL_TIERS_FREE", "lite")),
+}
+ROUTER_TRIVIAL_WORDS = int(os.getenv("ROUTER_TRIVIAL_WORDS", "6"))
+ROUTER_HARD_WORDS = int(os.getenv("ROUTER_HARD_WORDS", "60"))
+# Hedged LLM calls: a call still unanswered after the HEDGE_PERCENTILE-th
+# percentile of recent call latencies (clamped to HEDGE_MIN_DELAY..
+# HEDGE_MAX_DELAY seconds, HEDGE_INITIAL_DELAY until enough calls are seen)
+# is also sent to HEDGE_FALLBACK_MODEL, with the tier's settings, and the
+# first answer wins. An empty fallback model retries the tier's own model.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+HEDGE_FALLBACK_MODEL = os.getenv("HEDGE_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "10"))
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "4"))
+# Tool calls the agent runs at once when one step asks for several searches
+AGENT_MAX_CONCURRENT_TOOLS = int(os.getenv("AGENT_MAX_CONCURRENT_TOOLS", "4"))
+# Messages whose estimated chance of needing search is below this skip the agent
+ROUTER_DIRECT_THRESHOLD = float(os.getenv("ROUTER_DIRECT_THRESHOLD", "0.3"))
+# Shared secret for service-to-service endpoints on Django. Django refuses
+# those calls while it is unset, so turn mirroring, long-term memory and
+# favourite-sport counts are then switched off (logged at startup).
+AI_SERVICE_TOKEN = os.getenv("AI_SERVICE_TOKEN", "")
+# Secret for the admin-only debug endpoints, sent as X-Admin-Token; they
+# refuse every request while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Chat turns are mirrored to Django in batches of up to MIRROR_BATCH_SIZE,
+# or MIRROR_MAX_DELAY seconds after the first queued turn
+MIRROR_BATCH_SIZE = int(os.getenv("MIRROR_BATCH_SIZE", "50"))
+MIRROR_MAX_DELAY = float(os.getenv("MIRROR_MAX_DELAY", "1.0"))
+# Warm-up primes outbound connections after startup; /ready fails until
+# it finishes or WARMUP_TIMEOUT passes. A search query here also costs a
+# Tavily call, so it is off unless set.
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "20"))
+WARMUP_SEARCH_QUERY = os.getenv("WARMUP_SEARCH_QUERY", "")
+# Per-turn ledger: one JSON line per turn (route, tokens, tool calls and
+# their latencies, total time, outcome) written behind the request to
+# LEDGER_DIR, one file per worker, rotated at LEDGER_MAX_BYTES keeping
+# LEDGER_BACKUPS old files. Summarise it with ledger_report.py. A relative
+# LEDGER_DIR is taken from this service's directory, not the working one.
+LEDGER_ENABLED = os.getenv("LEDGER_ENABLED", "true").lower() in ("1", "true", "yes")
+LEDGER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv("LEDGER_DIR", "ledger"))
+LEDGER_MAX_BYTES = int(os.getenv("LEDGER_MAX_BYTES", "50000000"))
+LEDGER_BACKUPS = int(os.getenv("LEDGER_BACKUPS", "10"))
+# Opt-in memory profiling under /debug/memory (admin only). tracemalloc
+# slows every allocation, so tracing only starts on POST
+# /debug/memory/start, or at startup with MEMPROF_TRACE_AT_STARTUP, keeping
+# MEMPROF_FRAMES frames per allocation and MEMPROF_MAX_SNAPSHOTS snapshots.
+MEMPROF_ENABLED = os.getenv("MEMPROF_ENABLED", "false").lower() in ("1", "true", "yes")
+MEMPROF_TRACE_AT_STARTUP = os.getenv("MEMPROF_TRACE_AT_STARTUP", "false").lower() in ("1", "true", "yes")
+MEMPROF_FRAMES = int(os.getenv("MEMPROF_FRAMES", "5"))
+MEMPROF_MAX_SNAPSHOTS = int(os.getenv("MEMPROF_MAX_SNAPSHOTS", "4"))
+
+logger = logging.getLogger("sportmate")
 
 # ---------------------------------------------------------------------
-# 1.  Build GLOBAL, stateless pieces once at import time
+# 1.  GLOBAL, stateless pieces
 # ---------------------------------------------------------------------
-MODEL_ID = "gemini-2.5-flash"
-llm = ChatGoogleGenerativeAI(
-    model=MODEL_ID,
-    temperature=0.7,
-    convert_system_message_to_instructions=True,
+# Clients and chains are built by `build_models()` during startup rather
+# than at import: the Gemini and Tavily SDKs and `langchain.agents` are
+# the bulk of the import cost.
+STANDARD_TIER = ModelTier(
+    "standard",
+    MODEL_ID,
+    MODEL_TEMPERATURE,
+    None if MODEL_MAX_OUTPUT_TOKENS < 0 else MODEL_MAX_OUTPUT_TOKENS,
+    None if MODEL_THINKING_BUDGET < 0 else MODEL_THINKING_BUDGET,
 )
+LITE_TIER = ModelTier(
+    "lite",
+    MODEL_LITE_ID,
+    MODEL_LITE_TEMPERATURE,
+    None if MODEL_LITE_MAX_OUTPUT_TOKENS < 0 else MODEL_LITE_MAX_OUTPUT_TOKENS,
+    None if MODEL_LITE_THINKING_BUDGET < 0 else MODEL_LITE_THINKING_BUDGET,
+)
+# Every tier's models and chains (hedged when HEDGE_ENABLED)
+models: Optional[ModelPool] = None
+# Unhedged lite model for housekeeping such as summarisation
+summary_llm = None
+# Every Gemini client, so warm-up can open their channels
+gemini_clients: list = []
+search_tool = None
+tools: list = []
 
-search_tool = TavilySearch(max_results=5)
-tools = [search_tool]
-llm = llm.bind_tools(tools)
 
 SYSTEM_MESSAGE = (
     "You are SportMate, a helpful sport assistant.\n"
     "Whenever the user asks for live, recent or latest scores or news, "
     "call the `tavily_search` tool with **one** argument: `query`.\n"
+    "If the question covers several games, teams or leagues, make one call "
+    "per topic, all in the same step.\n"
     "After the JSON returns, summarise the result in a sentence.\n"
     "For all other questions, answer normally and remember preferences."
 )
 
 prompt = ChatPromptTemplate.from_messages(
     [
-        ("system", SYSTEM_MESSAGE),
+        ("system", SYSTEM_MESSAGE + "{summary}{memories}"),
         MessagesPlaceholder("chat_history", optional=True),
         ("user", "{input}"),
         MessagesPlaceholder("agent_scratchpad"),
     ]
 )
 
-BASE_CHAIN = create_openai_tools_agent(llm, tools, prompt)
+# Fast path for messages that need no search: one tool-free LLM call
+DIRECT_SYSTEM_MESSAGE = (
+    "You are SportMate, a helpful sport assistant.\n"
+    "Answer from your own knowledge and remember preferences."
+)
+direct_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", DIRECT_SYSTEM_MESSAGE + "{summary}{memories}"),
+        MessagesPlaceholder("chat_history", optional=True),
+        ("user", "{input}"),
+    ]
+)
+router = Router(
+    direct_threshold=ROUTER_DIRECT_THRESHOLD,
+    trivial_words=ROUTER_TRIVIAL_WORDS,
+    hard_words=ROUTER_HARD_WORDS,
+)
+token_estimator = TokenEstimator()
+compactor = ResultCompactor(
+    token_estimator,
+    max_tokens=SEARCH_RESULT_MAX_TOKENS,
+    passages_per_result=SEARCH_PASSAGES_PER_RESULT,
+)
+# Results are compacted once, as they are cached, rather than on every tool call
+search_cache = SearchCache(
+    ttls=SEARCH_TTLS,
+    max_entries=SEARCH_CACHE_SIZE,
+    transform=compactor.compact if SEARCH_COMPACTION else None,
+)
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl=RESPONSE_CACHE_TTL,
+    max_distance=RESPONSE_CACHE_MAX_DISTANCE,
+)
+
+
+def hedged(primary, fallback) -> HedgedModel:
+    """`primary` hedged with `fallback` under the configured delays."""
+    return HedgedModel(
+        primary,
+        fallback,
+        percentile=HEDGE_PERCENTILE,
+        min_delay=HEDGE_MIN_DELAY,
+        max_delay=HEDGE_MAX_DELAY,
+        initial_delay=HEDGE_INITIAL_DELAY,
+    )
+
+
+def make_tools(search) -> list:
+    """The agent's tools around the raw `search` tool."""
+    return [
+        cached_search_tool(
+            search,
+            search_cache,
+            on_query=prewarmer.record_search,
+        )
+    ]
+
+
+def tier_models(tier: ModelTier, plain) -> TierModels:
+    """The agent and direct chains of `tier` around its tool-free model."""
+    from langchain.agents import create_openai_tools_agent
+
+    return TierModels(
+        tier=tier,
+        plain=plain,
+        agent=create_openai_tools_agent(plain.bind_tools(tools), tools, prompt),
+        direct=direct_prompt | plain,
+    )
+
+
+def build_models() -> None:
+    """Construct the Gemini and Tavily clients and every tier's chains."""
+    global models, summary_llm, gemini_clients, search_tool, tools
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_tavily import TavilySearch
+
+    clients: dict[ModelTier, object] = {}
+
+    def gemini(tier: ModelTier):
+        # Tiers (and hedging fallbacks) with the same settings share a client
+        key = replace(tier, name="")
+        if key not in clients:
+            clients[key] = ChatGoogleGenerativeAI(
+                model=tier.model,
+                temperature=tier.temperature,
+                max_output_tokens=tier.max_output_tokens,
+                thinking_budget=tier.thinking_budget,
+                convert_system_message_to_instructions=True,
+            )
+        return clients[key]
+
+    search_tool = TavilySearch(max_results=5)
+    tools = make_tools(search_tool)
+    tiers = {}
+    for tier in (STANDARD_TIER, LITE_TIER):
+        plain = gemini(tier)
+        if HEDGE_ENABLED:
+            plain = hedged(plain, gemini(replace(tier, model=HEDGE_FALLBACK_MODEL or tier.model)))
+        tiers[tier.name] = tier_models(tier, plain)
+    summary_llm = gemini(LITE_TIER)
+    gemini_clients = list(clients.values())
+    models = ModelPool(tiers, MODEL_TIERS)
+
 
 # ---------------------------------------------------------------------
-# 2.  Factory: build per-session AgentExecutor
+# 2.  Factory: per-session context and AgentExecutor
 # ---------------------------------------------------------------------
 
-async def fetch_chat_history(session_id: str, token: str) -> list:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{DJANGO_BASE}/c/chat-history/{session_id}/",
-            headers={"Authorization": f"Bearer {token}"}
+# Replaced by the configured store when the app starts
+sessions = MemorySessionStore(
+    max_sessions=SESSION_CACHE_SIZE, ttl=SESSION_CACHE_TTL, profile_ttl=PROFILE_CACHE_TTL
+)
+_background: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    """Run `coro` in the background, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+
+async def fetch_chat_history(session_id: str, token: str, after: Optional[str] = None) -> list:
+    params = {"after": after} if after else None
+    try:
+        with STAGE_SECONDS.labels("history_fetch").time():
+            response = await django_api.get(
+                f"/c/chat-history/{session_id}/",
+                token,
+                params=params,
+                deadline=DJANGO_DEADLINES["history"],
+            )
+    except httpx.HTTPError as e:
+        ERRORS.labels("history_fetch").inc()
+        raise HTTPException(status_code=502, detail=f"Django chat history fetch failed: {e}")
+    if response.status_code != 200:
+        ERRORS.labels("history_fetch").inc()
+        raise HTTPException(status_code=502, detail="Failed to fetch chat history from Django API.")
+    return response.json()
+
+
+async def fetch_chat_summary(session_id: str, token: str) -> dict:
+    try:
+        with STAGE_SECONDS.labels("summary_fetch").time():
+            response = await django_api.get(
+                f"/c/chat-summary/{session_id}/", token, deadline=DJANGO_DEADLINES["summary"]
+            )
+    except httpx.HTTPError as e:
+        ERRORS.labels("summary_fetch").inc()
+        raise HTTPException(status_code=502, detail=f"Django chat summary fetch failed: {e}")
+    if response.status_code != 200:
+        ERRORS.labels("summary_fetch").inc()
+        raise HTTPException(status_code=502, detail="Failed to fetch chat summary from Django API.")
+    return response.json()
+
+
+async def _load_session(payload: UserMessage) -> SessionEntry:
+    """Return the cached session, topped up with turns Django stored since."""
+    session_id, token = payload.session_id, payload.access_token
+    entry = await sessions.get(session_id)
+
+    if payload.history is not None:
+        # Context pushed by Django (schema v2): no callback needed
+        if entry is None:
+            entry = SessionEntry(
+                summary=payload.summary or "",
+                summary_until=payload.summary_until,
+                last_seen=payload.summary_until,
+            )
+        entry.apply_delta([turn.model_dump() for turn in payload.history])
+        await sessions.put(session_id, entry)
+        return entry
+
+    if entry is None:
+        # Cold start: turns already folded into the summary are never fetched
+        summary = await fetch_chat_summary(session_id, token)
+        entry = SessionEntry(
+            summary=summary.get("summary") or "",
+            summary_until=summary.get("summary_until"),
+            last_seen=summary.get("summary_until"),
         )
-        if response.status_code != 200:
-            raise HTTPException(status_code=502, detail="Failed to fetch chat history from Django API.")
-        return response.json()
+    entry.apply_delta(await fetch_chat_history(session_id, token, after=entry.last_seen))
+    await sessions.put(session_id, entry)
+    return entry
+
+
+async def _load_profile(payload: UserMessage) -> Profile:
+    if payload.profile is not None:
+        return payload.profile
+    cached = await sessions.get_profile(payload.user_id)
+    if cached is not None:
+        return Profile(**cached)
+    try:
+        with STAGE_SECONDS.labels("profile_fetch").time():
+            about_resp = await django_api.get(
+                "/auth/about/", payload.access_token, deadline=DJANGO_DEADLINES["profile"]
+            )
+        about_json = about_resp.json() if about_resp.status_code == 200 else {}
+    except httpx.HTTPError as e:
+        ERRORS.labels("profile_fetch").inc()
+        raise HTTPException(status_code=502, detail=f"Django profile fetch failed: {e}")
+    profile = Profile(**about_json)
+    if about_json:
+        await sessions.put_profile(payload.user_id, profile.model_dump())
+    return profile
 
 
-async def _build_agent(session_id: str, access_token: str) -> AgentExecutor:
-    chat_history_data = await fetch_chat_history(session_id, access_token)
+async def _fold_overflow(session_id: str, token: str, entry: SessionEntry, overflow: list) -> None:
+    """
+    Fold turns that left the window into the persisted rolling summary.
+    The caller has claimed the session's fold (`sessions.claim_fold`).
+    """
+    try:
+        with STAGE_SECONDS.labels("summary_fold").time():
+            summary = await fold_summary(summary_llm, entry.summary, overflow)
+        # Applied to the stored entry, which may have moved on since `entry` was read
+        if await sessions.update(session_id, lambda current: current.fold(summary, overflow)) is False:
+            return
+        response = await django_api.patch(
+            f"/c/chat-summary/{session_id}/",
+            token,
+            json={"summary": summary, "summary_until": overflow[-1].created_at},
+            deadline=DJANGO_DEADLINES["summary_update"],
+        )
+        response.raise_for_status()
+    except Exception:
+        ERRORS.labels("summary_fold").inc()
+        logger.exception("Summary update failed for session %s", session_id)
+    finally:
+        await sessions.release_fold(session_id)
 
-    history = ChatMessageHistory()
-    for item in chat_history_data:
-        history.add_user_message(item["user_message"])
-        history.add_ai_message(item["bot_message"])
 
-    memory = ConversationBufferMemory(
-        chat_memory=history,
-        return_messages=True,
-    )
+def _new_agent(chosen: TierModels) -> "BoundedAgentExecutor":
+    from agent_executor import BoundedAgentExecutor
 
-    return AgentExecutor(
-        agent=BASE_CHAIN,
+    return BoundedAgentExecutor(
+        agent=chosen.agent,
         tools=tools,
-        memory=memory,
         verbose=False,
         handle_parsing_errors=True,
+        return_intermediate_steps=True,
+        max_concurrent_tools=AGENT_MAX_CONCURRENT_TOOLS,
     )
 
 
+async def _build_inputs(payload: UserMessage, model: str) -> dict:
+    """Summary and history inputs for the session's next turn on `model`."""
+    session_id, access_token = payload.session_id, payload.access_token
+    entry = await _load_session(payload)
+    window = build_context(entry, token_estimator, CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_TURNS, model)
+
+    # Summarise in the background; this turn simply goes without those lines
+    if window.overflow and await sessions.claim_fold(session_id, SUMMARY_FOLD_TTL):
+        _spawn(_fold_overflow(session_id, access_token, entry, window.overflow))
+
+    return {
+        "chat_history": window.messages,
+        "summary": (
+            f"\n\nSummary of the earlier conversation:\n{window.summary}"
+            if window.summary else ""
+        ),
+        "context_tokens": window.tokens,
+    }
+
+
 # ---------------------------------------------------------------------
 # 3.  FastAPI plumbing
 # ---------------------------------------------------------------------
-app = FastAPI()
-client = httpx.AsyncClient(timeout=10)
+django_api = DjangoClient(
+    DJANGO_BASE,
+    max_connections=DJANGO_MAX_CONNECTIONS,
+    max_keepalive_connections=DJANGO_MAX_KEEPALIVE,
+    keepalive_expiry=DJANGO_KEEPALIVE_EXPIRY,
+    breaker=CircuitBreaker(DJANGO_BREAKER_FAILURES, DJANGO_BREAKER_RESET),
+)
+
 
-class UserMessage(BaseModel):
-    message: str
-    session_id: str
-    user_id: int
-    access_token: str
+async def _send_mirror_batch(turns: list[dict]) -> None:
+    try:
+        with STAGE_SECONDS.labels("django_mirror").time():
+            response = await django_api.post(
+                "/c/chat-history/bulk/",
+                None,
+                json={"turns": turns},
+                headers={"X-Service-Token": AI_SERVICE_TOKEN},
+                deadline=DJANGO_DEADLINES["mirror"],
+            )
+        response.raise_for_status()
+    except httpx.HTTPError:
+        ERRORS.labels("django_mirror").inc()
+        raise
 
-class ChatResponse(BaseModel):
-    response: str
 
-# Helpers -------------------------------------------------------------
-async def _django_get(path: str, token: str) -> httpx.Response:
-    return await client.get(
-        f"{DJANGO_BASE}{path}",
-        headers={"Authorization": f"Bearer {token}"},
+mirror_queue = WriteBehindQueue(
+    _send_mirror_batch, max_batch=MIRROR_BATCH_SIZE, max_delay=MIRROR_MAX_DELAY
+)
+ledger = TurnLedger(LEDGER_DIR, max_bytes=LEDGER_MAX_BYTES, backup_count=LEDGER_BACKUPS)
+heap_profiler = HeapProfiler(max_snapshots=MEMPROF_MAX_SNAPSHOTS, frames=MEMPROF_FRAMES)
+
+
+async def _load_favorite_sports() -> dict[str, int]:
+    response = await django_api.get(
+        "/auth/favorite-sports/",
+        None,
+        params={"limit": PREWARM_SPORTS},
+        headers={"X-Service-Token": AI_SERVICE_TOKEN},
+        deadline=DJANGO_DEADLINES["profile"],
     )
+    response.raise_for_status()
+    return {row["sport"]: row["users"] for row in response.json()}
 
-async def _django_post(path: str, token: str, data: dict) -> None:
-    await client.post(
-        f"{DJANGO_BASE}{path}",
-        json=data,
-        headers={"Authorization": f"Bearer {token}"},
+
+async def _load_memories(user_id: str, after: Optional[str]) -> list[dict]:
+    response = await django_api.get(
+        f"/c/memory-turns/{user_id}/",
+        None,
+        params={"limit": MEMORY_MAX_TURNS, **({"after": after} if after else {})},
+        headers={"X-Service-Token": AI_SERVICE_TOKEN},
+        deadline=DJANGO_DEADLINES["memory"],
     )
+    response.raise_for_status()
+    return response.json()
 
-# Endpoint -------------------------------------------------------------
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_bot(payload: UserMessage) -> ChatResponse:
-    # Build session-specific agent
-    agent = await _build_agent(payload.session_id, payload.access_token)
 
-    # -- Enrich prompt with user profile --------------------------------
+memory = LongTermMemory(
+    HashingEmbedder(MEMORY_EMBEDDING_DIM),
+    _load_memories,
+    max_users=MEMORY_MAX_USERS,
+    max_turns=MEMORY_MAX_TURNS,
+    sync_interval=MEMORY_SYNC_INTERVAL,
+)
+
+
+prewarmer = Prewarmer(
+    search_cache,
+    # Looked up per call: `search_tool` is only built at startup
+    lambda query: search_tool.ainvoke({"query": query}),
+    load_sports=_load_favorite_sports if AI_SERVICE_TOKEN else None,
+    max_queries=PREWARM_MAX_QUERIES,
+    max_sports=PREWARM_SPORTS,
+    min_interval=PREWARM_MIN_INTERVAL,
+)
+
+
+# Warm-up ------------------------------------------------------------
+_ready = False
+_warmup_report: dict = {}
+
+
+async def _warm_prompts() -> None:
+    # Renders both prompts and generates the tool JSON schemas once
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    inputs = {"summary": "", "memories": "", "chat_history": [], "input": "warm-up"}
+    prompt.format_messages(agent_scratchpad=[], **inputs)
+    direct_prompt.format_messages(**inputs)
+    for tool in tools:
+        convert_to_openai_tool(tool)
+    router.route("warm-up")
+
+
+async def _warm_django() -> None:
+    # Any response means a pooled connection is open
+    await django_api.request("HEAD", "/", None, deadline=DJANGO_DEADLINES["profile"])
+
+
+async def _warm_gemini() -> None:
+    from google.ai.generativelanguage_v1beta.types import Content, CountTokensRequest, Part
+
+    # count_tokens is free and opens the same gRPC channel generation uses;
+    # the hedging fallback is only useful if its channel is open too
+    await asyncio.gather(*(
+        client.async_client.count_tokens(
+            request=CountTokensRequest(model=client.model, contents=[Content(parts=[Part(text="warm-up")])])
+        )
+        for client in gemini_clients
+    ))
+
+
+async def _warm_search() -> None:
+    await tools[0].ainvoke({"query": WARMUP_SEARCH_QUERY})
+
+
+async def _warm_up() -> None:
+    """Prime outbound connections and schemas, then mark the service ready."""
+    global _ready
+    steps = {"prompts": _warm_prompts, "django": _warm_django, "gemini": _warm_gemini}
+    if WARMUP_SEARCH_QUERY:
+        steps["search"] = _warm_search
+
+    async def run(name: str, step) -> None:
+        started = time.perf_counter()
+        try:
+            await step()
+            _warmup_report[name] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            # Priming is best effort; the first real call will simply be cold
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            _warmup_report[name] = f"failed: {e}"
+
     try:
-        about_resp = await _django_get("/auth/about/", payload.access_token)
-        about_json = about_resp.json() if about_resp.status_code == 200 else {}
-    except httpx.HTTPError as e:
-        raise HTTPException(status_code=502, detail=f"Django profile fetch failed: {e}")
+        with STAGE_SECONDS.labels("warmup").time():
+            await asyncio.wait_for(
+                asyncio.gather(*(run(name, step) for name, step in steps.items())), WARMUP_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up timed out after %.0fs", WARMUP_TIMEOUT)
+        for name in steps.keys() - _warmup_report.keys():
+            _warmup_report[name] = "timed out"
+    _ready = True
 
-    favorite = about_json.get("favorite_sport", "Unknown")
-    details = about_json.get("details", "No details available")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global sessions
+    if models is None:
+        with STAGE_SECONDS.labels("startup").time():
+            build_models()
+    sessions = await open_session_store(
+        SESSION_BACKEND,
+        REDIS_URL,
+        max_sessions=SESSION_CACHE_SIZE,
+        ttl=SESSION_CACHE_TTL,
+        profile_ttl=PROFILE_CACHE_TTL,
+    )
+    django_api.open()
+    if AI_SERVICE_TOKEN:
+        mirror_queue.start()
+    else:
+        logger.warning(
+            "AI_SERVICE_TOKEN is not set: turns are not mirrored to Django and long-term memory is off"
+        )
+    if LEDGER_ENABLED:
+        ledger.start()
+    if MEMPROF_ENABLED and MEMPROF_TRACE_AT_STARTUP:
+        heap_profiler.start()
+    if PREWARM_ENABLED:
+        prewarmer.start()
+    warmup = _spawn(_warm_up())
+    yield
+    warmup.cancel()
+    await prewarmer.stop()
+    await mirror_queue.stop()
+    await ledger.stop()
+    await django_api.aclose()
+    await sessions.close()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+scheduler = PriorityScheduler(CHAT_MAX_CONCURRENCY, CHAT_QUEUE_TIMEOUTS, CHAT_MAX_QUEUED)
+
+# Helpers -------------------------------------------------------------
+async def _prepare_turn(payload: UserMessage, profile: Profile, model: str) -> dict:
+    """Build the session context and the profile-enriched inputs for one turn on `model`."""
+    inputs, memories = await asyncio.gather(_build_inputs(payload, model), _recall(payload, model))
+    inputs["memories"] = memories
+    inputs["context_tokens"] += token_estimator.count(memories, model)
+
+    # -- Enrich prompt with user profile --------------------------------
+
+    favorite = profile.favorite_sport or "Unknown"
+    details = profile.details or "No details available"
 
     full_input = (
         f"{payload.message}\n"
         f"Favorite Sport: {favorite}\n"
         f"Details: {details}"
     )
+    inputs["input"] = full_input
+    return inputs
+
+
+async def _recall(payload: UserMessage, model: str) -> str:
+    """Relevant exchanges from the user's other sessions, as prompt lines."""
+    if not (MEMORY_ENABLED and AI_SERVICE_TOKEN):
+        return ""
+    with STAGE_SECONDS.labels("memory").time():
+        await memory.sync(payload.user_id)
+        recalled = memory.recall(
+            payload.user_id, payload.session_id, payload.message, MEMORY_TOP_K, MEMORY_MIN_SCORE
+        )
+    lines: list[str] = []
+    budget = MEMORY_MAX_TOKENS
+    for item in recalled:
+        line = f"- User: {item.user_message[:300]} | SportMate: {item.bot_message[:300]}"
+        budget -= token_estimator.count(line, model)
+        if budget < 0:
+            break
+        lines.append(line)
+    if not lines:
+        return ""
+    return "\n\nRelevant exchanges from earlier conversations with this user:\n" + "\n".join(lines)
+
+
+def _speculate(payload: UserMessage, route: Route) -> Optional[Speculation]:
+    """Start the likely search now if the agent will almost surely make it."""
+    if not SPECULATIVE_SEARCH or route.name != "agent" or not router.is_live(payload.message):
+        return None
+    return speculate(search_tool, search_cache, payload.message, SPECULATIVE_MIN_OVERLAP)
+
+
+def _choose_model(payload: UserMessage) -> TierModels:
+    """The model tier for this turn, by plan and estimated difficulty."""
+    difficulty = router.difficulty(payload.message)
+    chosen = models.choose(payload.plan, difficulty)
+    MODEL_TURNS.labels(chosen.tier.name, difficulty).inc()
+    return chosen
+
+
+def _cacheable(message: str) -> bool:
+    """Whether answers to `message` may be looked up in or stored to the response cache."""
+    # Scores and news go stale long before RESPONSE_CACHE_TTL
+    return not router.is_live(message) and classify_query(message) == "general"
+
+
+def _shareable(inputs: dict, profile: Profile) -> bool:
+    """
+    Whether the prompt carried nothing about this user beyond the favourite
+    sport the cache buckets by, so its answer can be served to anyone.
+    """
+    return not (inputs["chat_history"] or inputs["summary"] or inputs["memories"] or profile.details)
 
-    # -- Invoke the agent -----------------------------------------------
+
+def _runnable(route: Route, chosen: TierModels):
+    """The chain that answers a turn on `route` with the `chosen` tier."""
+    return _new_agent(chosen) if route.name == "agent" else chosen.direct
+
+
+def _final_output(result) -> tuple[str, bool]:
+    """(answer, whether tools were used) from either route's result."""
+    if isinstance(result, dict):
+        return result["output"], bool(result["intermediate_steps"])
+    return _chunk_text(result), False
+
+
+async def _admit(payload: UserMessage) -> Slot:
+    """Wait for an LLM slot by plan priority, or shed the turn with a 429."""
     try:
-        result = await agent.ainvoke({"input": full_input})
+        return await scheduler.acquire(payload.plan)
+    except Overloaded as e:
+        SHED.labels(e.plan).inc()
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def _log_usage(
+    payload: UserMessage, route: Route, chosen: TierModels, usage: UsageCallback, context_tokens: int
+) -> None:
+    logger.info(
+        "session=%s route=%s model=%s prompt_tokens=%d completion_tokens=%d context_tokens=%d llm_calls=%d",
+        payload.session_id,
+        route.name,
+        chosen.tier.model,
+        usage.prompt_tokens,
+        usage.completion_tokens,
+        context_tokens,
+        usage.llm_calls,
+    )
+
+
+@contextmanager
+def _ledger_turn(payload: UserMessage, path: str):
+    """
+    Yield the ledger record of the turn run in the block and queue it when
+    the block exits, with the HTTP status (499 if the client went away)
+    and error of a failed turn. The block fills in `route`, `tier`, `model`,
+    `turn_id`, `context_tokens` and `usage`, a `UsageCallback`.
+    """
+    started = time.perf_counter()
+    record = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "path": path,
+        "session_id": payload.session_id,
+        "user_id": payload.user_id,
+        "plan": payload.plan,
+        "route": None,
+        "tier": None,
+        "model": None,
+        "status": 200,
+        "error": None,
+    }
+    try:
+        yield record
+    except HTTPException as e:
+        record.update(status=e.status_code, error=str(e.detail))
+        raise
+    except (asyncio.CancelledError, GeneratorExit, ClientDisconnect, WebSocketDisconnect):
+        record.update(status=499, error="cancelled")
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        record.update(status=500, error=str(e))
+        raise
+    finally:
+        usage = record.pop("usage", None)
+        if usage is not None:
+            record.update(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens,
+                llm_calls=usage.llm_calls,
+                tool_calls=usage.tool_calls,
+            )
+        record["total_s"] = round(time.perf_counter() - started, 4)
+        if LEDGER_ENABLED:
+            ledger.put(record)
+
+
+def _mirror_turn(payload: UserMessage, output: str) -> str:
+    """Queue the turn for Django (write-behind, if it would be accepted) and return its id."""
+    turn = Turn(payload.message, output)
+    _spawn(sessions.update(payload.session_id, lambda entry: entry.add_pending(turn, CONTEXT_RECENT_TURNS)))
+    turn_id = str(uuid.uuid4())
+    if not AI_SERVICE_TOKEN:
+        return turn_id
+    if MEMORY_ENABLED:
+        memory.add(payload.user_id, Memory(turn_id, payload.session_id, payload.message, output))
+    mirror_queue.put(
+        {
+            "id": turn_id,
+            "session_id": payload.session_id,
+            "user_message": payload.message,
+            "bot_message": output,
+        }
+    )
+    return turn_id
 
-    # -- Mirror message to Django (fire-and-forget) ---------------------
+
+def _remaining(started: float) -> float:
+    """Seconds left of the turn deadline for a turn that began at `started`."""
+    return TURN_DEADLINE - (time.perf_counter() - started)
+
+
+async def _within_deadline(started: float, events: AsyncIterator) -> AsyncIterator:
+    """Relay `events`, raising `asyncio.TimeoutError` once the turn deadline passes."""
+    events = events.__aiter__()
     try:
-        await _django_post(
-            "/chat/history/",
-            payload.access_token,
-            {
-                "message": payload.message,
-                "session_id": payload.session_id,
-                "user": payload.user_id,
-            },
+        while True:
+            try:
+                yield await asyncio.wait_for(events.__anext__(), _remaining(started))
+            except StopAsyncIteration:
+                return
+    finally:
+        await events.aclose()
+
+
+def _deadline_exceeded() -> str:
+    return f"Turn exceeded its {TURN_DEADLINE:g}s deadline."
+
+
+def _sse(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def _chunk_text(chunk) -> str:
+    # Gemini may return either a plain string or a list of content parts
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+# Sessions in Redis aren't counted per worker
+CACHE_ENTRIES.labels("session").set_function(
+    lambda: len(sessions) if sessions.backend == "memory" else float("nan")
+)
+CACHE_ENTRIES.labels("search").set_function(lambda: len(search_cache))
+CACHE_ENTRIES.labels("response").set_function(lambda: len(response_cache))
+
+
+# Endpoints ------------------------------------------------------------
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/ready")
+async def ready(response: Response) -> dict:
+    """Readiness probe: 503 until warm-up has finished."""
+    if not _ready:
+        response.status_code = 503
+    return {"ready": _ready, "warmup": _warmup_report}
+
+
+@app.get("/stats")
+async def service_stats() -> dict:
+    return {
+        "sessions": {
+            "backend": sessions.backend,
+            "entries": len(sessions) if sessions.backend == "memory" else None,
+        },
+        "search": search_cache.stats(),
+        "compaction": compactor.stats(),
+        "memory": memory.stats(),
+        "responses": response_cache.stats(),
+        "scheduler": scheduler.stats(),
+        "prewarm": prewarmer.stats(),
+        "models": models.stats(),
+        "ledger": ledger.stats() if LEDGER_ENABLED else None,
+    }
+
+
+# Memory profiling -----------------------------------------------------
+def _require_admin(x_admin_token: str = Header("")) -> None:
+    if not MEMPROF_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+
+debug_memory = APIRouter(prefix="/debug/memory", dependencies=[Depends(_require_admin)])
+
+
+def _cache_sizes() -> dict:
+    caches = {
+        "search": search_cache,
+        "response": response_cache,
+        "memory": memory,
+        "mirror_queue": mirror_queue,
+        "ledger": ledger,
+    }
+    # Sessions in Redis don't live in this process
+    if sessions.backend == "memory":
+        caches["session"] = sessions
+    return {name: {"entries": len(cache), "bytes": deep_sizeof(cache)} for name, cache in caches.items()}
+
+
+async def _profile(call, *args):
+    """Run a profiler call off the event loop, mapping its errors to HTTP ones."""
+    try:
+        return await asyncio.to_thread(call, *args)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=f"{e}; POST /debug/memory/start first.")
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No snapshot named {e.args[0]!r}.")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+@debug_memory.get("")
+async def memory_status() -> dict:
+    """Tracing state, process RSS and the entries and approximate size of each live cache."""
+    return {**heap_profiler.status(), "caches": await _profile(_cache_sizes)}
+
+
+@debug_memory.post("/start")
+async def memory_start(frames: Optional[int] = None) -> dict:
+    heap_profiler.start(frames)
+    return heap_profiler.status()
+
+
+@debug_memory.post("/stop")
+async def memory_stop() -> dict:
+    heap_profiler.stop()
+    return heap_profiler.status()
+
+
+@debug_memory.post("/snapshots/{name}")
+async def memory_snapshot(name: str) -> dict:
+    """Keep a snapshot as `name` to diff against later."""
+    return await _profile(heap_profiler.take, name)
+
+
+@debug_memory.get("/top")
+async def memory_top(group: str = "package", limit: int = 20) -> dict:
+    """Top allocators now, grouped by `package`, `file` or `line`."""
+    return await _profile(heap_profiler.top, group, limit)
+
+
+@debug_memory.get("/diff")
+async def memory_diff(base: str, group: str = "package", limit: int = 20) -> dict:
+    """What grew (or shrank) since the snapshot `base`."""
+    return await _profile(heap_profiler.diff, base, group, limit)
+
+
+@debug_memory.get("/heap")
+async def memory_heap(limit: int = 25) -> dict:
+    """Run a full collection and count live objects by type."""
+    return await _profile(heap_summary, limit)
+
+
+app.include_router(debug_memory)
+
+
+async def _run_turn(
+    payload: UserMessage, *, use_cache: bool = True, persist: bool = True, path: str = "chat"
+) -> ChatResponse:
+    """
+    One non-streaming turn through cache, router and agent. With
+    `persist=False` the turn is neither added to the session nor mirrored
+    to Django; with `use_cache=False` the response cache is bypassed.
+    `path` labels the turn in the ledger.
+    """
+    with _ledger_turn(payload, path) as record:
+        return await _answer_turn(payload, record, use_cache=use_cache, persist=persist)
+
+
+async def _answer_turn(payload: UserMessage, record: dict, *, use_cache: bool, persist: bool) -> ChatResponse:
+    started = time.perf_counter()
+    profile = await _load_profile(payload)
+    prewarmer.record_sport(profile.favorite_sport)
+
+    # -- Evergreen questions may already have an answer ------------------
+    use_cache = use_cache and _cacheable(payload.message)
+    cached = response_cache.get(payload.message, profile.favorite_sport) if use_cache else None
+    if cached is not None:
+        turn_id = _mirror_turn(payload, cached) if persist else None
+        record.update(route="cache", turn_id=turn_id)
+        return ChatResponse(response=cached, turn_id=turn_id, cached=True, route="cache")
+
+    route = router.route(payload.message)
+    ROUTES.labels(route.name, route.reason).inc()
+    chosen = _choose_model(payload)
+    usage = UsageCallback(token_estimator)
+    record.update(route=route.name, tier=chosen.tier.name, model=chosen.tier.model, usage=usage)
+
+    with _speculate(payload, route) or nullcontext():
+        inputs = await _prepare_turn(payload, profile, chosen.tier.model)
+        context_tokens = inputs.pop("context_tokens")
+        record["context_tokens"] = context_tokens
+
+        # -- Invoke the agent (or the direct chain) ---------------------
+        async with await _admit(payload):
+            try:
+                with STAGE_SECONDS.labels(route.name).time():
+                    result = await asyncio.wait_for(
+                        _runnable(route, chosen).ainvoke(inputs, config={"callbacks": [usage]}),
+                        _remaining(started),
+                    )
+            except asyncio.TimeoutError:
+                DEADLINES_EXCEEDED.labels("chat").inc()
+                raise HTTPException(status_code=504, detail=_deadline_exceeded())
+            except Exception as e:
+                ERRORS.labels(route.name).inc()
+                raise HTTPException(status_code=500, detail=str(e))
+
+    output, used_tools = _final_output(result)
+    if use_cache and not used_tools and _shareable(inputs, profile):
+        response_cache.put(payload.message, profile.favorite_sport, output)
+    turn_id = _mirror_turn(payload, output) if persist else None
+    record["turn_id"] = turn_id
+    _log_usage(payload, route, chosen, usage, context_tokens)
+    ROUTE_SECONDS.labels(route.name).observe(time.perf_counter() - started)
+
+    return ChatResponse(
+        response=output,
+        turn_id=turn_id,
+        route=route.name,
+        model=chosen.tier.model,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        context_tokens=context_tokens,
+    )
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_with_bot(payload: UserMessage) -> ChatResponse:
+    return await _run_turn(payload)
+
+
+@app.post("/chat/stream")
+async def chat_stream(payload: UserMessage) -> StreamingResponse:
+    """
+    Server-Sent-Events variant of `/chat`.
+
+    Emits `token` events as Gemini produces text, a `tool` event whenever
+    the agent calls a tool, and a final `done` event carrying the full
+    answer (or an `error` event if the agent fails mid-stream).
+    """
+    with ExitStack() as stack:
+        record = stack.enter_context(_ledger_turn(payload, "stream"))
+        events = await _start_stream(payload, record)
+        # Past this point the record is written once the response is over
+        return _EventStreamResponse(events, stack.pop_all())
+
+
+class _TurnStream:
+    """
+    The events of a started streamed turn. `aclose()` runs `on_close`,
+    which frees what the turn holds (its LLM slot, a speculative search),
+    even if the events were never iterated and so never reached the
+    generator's own cleanup.
+    """
+
+    def __init__(self, events: AsyncIterator[dict], on_close: Callable[[], None]):
+        self.events = events
+        self.on_close = on_close
+
+    def __aiter__(self) -> "_TurnStream":
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.events.__anext__()
+
+    async def aclose(self) -> None:
+        try:
+            await self.events.aclose()
+        finally:
+            self.on_close()
+
+
+class _EventStreamResponse(StreamingResponse):
+    """
+    Server-Sent-Events response for a `_TurnStream`. Starlette never
+    touches the body of a response whose client left before it started,
+    so the events (then `exit_stack`) are closed here once the response
+    is over, however it ended.
+    """
+
+    def __init__(self, events: _TurnStream, exit_stack: ExitStack):
+        super().__init__(
+            (_sse(event) async for event in events),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-    except httpx.HTTPError:
-        pass  # don't block the user if logging fails
+        self.events = events
+        self.exit_stack = exit_stack
+
+    async def __call__(self, scope, receive, send) -> None:
+        with self.exit_stack:
+            try:
+                await super().__call__(scope, receive, send)
+            finally:
+                await self.events.aclose()
+
+
+async def _start_stream(payload: UserMessage, record: dict) -> _TurnStream:
+    """
+    Everything up to the first event of a streamed turn; returns its
+    events, which the caller must `aclose()`.
+    """
+    turn_started = time.perf_counter()
+    profile = await _load_profile(payload)
+    prewarmer.record_sport(profile.favorite_sport)
+
+    use_cache = _cacheable(payload.message)
+    cached = response_cache.get(payload.message, profile.favorite_sport) if use_cache else None
+    if cached is not None:
+        record["route"] = "cache"
+
+        async def cached_stream() -> AsyncIterator[dict]:
+            yield {"type": "token", "content": cached}
+            record["turn_id"] = _mirror_turn(payload, cached)
+            yield {
+                "type": "done",
+                "response": cached,
+                "turn_id": record["turn_id"],
+                "cached": True,
+                "route": "cache",
+            }
+
+        return _TurnStream(cached_stream(), lambda: None)
+
+    route = router.route(payload.message)
+    ROUTES.labels(route.name, route.reason).inc()
+    chosen = _choose_model(payload)
+    record.update(route=route.name, tier=chosen.tier.name, model=chosen.tier.model)
+    speculation = _speculate(payload, route)
+    try:
+        inputs = await _prepare_turn(payload, profile, chosen.tier.model)
+        context_tokens = inputs.pop("context_tokens")
+        record["context_tokens"] = context_tokens
+        # Taken before responding so a shed turn still gets a proper 429
+        slot = await _admit(payload)
+    except BaseException:
+        if speculation is not None:
+            speculation.finish()
+        raise
+    usage = UsageCallback(token_estimator)
+    record["usage"] = usage
+
+    def release() -> None:
+        slot.release()
+        if speculation is not None:
+            speculation.finish()
+
+    async def event_stream() -> AsyncIterator[dict]:
+        output = None
+        tokens: list[str] = []
+        used_tools = False
+        tool_runs: set[str] = set()
+        started = time.perf_counter()
+        try:
+            with speculation or nullcontext():
+                events = _runnable(route, chosen).astream_events(inputs, config={"callbacks": [usage]}, version="v2")
+                async for event in _within_deadline(turn_started, events):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        text = _chunk_text(event["data"]["chunk"])
+                        if text:
+                            tokens.append(text)
+                            yield {"type": "token", "content": text}
+                    elif kind == "on_tool_start":
+                        tool_runs.add(event["run_id"])
+                        # The search cache runs the real search tool as a child run
+                        if tool_runs.intersection(event["parent_ids"]):
+                            continue
+                        # Text streamed before a tool call is not part of the answer
+                        tokens.clear()
+                        used_tools = True
+                        yield {"type": "tool", "name": event["name"]}
+                    elif kind == "on_chain_end" and not event["parent_ids"]:
+                        output, _ = _final_output(event["data"]["output"])
+        except asyncio.TimeoutError:
+            DEADLINES_EXCEEDED.labels(record["path"]).inc()
+            record.update(status=504, error=_deadline_exceeded())
+            yield {"type": "error", "detail": _deadline_exceeded()}
+            return
+        except Exception as e:
+            ERRORS.labels(route.name).inc()
+            record.update(status=500, error=str(e))
+            yield {"type": "error", "detail": str(e)}
+            return
+        finally:
+            STAGE_SECONDS.labels(route.name).observe(time.perf_counter() - started)
+            slot.release()
+
+        if output is None:
+            output = "".join(tokens)
+        if use_cache and not used_tools and _shareable(inputs, profile):
+            response_cache.put(payload.message, profile.favorite_sport, output)
+        turn_id = record["turn_id"] = _mirror_turn(payload, output)
+        yield {
+            "type": "done",
+            "response": output,
+            "turn_id": turn_id,
+            "route": route.name,
+            "model": chosen.tier.model,
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "context_tokens": context_tokens,
+        }
+        _log_usage(payload, route, chosen, usage, context_tokens)
+        ROUTE_SECONDS.labels(route.name).observe(time.perf_counter() - turn_started)
+
+    return _TurnStream(event_stream(), release)
+
+
+@app.websocket("/chat/ws")
+async def chat_ws(websocket: WebSocket) -> None:
+    """
+    A whole chat session over one WebSocket.
+
+    The first frame is a `/chat` payload without `message`. Its pushed
+    context and the user's profile are applied once, and the session stays
+    resident in this worker while the socket is open. Each following
+    `{"type": "message", "message": ...}` frame is answered, one turn at a
+    time, with the same `token` / `tool` / `done` / `error` events as
+    `/chat/stream`. A turn refused outright (shed, Django unreachable) gets
+    an `error` event with its HTTP `status` and the socket stays open.
+
+    Nothing re-pushes history on later turns, so the client sends
+    `{"type": "turns", "turns": [...]}` with each turn once Django has
+    stored it; that confirms the locally answered turns, which lets them
+    be folded into the summary once they leave the context window.
+    """
+    await websocket.accept()
+    try:
+        try:
+            session = UserMessage(**{**await websocket.receive_json(), "message": ""})
+        except (ValueError, TypeError) as e:
+            await websocket.close(code=1008, reason=f"Invalid session frame: {e}"[:120])
+            return
+        try:
+            session.profile = await _load_profile(session)
+        except HTTPException as e:
+            await websocket.close(code=1011, reason=str(e.detail)[:120])
+            return
+        await websocket.send_json({"type": "ready", "session_id": session.session_id})
+
+        pinned: Optional[SessionEntry] = None
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except ValueError:
+                frame = None
+            if isinstance(frame, dict) and frame.get("type") == "turns":
+                await _confirm_turns(session.session_id, frame.get("turns"))
+                continue
+            message = frame.get("message") if isinstance(frame, dict) else None
+            if not isinstance(message, str) or not message.strip():
+                await websocket.send_json({"type": "error", "status": 422, "detail": "Expected a message frame."})
+                continue
+            pinned = await _pin_session(session.session_id, pinned)
+            payload = session.model_copy(update={"message": message})
+            try:
+                with _ledger_turn(payload, "ws") as record:
+                    # Closed at once if the client leaves mid-turn, freeing its slot
+                    async with aclosing(await _start_stream(payload, record)) as events:
+                        async for event in events:
+                            await websocket.send_json(event)
+            except HTTPException as e:
+                error = {"type": "error", "status": e.status_code, "detail": e.detail}
+                if e.headers and "Retry-After" in e.headers:
+                    error["retry_after"] = int(e.headers["Retry-After"])
+                await websocket.send_json(error)
+            # Pushed history is applied with the first turn; later turns add nothing
+            if session.history:
+                session.history = []
+            pinned = await _pin_session(session.session_id, pinned)
+    except WebSocketDisconnect:
+        pass
+
+
+async def _confirm_turns(session_id: str, turns: Any) -> None:
+    """Apply turns Django has stored (`HistoryTurn`s) to the session, as a pushed delta would."""
+    try:
+        delta = [HistoryTurn(**turn).model_dump() for turn in turns]
+    except (TypeError, ValueError) as e:
+        logger.warning("Ignoring invalid turns frame for session %s: %s", session_id, e)
+        return
+    await sessions.update(session_id, lambda entry: entry.apply_delta(delta))
+
+
+async def _pin_session(session_id: str, pinned: Optional[SessionEntry]) -> Optional[SessionEntry]:
+    """The stored session, put back from `pinned` if the store dropped it meanwhile."""
+    entry = await sessions.get(session_id)
+    if entry is None and pinned is not None:
+        await sessions.put(session_id, pinned)
+        return pinned
+    return entry
+
+
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchRequest) -> StreamingResponse:
+    """
+    Run many messages through the `/chat` pipeline, streaming NDJSON.
+
+    Up to `concurrency` items are in flight at once; items sharing a
+    `session_id` run in order so a replayed conversation builds on its own
+    earlier turns. One `result` line is written per item as it completes
+    (in completion order, tagged with its `index`), then a `summary` line.
+    Items shed by the scheduler wait out `Retry-After` and try again.
+    """
+    if not batch.items:
+        raise HTTPException(status_code=422, detail="Batch has no items.")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items.")
+
+    limit = asyncio.Semaphore(min(batch.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    done: asyncio.Queue = asyncio.Queue()
+    by_session: dict[str, list[int]] = {}
+    for index, item in enumerate(batch.items):
+        by_session.setdefault(item.session_id, []).append(index)
+
+    async def run_item(index: int) -> dict:
+        item = batch.items[index]
+        line = {"type": "result", "index": index, "session_id": item.session_id}
+        started = time.perf_counter()
+        try:
+            async with limit:
+                for attempt in range(BATCH_OVERLOAD_RETRIES + 1):
+                    try:
+                        response = await _run_turn(
+                            item, use_cache=batch.use_cache, persist=batch.persist, path="batch"
+                        )
+                        break
+                    except HTTPException as e:
+                        if e.status_code != 429 or attempt == BATCH_OVERLOAD_RETRIES:
+                            raise
+                        await asyncio.sleep(int(e.headers["Retry-After"]))
+            line.update(status=200, result=response.model_dump())
+        except HTTPException as e:
+            line.update(status=e.status_code, error=e.detail)
+        except Exception as e:
+            logger.exception("Batch item %d failed", index)
+            line.update(status=500, error=str(e))
+        line["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return line
+
+    async def run_session(indices: list[int]) -> None:
+        for index in indices:
+            await done.put(await run_item(index))
+
+    async def batch_stream() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        workers = [asyncio.create_task(run_session(indices)) for indices in by_session.values()]
+        failed = 0
+        try:
+            for _ in batch.items:
+                line = await done.get()
+                failed += line["status"] != 200
+                yield json.dumps(line) + "\n"
+            yield json.dumps({
+                "type": "summary",
+                "items": len(batch.items),
+                "ok": len(batch.items) - failed,
+                "failed": failed,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            }) + "\n"
+        finally:
+            # The client may have gone away mid-batch
+            for worker in workers:
+                worker.cancel()
 
-    return ChatResponse(response=result["output"])
+    return StreamingResponse(batch_stream(), media_type="application/x-ndjson")
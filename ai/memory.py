@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+from metrics import CACHE_LOOKUPS, ERRORS
+from response_cache import normalize
+
+logger = logging.getLogger("sportmate")
+
+# New messages are questions, so an exchange is found by its question more
+# than by the (longer) answer
+_QUESTION_WEIGHT = 2.0
+
+
+class HashingEmbedder:
+    """
+    Local, CPU-only text embedding by feature hashing.
+
+    Unigrams and bigrams of the stopword-free words are hashed into `dim`
+    signed buckets with sublinear term frequency, and the vector is
+    L2-normalised, so a dot product is cosine similarity. Needs no model
+    download and embeds a turn in well under a millisecond; it matches
+    shared words and phrases ("arsenal", "free throws"), not synonyms.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        return h % self.dim, 1.0 if h >> 63 else -1.0
+
+    def embed(self, text: str) -> np.ndarray:
+        words = normalize(text)
+        counts: dict[str, int] = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            index, sign = self._bucket(feature)
+            vector[index] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+@dataclass
+class Memory:
+    id: str
+    session_id: str
+    user_message: str
+    bot_message: str
+    created_at: Optional[str] = None
+
+
+class VectorIndex:
+    """
+    Unit vectors in one float32 matrix with exact cosine top-k search.
+
+    The matrix doubles in capacity as items arrive, up to `max_items`,
+    after which the oldest items are overwritten.
+    """
+
+    def __init__(self, dim: int, max_items: int = 500, capacity: int = 64):
+        self.max_items = max_items
+        self._vectors = np.zeros((min(capacity, max_items), dim), dtype=np.float32)
+        self._items: list[Optional[Memory]] = [None] * len(self._vectors)
+        self._count = 0
+        self._next = 0
+        self.ids: set[str] = set()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, vector: np.ndarray, item: Memory) -> None:
+        if item.id in self.ids:
+            return
+        if self._next == len(self._vectors) and len(self._vectors) < self.max_items:
+            size = min(len(self._vectors) * 2, self.max_items)
+            grown = np.zeros((size, self._vectors.shape[1]), dtype=np.float32)
+            grown[: len(self._vectors)] = self._vectors
+            self._vectors = grown
+            self._items.extend([None] * (len(grown) - len(self._items)))
+        self._next %= len(self._vectors)
+        evicted = self._items[self._next]
+        if evicted is not None:
+            self.ids.discard(evicted.id)
+        self._vectors[self._next] = vector
+        self._items[self._next] = item
+        self.ids.add(item.id)
+        self._next += 1
+        self._count = min(self._count + 1, len(self._vectors))
+
+    def search(
+        self, vector: np.ndarray, k: int, exclude_session: Optional[str] = None
+    ) -> list[tuple[float, Memory]]:
+        if not self._count:
+            return []
+        scores = self._vectors[: self._count] @ vector
+        if exclude_session is not None:
+            for i, item in enumerate(self._items[: self._count]):
+                if item.session_id == exclude_session:
+                    scores[i] = -np.inf
+        k = min(k, self._count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [
+            (float(scores[i]), self._items[i])
+            for i in top[np.argsort(-scores[top])]
+            if np.isfinite(scores[i])
+        ]
+
+
+class _UserMemory:
+    def __init__(self, dim: int, max_items: int):
+        self.index = VectorIndex(dim, max_items)
+        self.synced_until: Optional[str] = None
+        self.synced_at = -math.inf
+        self.syncing: Optional[asyncio.Task] = None
+
+
+class LongTermMemory:
+    """
+    Per-user vector index over past exchanges, across all chat sessions.
+
+    Each user's index is backfilled from Django on first use with their
+    latest `max_turns` turns, topped up with newer turns at most every
+    `sync_interval` seconds (other workers' turns arrive this way), and
+    extended locally as this worker answers. `recall` returns the past
+    exchanges of other sessions most similar to the new message; the
+    current session is already in the prompt through its own history.
+    The `max_users` most recently active users are kept, each taking at
+    most `max_turns` x `dim` x 4 bytes.
+    """
+
+    def __init__(
+        self,
+        embedder: HashingEmbedder,
+        load: Callable[[str, Optional[str]], Awaitable[list[dict]]],
+        *,
+        max_users: int = 256,
+        max_turns: int = 500,
+        sync_interval: float = 300.0,
+    ):
+        self.embedder = embedder
+        self.load = load
+        self.max_users = max_users
+        self.max_turns = max_turns
+        self.sync_interval = sync_interval
+        self._users: "OrderedDict[str, _UserMemory]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def _user(self, user_id: str) -> _UserMemory:
+        memory = self._users.get(user_id)
+        if memory is None:
+            memory = self._users[user_id] = _UserMemory(self.embedder.dim, self.max_turns)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return memory
+
+    def _embed(self, item: Memory) -> np.ndarray:
+        question = self.embedder.embed(item.user_message)
+        vector = _QUESTION_WEIGHT * question + self.embedder.embed(item.bot_message)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, user_id: str, item: Memory) -> None:
+        self._user(user_id).index.add(self._embed(item), item)
+
+    async def sync(self, user_id: str) -> None:
+        """Fetch the user's turns stored since the last sync, if due."""
+        memory = self._user(user_id)
+        if time.monotonic() - memory.synced_at < self.sync_interval:
+            CACHE_LOOKUPS.labels("memory", "hit").inc()
+            return
+        if memory.syncing is None:
+            CACHE_LOOKUPS.labels("memory", "miss").inc()
+            memory.syncing = asyncio.ensure_future(self._sync(memory, user_id))
+        else:
+            CACHE_LOOKUPS.labels("memory", "coalesced").inc()
+        await asyncio.shield(memory.syncing)
+
+    async def _sync(self, memory: _UserMemory, user_id: str) -> None:
+        try:
+            rows = await self.load(user_id, memory.synced_until)
+            for row in rows:
+                item = Memory(
+                    id=str(row["id"]),
+                    session_id=str(row["session_id"]),
+                    user_message=row["user_message"],
+                    bot_message=row.get("bot_message") or "",
+                    created_at=row["created_at"],
+                )
+                memory.index.add(self._embed(item), item)
+                memory.synced_until = item.created_at
+        except Exception as e:
+            # Retried after `sync_interval`; until then recall what is indexed
+            ERRORS.labels("memory_sync").inc()
+            logger.warning("Loading long-term memory for user %s failed: %s", user_id, e)
+        finally:
+            memory.synced_at = time.monotonic()
+            memory.syncing = None
+
+    def recall(
+        self, user_id: str, session_id: str, message: str, k: int = 3, min_score: float = 0.15
+    ) -> list[Memory]:
+        memory = self._users.get(user_id)
+        if memory is None:
+            return []
+        hits = memory.index.search(self.embedder.embed(message), k, exclude_session=session_id)
+        # Hashed features collide; a real match shares at least one word
+        words = set(normalize(message))
+        return [
+            item
+            for score, item in hits
+            if score >= min_score and words & set(normalize(f"{item.user_message} {item.bot_message}"))
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "turns": sum(len(memory.index) for memory in self._users.values()),
+        }
@@ -0,0 +1,246 @@
+import asyncio
+import gc
+import os
+import sys
+import sysconfig
+import tracemalloc
+import types
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+_STDLIB = os.path.realpath(sysconfig.get_paths()["stdlib"])
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+# Shared infrastructure a cache may point at but does not own
+_NOT_OWNED = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.MethodType,
+    types.BuiltinFunctionType,
+    types.FrameType,
+    types.CoroutineType,
+    types.GeneratorType,
+    asyncio.Future,
+    asyncio.AbstractEventLoop,
+)
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux), None elsewhere."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Approximate bytes reachable from `obj`, by `sys.getsizeof` over the
+    `gc` referents. Modules, classes, functions, tasks and the event loop
+    are not followed, so a cache isn't charged for the code and loop it
+    refers to. Objects shared with other caches are counted by each.
+    """
+    seen: set[int] = set()
+    pending = [obj]
+    size = 0
+    while pending:
+        item = pending.pop()
+        if id(item) in seen or isinstance(item, _NOT_OWNED):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item, 0)
+        pending.extend(gc.get_referents(item))
+    return size
+
+
+def heap_summary(limit: int = 25) -> dict:
+    """Collect garbage, then count live gc-tracked objects by type."""
+    unreachable = gc.collect()
+    counts: Counter = Counter()
+    sizes: Counter = Counter()
+    for obj in gc.get_objects():
+        name = f"{type(obj).__module__}.{type(obj).__qualname__}"
+        counts[name] += 1
+        sizes[name] += sys.getsizeof(obj, 0)
+    return {
+        "rss_bytes": rss_bytes(),
+        "collected": unreachable,
+        "uncollectable": len(gc.garbage),
+        "objects": sum(counts.values()),
+        "by_type": [
+            {"type": name, "count": count, "shallow_bytes": sizes[name]}
+            for name, count in counts.most_common(limit)
+        ],
+    }
+
+
+class HeapProfiler:
+    """
+    `tracemalloc` snapshots of this process, kept by name for later diffs.
+
+    Allocations are grouped by `file`, `line`, or `package`: the package
+    of the most recent frame outside the standard library, so a dict
+    built by `json` on behalf of LangChain counts as `langchain_core`, and
+    this service's own modules show as `sportmate.<module>`. That needs
+    tracebacks deeper than one frame; `frames` trades detail for the
+    overhead tracing adds to every allocation (a CPU-bound turn runs about
+    4x slower at one frame and 10x at five).
+    """
+
+    def __init__(self, max_snapshots: int = 4, frames: int = 5):
+        self.max_snapshots = max_snapshots
+        self.frames = frames
+        self.snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+        self._packages: dict[str, str] = {}
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: Optional[int] = None) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or self.frames)
+
+    def stop(self) -> None:
+        """Stop tracing and free the traces, along with every kept snapshot."""
+        tracemalloc.stop()
+        self.snapshots.clear()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing")
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def take(self, name: str) -> dict:
+        """Take and keep a snapshot as `name`, dropping the oldest beyond `max_snapshots`."""
+        snapshot = self._snapshot()
+        self.snapshots.pop(name, None)
+        self.snapshots[name] = snapshot
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+        return {"name": name, "bytes": sum(stat.size for stat in snapshot.statistics("filename"))}
+
+    def package(self, filename: str) -> str:
+        package = self._packages.get(filename)
+        if package is None:
+            package = self._packages[filename] = self._classify(filename)
+        return package
+
+    @staticmethod
+    def _classify(filename: str) -> str:
+        if filename.startswith("<frozen "):
+            return "stdlib"
+        path = os.path.realpath(filename)
+        if os.path.dirname(path) == HERE:
+            return "sportmate." + os.path.splitext(os.path.basename(path))[0]
+        parts = path.split(os.sep)
+        for marker in ("site-packages", "dist-packages"):
+            if marker in parts:
+                top = parts[parts.index(marker) + 1]
+                return os.path.splitext(top)[0]
+        if path.startswith(_STDLIB):
+            return "stdlib"
+        return "other"
+
+    def _by_package(self, snapshot: tracemalloc.Snapshot) -> dict[str, list[int]]:
+        totals: dict[str, list[int]] = {}
+        for stat in snapshot.statistics("traceback"):
+            owner = "stdlib"
+            # Frames run oldest to most recent
+            for frame in reversed(stat.traceback):
+                package = self.package(frame.filename)
+                if package != "stdlib":
+                    owner = package
+                    break
+            total = totals.setdefault(owner, [0, 0])
+            total[0] += stat.size
+            total[1] += stat.count
+        return totals
+
+    def top(self, group: str = "package", limit: int = 20) -> dict:
+        """The biggest allocators in a fresh snapshot."""
+        key_type = _key_type(group)
+        snapshot = self._snapshot()
+        if key_type is None:
+            rows = [
+                {"key": key, "bytes": size, "count": count}
+                for key, (size, count) in self._by_package(snapshot).items()
+            ]
+        else:
+            rows = [
+                {"key": str(stat.traceback[-1]), "bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics(key_type)
+            ]
+        rows.sort(key=lambda row: -row["bytes"])
+        return {"group": group, "bytes": sum(row["bytes"] for row in rows), "top": rows[:limit]}
+
+    def diff(self, base: str, group: str = "package", limit: int = 20) -> dict:
+        """Growth since the snapshot kept as `base`, biggest changes first."""
+        key_type = _key_type(group)
+        if base not in self.snapshots:
+            raise KeyError(base)
+        old, new = self.snapshots[base], self._snapshot()
+        if key_type is None:
+            before, after = self._by_package(old), self._by_package(new)
+            rows = []
+            for key in before.keys() | after.keys():
+                size, count = after.get(key, (0, 0))
+                old_size, old_count = before.get(key, (0, 0))
+                rows.append(
+                    {
+                        "key": key,
+                        "bytes": size,
+                        "diff_bytes": size - old_size,
+                        "count": count,
+                        "diff_count": count - old_count,
+                    }
+                )
+        else:
+            rows = [
+                {
+                    "key": str(stat.traceback[-1]),
+                    "bytes": stat.size,
+                    "diff_bytes": stat.size_diff,
+                    "count": stat.count,
+                    "diff_count": stat.count_diff,
+                }
+                for stat in new.compare_to(old, key_type)
+            ]
+        rows.sort(key=lambda row: -abs(row["diff_bytes"]))
+        return {
+            "base": base,
+            "group": group,
+            "diff_bytes": sum(row["diff_bytes"] for row in rows),
+            "top": rows[:limit],
+        }
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if self.tracing else None,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            # What tracing itself costs
+            "tracemalloc_bytes": tracemalloc.get_tracemalloc_memory(),
+            "rss_bytes": rss_bytes(),
+            "snapshots": list(self.snapshots),
+        }
+
+
+def _key_type(group: str) -> Optional[str]:
+    """The `tracemalloc` statistics key for `group`; None for `package`."""
+    try:
+        return {"package": None, "file": "filename", "line": "lineno"}[group]
+    except KeyError:
+        raise ValueError(f"Unknown group {group!r}; use package, file or line") from None
@@ -0,0 +1,129 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# LLM turns can take tens of seconds; Django calls should take milliseconds
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+REQUEST_SECONDS = Histogram(
+    "sportmate_request_seconds",
+    "Wall time of chat requests, including the full streamed body",
+    ["path"],
+    buckets=_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "sportmate_stage_seconds",
+    "Time spent in each stage of a chat turn",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "sportmate_inflight_requests",
+    "Chat requests currently being served",
+)
+ERRORS = Counter(
+    "sportmate_errors_total",
+    "Failures per stage of a chat turn",
+    ["stage"],
+)
+CACHE_LOOKUPS = Counter(
+    "sportmate_cache_lookups_total",
+    "Cache lookups by cache and result (hit, miss, coalesced)",
+    ["cache", "result"],
+)
+CACHE_ENTRIES = Gauge(
+    "sportmate_cache_entries",
+    "Entries currently held per cache",
+    ["cache"],
+)
+TOOL_CALLS = Counter(
+    "sportmate_tool_calls_total",
+    "Tool calls made by the agent",
+    ["tool"],
+)
+ROUTES = Counter(
+    "sportmate_routes_total",
+    "Routing decisions by route (agent, direct) and deciding layer (rule, model, default)",
+    ["route", "reason"],
+)
+MODEL_TURNS = Counter(
+    "sportmate_model_turns_total",
+    "LLM-answered turns by model tier (lite, standard) and estimated difficulty",
+    ["tier", "difficulty"],
+)
+ROUTE_SECONDS = Histogram(
+    "sportmate_route_seconds",
+    "End-to-end time of LLM-answered turns per route",
+    ["route"],
+    buckets=_BUCKETS,
+)
+SPECULATIVE_SEARCHES = Counter(
+    "sportmate_speculative_searches_total",
+    "Speculative live-intent searches by outcome (started, used, cancelled, unused)",
+    ["outcome"],
+)
+SPECULATIVE_LEAD_SECONDS = Histogram(
+    "sportmate_speculative_lead_seconds",
+    "How long a speculative search had been running when the agent asked for it",
+    buckets=_BUCKETS,
+)
+SEARCH_RESULT_TOKENS = Counter(
+    "sportmate_search_result_tokens_total",
+    "Estimated tokens of search results before and after compaction",
+    ["stage"],
+)
+SEARCH_TOKENS_SAVED = Histogram(
+    "sportmate_search_tokens_saved",
+    "Estimated tokens compaction removed from each search result",
+    buckets=(0, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+PREWARM_REFRESHES = Counter(
+    "sportmate_prewarm_refreshes_total",
+    "Background refreshes of hot searches by result (ok, error)",
+    ["result"],
+)
+HEDGES = Counter(
+    "sportmate_llm_hedges_total",
+    "LLM calls by hedging outcome (none, primary, fallback, failover)",
+    ["outcome"],
+)
+DEADLINES_EXCEEDED = Counter(
+    "sportmate_deadlines_exceeded_total",
+    "Turns abandoned at their deadline, per path",
+    ["path"],
+)
+SHED = Counter(
+    "sportmate_shed_total",
+    "Turns rejected with 429 by admission control",
+    ["plan"],
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing chat requests and counting those in flight.
+
+    Unlike `@app.middleware("http")`, it only returns once the whole
+    response body has been sent, so streamed answers are timed in full.
+    Requests are labelled with their route's path template; those no
+    route matched (404s, probes) share the "other" label, so arbitrary
+    paths cannot grow the number of series.
+    """
+
+    def __init__(self, app, prefix: str = "/chat"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            with IN_FLIGHT.track_inprogress():
+                await self.app(scope, receive, send)
+        finally:
+            # Set by the router once it has matched the request
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "other"
+            REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
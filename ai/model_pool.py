@@ -0,0 +1,90 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from hedging import HedgedModel
+from scheduler import normalize_plan
+
+DIFFICULTIES = ("trivial", "normal", "hard")
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """A Gemini model and the generation settings every call on it uses."""
+
+    name: str
+    model: str
+    temperature: float = 0.7
+    max_output_tokens: Optional[int] = None
+    # Gemini 2.5 thinking tokens are billed as output; None keeps the model default
+    thinking_budget: Optional[int] = None
+
+
+@dataclass
+class TierModels:
+    """The runnables built for one tier."""
+
+    tier: ModelTier
+    # Tool-free chat model (hedged when enabled), also what warm-up and stats see
+    plain: Any
+    # Tool-calling agent runnable for `BoundedAgentExecutor`
+    agent: Any
+    # Prompt | plain model for the direct route
+    direct: Any
+
+
+def parse_plan_tiers(spec: str) -> tuple[str, ...]:
+    """
+    "lite,standard,standard" -> the tier for trivial, normal and hard
+    turns. A single name applies to all three.
+    """
+    names = tuple(name.strip() for name in spec.split(",") if name.strip())
+    if len(names) == 1:
+        names *= len(DIFFICULTIES)
+    if len(names) != len(DIFFICULTIES):
+        raise ValueError(f"Expected one tier or one per difficulty ({', '.join(DIFFICULTIES)}), got {spec!r}")
+    return names
+
+
+class ModelPool:
+    """
+    The configured model tiers, built once at startup and shared by every
+    turn, and the policy picking one per turn from the user's plan and the
+    turn's estimated difficulty.
+
+    `plans` maps each plan to its tier per difficulty, in `DIFFICULTIES`
+    order; unknown plans are treated as FREE like the scheduler does.
+    """
+
+    def __init__(self, tiers: dict[str, TierModels], plans: dict[str, tuple[str, ...]]):
+        for plan, names in plans.items():
+            unknown = set(names) - tiers.keys()
+            if unknown:
+                raise ValueError(f"Plan {plan} uses unknown model tiers {sorted(unknown)}")
+        self.tiers = tiers
+        self.plans = plans
+        self.chosen = {(plan, tier): 0 for plan in plans for tier in set(plans[plan])}
+
+    def __getitem__(self, name: str) -> TierModels:
+        return self.tiers[name]
+
+    def choose(self, plan: Optional[str], difficulty: str) -> TierModels:
+        plan = normalize_plan(plan)
+        name = self.plans[plan][DIFFICULTIES.index(difficulty)]
+        self.chosen[plan, name] += 1
+        return self.tiers[name]
+
+    def stats(self) -> dict:
+        return {
+            "tiers": {
+                name: {
+                    "model": models.tier.model,
+                    "temperature": models.tier.temperature,
+                    "max_output_tokens": models.tier.max_output_tokens,
+                    "thinking_budget": models.tier.thinking_budget,
+                    "hedging": models.plain.stats() if isinstance(models.plain, HedgedModel) else None,
+                }
+                for name, models in self.tiers.items()
+            },
+            "plans": {plan: dict(zip(DIFFICULTIES, names)) for plan, names in self.plans.items()},
+            "chosen": {f"{plan}/{tier}": count for (plan, tier), count in sorted(self.chosen.items())},
+        }
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from metrics import PREWARM_REFRESHES
+from search_cache import SearchCache, normalize_query
+
+logger = logging.getLogger("sportmate")
+
+# Searches kept warm for each of the most popular favourite sports
+SPORT_QUERIES = ("{sport} live scores today", "latest {sport} news")
+
+
+class DecayingCounter:
+    """
+    Per-key event counts that halve every `half_life` seconds: a recent
+    request-rate estimate that needs no timestamps per event.
+    """
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._scores: dict[str, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __iter__(self):
+        return iter(self._scores)
+
+    def add(self, key: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self._scores[key] = (self.score(key, now) + 1.0, now)
+
+    def score(self, key: str, now: Optional[float] = None) -> float:
+        item = self._scores.get(key)
+        if item is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        score, at = item
+        return score * 0.5 ** ((now - at) / self.half_life)
+
+    def rate(self, key: str, now: Optional[float] = None) -> float:
+        """Events per second, exact for a steady stream of events."""
+        return self.score(key, now) * math.log(2) / self.half_life
+
+    def top(self, n: int, now: Optional[float] = None) -> list[tuple[str, float]]:
+        """The `n` keys with the highest rate, with their rates."""
+        now = time.monotonic() if now is None else now
+        rates = ((key, self.rate(key, now)) for key in self._scores)
+        return sorted(rates, key=lambda item: item[1], reverse=True)[:n]
+
+    def prune(self, min_score: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for key in [k for k in self._scores if self.score(k, now) < min_score]:
+            del self._scores[key]
+
+
+class Prewarmer:
+    """
+    Keeps hot searches fresh in the search cache before anyone asks.
+
+    Hot searches are the queries the agent made most often recently, plus
+    `SPORT_QUERIES` for the favourite sports of the most active users
+    (ties broken by Django's counts across all users). A query stays hot
+    while it is expected at least once per cache TTL (for sport queries:
+    a turn from a fan of that sport), and is re-fetched every
+    `requests_per_refresh / rate` seconds, bounded by `min_interval` and
+    its TTL: busier queries are fresher, quieter ones are refreshed just
+    before they expire. Without demand nothing is refreshed, since every
+    refresh is a paid Tavily call.
+    """
+
+    def __init__(
+        self,
+        cache: SearchCache,
+        fetch: Callable[[str], Awaitable[Any]],
+        *,
+        load_sports: Optional[Callable[[], Awaitable[dict[str, int]]]] = None,
+        max_queries: int = 20,
+        max_sports: int = 3,
+        half_life: float = 900.0,
+        requests_per_refresh: float = 5.0,
+        min_interval: float = 15.0,
+        sports_interval: float = 3600.0,
+        tick: float = 5.0,
+        max_concurrency: int = 2,
+    ):
+        self.cache = cache
+        self.fetch = fetch
+        self.load_sports = load_sports
+        self.max_queries = max_queries
+        self.max_sports = max_sports
+        self.requests_per_refresh = requests_per_refresh
+        self.min_interval = min_interval
+        self.sports_interval = sports_interval
+        self.tick = tick
+        self.searches = DecayingCounter(half_life)
+        self.sports = DecayingCounter(half_life)
+        self._queries: dict[str, str] = {}
+        self._baseline: dict[str, int] = {}
+        self._baseline_at = -math.inf
+        self._next: dict[str, float] = {}
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._worker: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def record_search(self, query: str) -> None:
+        key = normalize_query(query)
+        if key:
+            self._queries.setdefault(key, query)
+            self.searches.add(key)
+
+    def record_sport(self, sport: Optional[str]) -> None:
+        sport = " ".join((sport or "").lower().split())
+        if sport:
+            self.sports.add(sport)
+
+    def hot(self, now: Optional[float] = None) -> dict[str, tuple[str, float]]:
+        """Normalised key -> (query, request rate) of every search to keep warm."""
+        now = time.monotonic() if now is None else now
+        hot = {}
+        for key, rate in self.searches.top(self.max_queries, now):
+            query = self._queries[key]
+            if rate * self.cache.ttl_for(query) >= 1.0:
+                hot[key] = (query, rate)
+
+        sports = sorted(
+            self.sports,
+            key=lambda s: (self.sports.rate(s, now), self._baseline.get(s, 0)),
+            reverse=True,
+        )
+        for sport in sports[: self.max_sports]:
+            demand = self.sports.rate(sport, now)
+            for template in SPORT_QUERIES:
+                query = template.format(sport=sport)
+                key = normalize_query(query)
+                rate = max(demand, self.searches.rate(key, now))
+                if rate * self.cache.ttl_for(query) >= 1.0:
+                    hot.setdefault(key, (query, rate))
+        return hot
+
+    def interval(self, query: str, rate: float) -> float:
+        """Seconds between refreshes of a hot `query`; one tick short of its TTL at most."""
+        latest = max(self.cache.ttl_for(query) - self.tick, self.tick)
+        if rate <= 0:
+            return latest
+        return min(max(self.requests_per_refresh / rate, self.min_interval), latest)
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._refresh_sports()
+                await self._refresh_due()
+            except Exception:
+                logger.exception("Pre-warm pass failed")
+            await asyncio.sleep(self.tick)
+
+    async def _refresh_sports(self) -> None:
+        if self.load_sports is None or time.monotonic() - self._baseline_at < self.sports_interval:
+            return
+        self._baseline_at = time.monotonic()
+        try:
+            self._baseline = await self.load_sports()
+        except Exception as e:
+            logger.warning("Loading favourite sports for pre-warming failed: %s", e)
+
+    async def _refresh_due(self) -> None:
+        now = time.monotonic()
+        hot = self.hot(now)
+        for key in self._next.keys() - hot.keys():
+            del self._next[key]
+        due = []
+        for key, (query, rate) in hot.items():
+            if key not in self._next and self.cache.get(query) is not None:
+                # Just fetched on demand; wait a full interval
+                self._next[key] = now + self.interval(query, rate)
+            elif self._next.get(key, now) <= now:
+                due.append(self._refresh(key, query, rate))
+        await asyncio.gather(*due)
+
+        self.searches.prune(0.05, now)
+        self.sports.prune(0.05, now)
+        for key in self._queries.keys() - set(self.searches):
+            del self._queries[key]
+
+    async def _refresh(self, key: str, query: str, rate: float) -> None:
+        async with self._limit:
+            try:
+                await self.cache.refresh(query, self.fetch)
+                self.refreshes += 1
+                PREWARM_REFRESHES.labels("ok").inc()
+            except Exception as e:
+                self.failures += 1
+                PREWARM_REFRESHES.labels("error").inc()
+                logger.warning("Pre-warming %r failed: %s", query, e)
+        self._next[key] = time.monotonic() + self.interval(query, rate)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "hot": {
+                query: {"rate_per_min": round(rate * 60, 2), "interval_s": round(self.interval(query, rate), 1)}
+                for query, rate in self.hot(now).values()
+            },
+            "tracked_queries": len(self.searches),
+            "tracked_sports": len(self.sports),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
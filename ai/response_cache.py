@@ -0,0 +1,160 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+from metrics import CACHE_LOOKUPS
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "do", "does", "how", "what",
+    "please", "can", "you", "me", "to", "of", "in", "on", "for", "and", "s",
+}
+# Words that tie a question to earlier turns; such questions aren't evergreen
+_CONTEXT_WORDS = {
+    "he", "she", "him", "her", "his", "they", "them", "their", "it", "its",
+    "that", "this", "those", "these", "above", "again", "previous", "earlier",
+}
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def normalize(text: str) -> list[str]:
+    return [t for t in _tokens(text) if t not in _STOPWORDS]
+
+
+def is_standalone(text: str, min_words: int = 2) -> bool:
+    """True for questions that make sense without the conversation so far."""
+    tokens = _tokens(text)
+    return len(normalize(text)) >= min_words and not (set(tokens) & _CONTEXT_WORDS)
+
+
+def _hash64(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+
+
+def simhash(words: list[str]) -> int:
+    """64-bit SimHash over unigrams and bigrams of `words`."""
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    weights = [0] * BITS
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def _bands(fingerprint: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (i * BAND_BITS) & mask for i in range(BANDS)]
+
+
+@dataclass
+class _Entry:
+    bucket: str
+    fingerprint: int
+    response: str
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Near-duplicate cache of answers to evergreen questions.
+
+    Questions are fingerprinted with SimHash and bucketed by favourite
+    sport. A lookup matches any stored question whose fingerprint is
+    within `max_distance` bits. The 64 bits are split into four 16-bit
+    bands, so such a match always shares at least one band exactly while
+    `max_distance` < 4, and only those candidates are compared.
+
+    Entries are shared by every user with the same sport, so callers only
+    store answers whose prompt held nothing else about the user (no
+    history, summary, memories or profile details).
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 86400.0, max_distance: int = 3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._index: dict[tuple[str, int, int], set[int]] = defaultdict(set)
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _bucket(sport: Optional[str]) -> str:
+        return " ".join(_tokens(sport or "")) or "-"
+
+    def get(self, question: str, sport: Optional[str]) -> Optional[str]:
+        if not is_standalone(question):
+            return None
+        bucket = self._bucket(sport)
+        fingerprint = simhash(normalize(question))
+        now = time.monotonic()
+
+        best: Optional[tuple[int, int]] = None
+        for band, value in enumerate(_bands(fingerprint)):
+            for entry_id in list(self._index.get((bucket, band, value), ())):
+                entry = self._entries[entry_id]
+                if entry.expires_at < now:
+                    self._remove(entry_id)
+                    continue
+                distance = bin(entry.fingerprint ^ fingerprint).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, entry_id)
+
+        if best is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels("response", "miss").inc()
+            return None
+        self.hits += 1
+        CACHE_LOOKUPS.labels("response", "hit").inc()
+        self._entries.move_to_end(best[1])
+        return self._entries[best[1]].response
+
+    def put(self, question: str, sport: Optional[str], response: str) -> None:
+        if not is_standalone(question) or not response:
+            return
+        bucket = self._bucket(sport)
+        fingerprint = simhash(normalize(question))
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(bucket, fingerprint, response, time.monotonic() + self.ttl)
+        for band, value in enumerate(_bands(fingerprint)):
+            self._index[(bucket, band, value)].add(entry_id)
+        self.stores += 1
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for band, value in enumerate(_bands(entry.fingerprint)):
+            key = (entry.bucket, band, value)
+            ids = self._index.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._index[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
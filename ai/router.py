@@ -0,0 +1,158 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Messages matching these always need fresh data from the search tool.
+# Words that also name a rule or a sport ("scored", "table tennis") are
+# left to the lexical model.
+_LIVE_RULE = re.compile(
+    r"\b(live|latest|scoreline|final score|news|today|tonight|yesterday|last night|"
+    r"this (week|weekend|season|year)|right now|currently|who won|who is winning|"
+    r"fixtures?|standings|(league|points) table|transfer|injur(y|ed|ies)|line-?up|kick-?off|"
+    r"result[s]?|schedule|next (game|match|race|fight))\b"
+)
+# Greetings and acknowledgements: no real question to answer
+_SMALL_TALK = r"^(hi|hello|hey|thanks|thank you|ok|okay|cool|bye)\b"
+# Messages matching these are usually answerable from general knowledge
+_EVERGREEN_RULE = re.compile(
+    _SMALL_TALK + "|"
+    r"\b(explain|rules?|how (do|does|is|are)|what (is|are|does) (a|an|the)|"
+    r"meaning of|history of|tips?|drills?|technique|difference between|"
+    r"why (do|does|is|are)|define|definition|mean|how (long|many)|of all time)\b"
+)
+# Messages asking for analysis or a multi-part answer
+_HARD_RULE = re.compile(
+    r"\b(compare|comparison|versus|vs|analy[sz]e|analysis|predict(ion)?s?|"
+    r"strateg(y|ies)|tactic(s|al)?|formation|(training|workout|diet|meal) (plan|program(me)?)|"
+    r"pros and cons|step by step|in detail|break ?down)\b"
+)
+_SMALL_TALK_RULE = re.compile(_SMALL_TALK)
+
+# Seed examples for the lexical model: (message, needs_search)
+_SEED = [
+    ("what was the score of the arsenal game", True),
+    ("did the lakers win last night", True),
+    ("who won the f1 race", True),
+    ("latest transfer news for chelsea", True),
+    ("is messi playing tonight", True),
+    ("current premier league table", True),
+    ("when do real madrid play next", True),
+    ("any updates on mbappe's injury", True),
+    ("how did india do in the test match", True),
+    ("who is top of the nba standings", True),
+    ("what happened in the champions league final", True),
+    ("is the game on tv this weekend", True),
+    ("how many goals has haaland scored this season", True),
+    ("what are the odds for the derby", True),
+    ("did djokovic win his match", True),
+    ("explain the offside rule", False),
+    ("how is a tennis tiebreak scored", False),
+    ("what is a hat trick", False),
+    ("give me tips to improve my free throws", False),
+    ("what position should a tall player play in volleyball", False),
+    ("who is the greatest footballer of all time", False),
+    ("how long is a rugby match", False),
+    ("what does lbw mean in cricket", False),
+    ("recommend a workout for sprinters", False),
+    ("how many players are on a hockey team", False),
+    ("why is the marathon 26.2 miles", False),
+    ("tell me about the history of the world cup", False),
+    ("i support liverpool", False),
+    ("what should i eat before a match", False),
+    ("how do i get better at chess openings", False),
+    ("thanks that was helpful", False),
+    ("hi", False),
+    ("hello there", False),
+    ("how do you play table tennis", False),
+    ("what are the rules of badminton", False),
+]
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class NaiveBayes:
+    """Tiny multinomial naive Bayes over word unigrams and bigrams."""
+
+    def __init__(self, examples: list[tuple[str, bool]], alpha: float = 1.0):
+        self.alpha = alpha
+        self.counts = {True: Counter(), False: Counter()}
+        docs = Counter()
+        for text, label in examples:
+            self.counts[label].update(self._features(text))
+            docs[label] += 1
+        self.totals = {label: sum(c.values()) for label, c in self.counts.items()}
+        self.vocab = len(set(self.counts[True]) | set(self.counts[False]))
+        self.priors = {label: math.log(docs[label] / len(examples)) for label in (True, False)}
+
+    @staticmethod
+    def _features(text: str) -> list[str]:
+        words = _tokens(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def probability(self, text: str) -> float:
+        """P(needs_search | text)."""
+        scores = {}
+        for label in (True, False):
+            denom = self.totals[label] + self.alpha * self.vocab
+            scores[label] = self.priors[label] + sum(
+                math.log((self.counts[label][f] + self.alpha) / denom)
+                for f in self._features(text)
+            )
+        top = max(scores.values())
+        live, other = (math.exp(scores[label] - top) for label in (True, False))
+        return live / (live + other)
+
+
+@dataclass
+class Route:
+    # "agent" (tool-calling AgentExecutor) or "direct" (one tool-free LLM call)
+    name: str
+    reason: str
+
+
+class Router:
+    """
+    Cheap local pre-classifier deciding whether a message needs the search
+    agent. A message goes `direct` only when it looks evergreen and the
+    lexical model is confident no search is needed; the live rule or an
+    unsure model sends it to the full agent, however evergreen it looks
+    ("what are the odds for the derby").
+    """
+
+    def __init__(self, direct_threshold: float = 0.3, trivial_words: int = 6, hard_words: int = 60):
+        self.direct_threshold = direct_threshold
+        self.trivial_words = trivial_words
+        self.hard_words = hard_words
+        self.model = NaiveBayes(_SEED)
+
+    def is_live(self, message: str) -> bool:
+        """Whether the message asks for live or recent data (scores, news, ...)."""
+        return bool(_LIVE_RULE.search(message.lower()))
+
+    def difficulty(self, message: str) -> str:
+        """
+        "trivial" (small talk or a short question), "hard" (analysis, plans,
+        comparisons or a long message) or "normal"; picks the model tier.
+        """
+        text = message.lower()
+        words = len(_tokens(text))
+        if _HARD_RULE.search(text) or words > self.hard_words:
+            return "hard"
+        if _SMALL_TALK_RULE.search(text) or words <= self.trivial_words:
+            return "trivial"
+        return "normal"
+
+    def route(self, message: str) -> Route:
+        text = message.lower()
+        if _LIVE_RULE.search(text):
+            return Route("agent", "rule")
+        if self.model.probability(text) >= self.direct_threshold:
+            return Route("agent", "model")
+        if _EVERGREEN_RULE.search(text):
+            return Route("direct", "rule")
+        return Route("agent", "default")
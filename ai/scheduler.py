@@ -0,0 +1,125 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from typing import Optional
+
+# Lower value is served first
+PLAN_PRIORITY = {"PAID": 0, "TRIAL": 1, "FREE": 2}
+
+
+def normalize_plan(plan: Optional[str]) -> str:
+    plan = (plan or "FREE").upper()
+    return plan if plan in PLAN_PRIORITY else "FREE"
+
+
+class Overloaded(Exception):
+    """No slot could be granted; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, plan: str, retry_after: int):
+        super().__init__(f"Too many concurrent {plan} requests")
+        self.plan = plan
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A granted unit of LLM concurrency; releasing it twice is a no-op."""
+
+    def __init__(self, scheduler: "PriorityScheduler"):
+        self._scheduler = scheduler
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._scheduler._release(time.monotonic() - self._started)
+
+    async def __aenter__(self) -> "Slot":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class PriorityScheduler:
+    """
+    Bounded-concurrency gate for LLM calls with plan-based priority.
+
+    At most `max_concurrency` turns run at once. Waiting turns are served
+    PAID before TRIAL before FREE (FIFO within a plan). A turn is shed with
+    `Overloaded` when its plan's queue is full or it has waited longer than
+    its plan's queue-time limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        queue_timeouts: dict[str, float],
+        max_queued: dict[str, int],
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeouts = queue_timeouts
+        self.max_queued = max_queued
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._queued = {plan: 0 for plan in PLAN_PRIORITY}
+        self._seq = itertools.count()
+        # Moving average of how long a slot is held, for Retry-After
+        self._avg_hold = 5.0
+        self.admitted = {plan: 0 for plan in PLAN_PRIORITY}
+        self.shed = {plan: 0 for plan in PLAN_PRIORITY}
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_hold * backlog / self.max_concurrency))
+
+    async def acquire(self, plan: Optional[str]) -> Slot:
+        plan = normalize_plan(plan)
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self.admitted[plan] += 1
+            return Slot(self)
+
+        if self._queued[plan] >= self.max_queued[plan]:
+            self.shed[plan] += 1
+            raise Overloaded(plan, self._retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PLAN_PRIORITY[plan], next(self._seq), future))
+        self._queued[plan] += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeouts[plan])
+        except asyncio.TimeoutError:
+            self.shed[plan] += 1
+            raise Overloaded(plan, self._retry_after())
+        except asyncio.CancelledError:
+            # Cancelled right after being handed a slot: pass it on
+            if future.done() and not future.cancelled():
+                self._release(0.0)
+            raise
+        finally:
+            self._queued[plan] -= 1
+        self.admitted[plan] += 1
+        return Slot(self)
+
+    def _release(self, held: float) -> None:
+        self._avg_hold += 0.1 * (held - self._avg_hold)
+        # Hand the slot straight to the best waiter that is still waiting
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": dict(self._queued),
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+        }
@@ -0,0 +1,74 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+# Version 1: message + credentials only, the service calls Django back for
+# history and profile. Version 2: Django pushes that context inline.
+SCHEMA_VERSION = 2
+
+
+class HistoryTurn(BaseModel):
+    user_message: str
+    bot_message: Optional[str] = ""
+    created_at: str
+
+
+class Profile(BaseModel):
+    favorite_sport: Optional[str] = None
+    details: Optional[str] = None
+
+
+class UserMessage(BaseModel):
+    message: str
+    session_id: str
+    # Django's user primary key (a UUID); older callers may send an int
+    user_id: str
+    access_token: str
+    schema_version: int = 1
+    # Subscription.subscription_type; decides scheduling priority
+    plan: Optional[str] = None
+
+    # v2 context push; any part left out is fetched from Django instead
+    history: Optional[list[HistoryTurn]] = None
+    summary: Optional[str] = None
+    summary_until: Optional[str] = None
+    profile: Optional[Profile] = None
+
+    @field_validator("user_id", mode="before")
+    @classmethod
+    def _user_id_as_str(cls, value):
+        return str(value) if isinstance(value, int) else value
+
+    @field_validator("schema_version")
+    @classmethod
+    def _supported_version(cls, value: int) -> int:
+        if not 1 <= value <= SCHEMA_VERSION:
+            raise ValueError(f"Unsupported schema_version {value}; this service speaks up to {SCHEMA_VERSION}.")
+        return value
+
+
+class ChatResponse(BaseModel):
+    response: str
+    # Id the turn is stored under in Django, shared by every writer
+    turn_id: Optional[str] = None
+    # Served from the near-duplicate response cache without calling Gemini
+    cached: bool = False
+    # "agent" (search-capable), "direct" (tool-free fast path) or "cache"
+    route: Optional[str] = None
+    # Gemini model of the tier that answered; None for cached answers
+    model: Optional[str] = None
+    # Real Gemini input tokens across every LLM call of the turn
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Estimated tokens of summary + verbatim history sent with the turn
+    context_tokens: int = 0
+
+
+class BatchRequest(BaseModel):
+    items: list[UserMessage]
+    # Items in flight at once; capped by the service's BATCH_MAX_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
+    # False bypasses the response cache, e.g. to re-run evals after a prompt change
+    use_cache: bool = True
+    # False keeps turns out of session history and Django (eval runs)
+    persist: bool = True
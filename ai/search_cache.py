@@ -0,0 +1,275 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from metrics import (
+    CACHE_LOOKUPS,
+    ERRORS,
+    SPECULATIVE_LEAD_SECONDS,
+    SPECULATIVE_SEARCHES,
+    STAGE_SECONDS,
+    TOOL_CALLS,
+)
+
+# Words that never change what a search returns
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "what", "whats", "what's", "of",
+    "for", "in", "on", "at", "me", "please", "tell", "show", "give", "s",
+}
+_LIVE_WORDS = {"live", "score", "scores", "now", "today", "tonight", "currently", "halftime", "result", "results"}
+_NEWS_WORDS = {"news", "latest", "recent", "transfer", "injury", "injured", "rumour", "rumor", "update", "updates"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation, filler-word and word-order insensitive cache key."""
+    words = {w for w in _TOKEN_RE.findall(query.lower()) if w not in _STOPWORDS}
+    return " ".join(sorted(words))
+
+
+def classify_query(query: str) -> str:
+    """Bucket a query into `live`, `news` or `general` for its TTL."""
+    words = set(_TOKEN_RE.findall(query.lower()))
+    if words & _LIVE_WORDS:
+        return "live"
+    if words & _NEWS_WORDS:
+        return "news"
+    return "general"
+
+
+class SearchCache:
+    """
+    In-memory TTL cache for search results with single-flight coalescing.
+
+    Concurrent lookups of the same normalised query share one in-flight
+    request instead of each hitting Tavily. Entries expire after the TTL
+    of their query class, and the least recently used are evicted once
+    `max_entries` is reached. `transform(query, result)`, if given, is
+    applied once as a result is stored (e.g. compaction), so hits return
+    it ready to use.
+    """
+
+    def __init__(
+        self,
+        ttls: dict[str, float],
+        max_entries: int = 2048,
+        transform: Optional[Callable[[str, Any], Any]] = None,
+    ):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        self.transform = transform
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> Optional[Any]:
+        key = normalize_query(query)
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def ttl_for(self, query: str) -> float:
+        return self.ttls.get(classify_query(query), self.ttls["general"])
+
+    def put(self, query: str, value: Any, transform: bool = True) -> Any:
+        """Store `value` (transformed, unless it already is) and return what was stored."""
+        if transform and self.transform is not None:
+            value = self.transform(query, value)
+        key = normalize_query(query)
+        ttl = self.ttl_for(query)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    async def get_or_fetch(self, query: str, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        cached = self.get(query)
+        if cached is not None:
+            self.hits += 1
+            CACHE_LOOKUPS.labels("search", "hit").inc()
+            return cached
+
+        key = normalize_query(query)
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            CACHE_LOOKUPS.labels("search", "miss").inc()
+            task = self._start(key, query, fetch)
+        else:
+            self.coalesced += 1
+            CACHE_LOOKUPS.labels("search", "coalesced").inc()
+        # A cancelled caller must not cancel the fetch other callers share
+        return await asyncio.shield(task)
+
+    async def refresh(self, query: str, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        """Re-fetch `query` even if cached; lookups meanwhile share the fetch."""
+        key = normalize_query(query)
+        task = self._inflight.get(key) or self._start(key, query, fetch)
+        return await asyncio.shield(task)
+
+    def _start(self, key: str, query: str, fetch: Callable[[str], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(key, query, fetch))
+        # Mark failures as retrieved even if every waiter went away
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: str, query: str, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        try:
+            with STAGE_SECONDS.labels("tavily_search").time():
+                result = await fetch(query)
+            return self.put(query, result)
+        except Exception:
+            ERRORS.labels("tavily_search").inc()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+# The current turn's speculative search, if any
+_speculation: ContextVar[Optional["Speculation"]] = ContextVar("speculative_search", default=None)
+
+
+def _overlap(a: str, b: str) -> float:
+    """Jaccard similarity of two queries' normalised words."""
+    words_a, words_b = set(normalize_query(a).split()), set(normalize_query(b).split())
+    union = words_a | words_b
+    return len(words_a & words_b) / len(union) if union else 0.0
+
+
+class Speculation:
+    """
+    A search started from the user's message before the agent asked for it.
+
+    While active (`with speculation:`), a search tool call whose query
+    overlaps the speculated one by at least `min_overlap` awaits this task
+    instead of starting another. On exit an unclaimed search is cancelled.
+    """
+
+    def __init__(self, query: str, task: asyncio.Task, min_overlap: float):
+        self.query = query
+        self.task = task
+        self.min_overlap = min_overlap
+        self.started = time.monotonic()
+        self.used = False
+        self.finished = False
+
+    def claim(self, query: str) -> Optional[asyncio.Task]:
+        if _overlap(query, self.query) < self.min_overlap:
+            return None
+        if not self.used:
+            self.used = True
+            # How far ahead the speculative search got: latency taken off the turn
+            SPECULATIVE_LEAD_SECONDS.observe(time.monotonic() - self.started)
+        return self.task
+
+    def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        if self.used:
+            outcome = "used"
+        elif not self.task.done():
+            self.task.cancel()
+            outcome = "cancelled"
+        else:
+            outcome = "unused"
+        SPECULATIVE_SEARCHES.labels(outcome).inc()
+
+    def __enter__(self) -> "Speculation":
+        _speculation.set(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _speculation.set(None)
+        self.finish()
+
+
+def speculate(search: BaseTool, cache: SearchCache, query: str, min_overlap: float = 0.5) -> Optional[Speculation]:
+    """Start searching for `query` now, unless it is already cached."""
+    if cache.get(query) is not None:
+        return None
+
+    async def fetch() -> Any:
+        try:
+            with STAGE_SECONDS.labels("tavily_search").time():
+                result = await search.ainvoke({"query": query})
+        except Exception:
+            ERRORS.labels("tavily_search").inc()
+            raise
+        return cache.put(query, result)
+
+    task = asyncio.create_task(fetch())
+    # Mark failures as retrieved even if nobody claims the search
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    SPECULATIVE_SEARCHES.labels("started").inc()
+    return Speculation(query, task, min_overlap)
+
+
+class SearchInput(BaseModel):
+    query: str = Field(description="Search query to look up")
+
+
+def cached_search_tool(
+    search: BaseTool,
+    cache: SearchCache,
+    on_query: Optional[Callable[[str], None]] = None,
+) -> StructuredTool:
+    """
+    Wrap `search` in a tool of the same name that reads through `cache`,
+    answering from the turn's speculative search when the query matches.
+    `on_query` sees every query the agent makes.
+    """
+
+    async def _fetch(query: str) -> Any:
+        speculation = _speculation.get()
+        task = speculation.claim(query) if speculation is not None else None
+        if task is not None:
+            try:
+                # Already stored (and transformed) under the speculated query
+                return cache.put(query, await task, transform=False)
+            except Exception:
+                pass  # fall back to a regular search
+        return await cache.get_or_fetch(query, lambda q: search.ainvoke({"query": q}))
+
+    async def _search(query: str) -> Any:
+        TOOL_CALLS.labels(search.name).inc()
+        if on_query is not None:
+            on_query(query)
+        return await _fetch(query)
+
+    return StructuredTool.from_function(
+        coroutine=_search,
+        name=search.name,
+        description=search.description,
+        args_schema=SearchInput,
+    )
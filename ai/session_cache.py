@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from metrics import CACHE_LOOKUPS
+
+
+def is_after(timestamp: str, reference: Optional[str]) -> bool:
+    """Compare two ISO-8601 `created_at` values from Django."""
+    if reference is None:
+        return True
+    return datetime.fromisoformat(timestamp) > datetime.fromisoformat(reference)
+
+
+@dataclass
+class Turn:
+    user_message: str
+    bot_message: str
+    # `created_at` from Django; None while the turn only exists locally
+    created_at: Optional[str] = None
+
+
+@dataclass
+class SessionEntry:
+    """Conversation state kept for one `ChatClass` session."""
+
+    # Turns Django has confirmed that are not folded into `summary`, oldest first
+    turns: list[Turn] = field(default_factory=list)
+    # `created_at` of the newest confirmed turn; the next delta fetch asks
+    # Django only for turns after this point
+    last_seen: Optional[str] = None
+    # Turns answered here but not yet seen in a Django delta
+    pending: list[Turn] = field(default_factory=list)
+    # Rolling summary of everything up to and including `summary_until`
+    summary: str = ""
+    summary_until: Optional[str] = None
+    expires_at: float = 0.0
+
+    def apply_delta(self, turns: list[dict]) -> None:
+        """Append turns fetched from Django, reconciling local pending ones."""
+        for item in turns:
+            # Pushed context may overlap with what is already cached
+            if not is_after(item["created_at"], self.last_seen):
+                continue
+            if self.pending and self.pending[0].user_message == item["user_message"]:
+                self.pending.pop(0)
+            self.turns.append(
+                Turn(item["user_message"], item["bot_message"] or "", item["created_at"])
+            )
+            self.last_seen = item["created_at"]
+
+    def add_pending(self, turn: Turn, keep: int) -> None:
+        """
+        Record a locally answered turn, keeping only the newest `keep`:
+        older ones are outside any context window and cannot be folded
+        until Django confirms them anyway.
+        """
+        self.pending.append(turn)
+        del self.pending[:-keep]
+
+    def all_turns(self) -> list[Turn]:
+        """Confirmed turns followed by locally answered ones."""
+        return self.turns + self.pending
+
+    def fold(self, summary: str, folded: list[Turn]) -> bool:
+        """
+        Replace `folded` (a prefix of `turns`) with the updated summary.
+        Returns False, changing nothing, if `turns` no longer starts with
+        `folded` because another worker folded them first.
+        """
+        head = [t.created_at for t in self.turns[: len(folded)]]
+        if head != [t.created_at for t in folded]:
+            return False
+        self.summary = summary
+        self.summary_until = folded[-1].created_at
+        del self.turns[: len(folded)]
+        return True
+
+
+class SessionCache:
+    """
+    Bounded LRU cache of `SessionEntry` objects with a sliding TTL.
+
+    Lets `_build_inputs` skip re-downloading and re-building the whole
+    transcript on every message: a cached session only needs the turns
+    Django stored since `last_seen`.
+    """
+
+    def __init__(self, max_sessions: int = 1024, ttl: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        entry = self._entries.get(session_id)
+        if entry is not None and entry.expires_at < time.monotonic():
+            del self._entries[session_id]
+            entry = None
+        if entry is None:
+            CACHE_LOOKUPS.labels("session", "miss").inc()
+            return None
+        CACHE_LOOKUPS.labels("session", "hit").inc()
+        self._touch(session_id, entry)
+        return entry
+
+    def put(self, session_id: str, entry: SessionEntry) -> None:
+        self._touch(session_id, entry)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def peek(self, session_id: str) -> Optional[SessionEntry]:
+        """The cached entry, without counting a lookup or refreshing its TTL."""
+        return self._entries.get(session_id)
+
+    def _touch(self, session_id: str, entry: SessionEntry) -> None:
+        entry.expires_at = time.monotonic() + self.ttl
+        self._entries[session_id] = entry
+        self._entries.move_to_end(session_id)
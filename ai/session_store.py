@@ -0,0 +1,224 @@
+import dataclasses
+import json
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from metrics import CACHE_LOOKUPS, ERRORS
+from session_cache import SessionCache, SessionEntry, Turn
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: the memory store needs nothing extra
+    aioredis = None
+
+logger = logging.getLogger("sportmate")
+
+# Worker-local bookkeeping that must not be shared through the store
+_LOCAL_FIELDS = {"expires_at"}
+
+
+def dump_entry(entry: SessionEntry) -> str:
+    data = dataclasses.asdict(entry)
+    for name in _LOCAL_FIELDS:
+        data.pop(name)
+    return json.dumps(data)
+
+
+def load_entry(raw: str) -> SessionEntry:
+    data = json.loads(raw)
+    data["turns"] = [Turn(**t) for t in data["turns"]]
+    data["pending"] = [Turn(**t) for t in data["pending"]]
+    return SessionEntry(**data)
+
+
+class MemorySessionStore:
+    """
+    Per-process session store: the LRU `SessionCache` plus cached profiles.
+
+    Entries are shared by reference, so changes to a loaded entry are
+    visible without a `put`. Nothing survives a restart or is seen by
+    other workers.
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_sessions: int = 1024, ttl: float = 1800.0, profile_ttl: float = 600.0):
+        self.cache = SessionCache(max_sessions=max_sessions, ttl=ttl)
+        self.profile_ttl = profile_ttl
+        self._profiles: dict[str, tuple[float, dict]] = {}
+        # session_id -> when its summary-fold claim lapses
+        self._folding: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    async def get(self, session_id: str) -> Optional[SessionEntry]:
+        return self.cache.get(session_id)
+
+    async def put(self, session_id: str, entry: SessionEntry) -> None:
+        self.cache.put(session_id, entry)
+
+    async def update(self, session_id: str, change: Callable[[SessionEntry], Any]) -> Any:
+        """Apply `change` to the stored entry and return its result (None if absent)."""
+        entry = self.cache.peek(session_id)
+        if entry is not None:
+            return change(entry)
+
+    async def get_profile(self, user_id: str) -> Optional[dict]:
+        item = self._profiles.get(user_id)
+        if item is None or item[0] < time.monotonic():
+            self._profiles.pop(user_id, None)
+            CACHE_LOOKUPS.labels("profile", "miss").inc()
+            return None
+        CACHE_LOOKUPS.labels("profile", "hit").inc()
+        return item[1]
+
+    async def put_profile(self, user_id: str, profile: dict) -> None:
+        if len(self._profiles) >= self.cache.max_sessions:
+            # Drop expired profiles, then the oldest, to stay bounded
+            now = time.monotonic()
+            for key in [k for k, (exp, _) in self._profiles.items() if exp < now]:
+                del self._profiles[key]
+            while len(self._profiles) >= self.cache.max_sessions:
+                self._profiles.pop(next(iter(self._profiles)))
+        self._profiles[user_id] = (time.monotonic() + self.profile_ttl, profile)
+
+    async def claim_fold(self, session_id: str, ttl: float) -> bool:
+        """Claim the session's summary fold for up to `ttl` seconds; False if already claimed."""
+        now = time.monotonic()
+        if self._folding.get(session_id, 0.0) > now:
+            return False
+        self._folding[session_id] = now + ttl
+        return True
+
+    async def release_fold(self, session_id: str) -> None:
+        self._folding.pop(session_id, None)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisSessionStore:
+    """
+    Session store shared by every worker and replica through Redis.
+
+    Each session is one JSON value whose TTL slides on every read and
+    write. Redis is a cache in front of Django, never the source of truth:
+    a failed Redis call is logged and treated as a miss, so the service
+    degrades to re-fetching context from Django rather than failing.
+    `update` is a read-modify-write, so concurrent writes to the same
+    session are last-write-wins. A summary fold is claimed with
+    `SET NX EX`, so one worker folds a session at a time and a crashed
+    one's claim lapses.
+    """
+
+    backend = "redis"
+
+    def __init__(self, client, ttl: float = 1800.0, profile_ttl: float = 600.0, prefix: str = "sportmate"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.profile_ttl = int(profile_ttl)
+        self.prefix = prefix
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}:session:{session_id}"
+
+    def _profile_key(self, user_id: str) -> str:
+        return f"{self.prefix}:profile:{user_id}"
+
+    def _fold_key(self, session_id: str) -> str:
+        return f"{self.prefix}:folding:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[SessionEntry]:
+        try:
+            raw = await self.client.getex(self._session_key(session_id), ex=self.ttl)
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store read failed for session %s", session_id)
+            raw = None
+        CACHE_LOOKUPS.labels("session", "miss" if raw is None else "hit").inc()
+        return None if raw is None else load_entry(raw)
+
+    async def put(self, session_id: str, entry: SessionEntry) -> None:
+        try:
+            await self.client.set(self._session_key(session_id), dump_entry(entry), ex=self.ttl)
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store write failed for session %s", session_id)
+
+    async def update(self, session_id: str, change: Callable[[SessionEntry], Any]) -> Any:
+        try:
+            raw = await self.client.get(self._session_key(session_id))
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store read failed for session %s", session_id)
+            return None
+        if raw is None:
+            return None
+        entry = load_entry(raw)
+        result = change(entry)
+        await self.put(session_id, entry)
+        return result
+
+    async def get_profile(self, user_id: str) -> Optional[dict]:
+        try:
+            raw = await self.client.get(self._profile_key(user_id))
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store profile read failed for user %s", user_id)
+            raw = None
+        CACHE_LOOKUPS.labels("profile", "miss" if raw is None else "hit").inc()
+        return None if raw is None else json.loads(raw)
+
+    async def put_profile(self, user_id: str, profile: dict) -> None:
+        try:
+            await self.client.set(self._profile_key(user_id), json.dumps(profile), ex=self.profile_ttl)
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store profile write failed for user %s", user_id)
+
+    async def claim_fold(self, session_id: str, ttl: float) -> bool:
+        try:
+            return bool(await self.client.set(self._fold_key(session_id), "1", nx=True, ex=max(1, int(ttl))))
+        except Exception:
+            # Skipping is safe: the overflow is still there next turn
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store fold claim failed for session %s", session_id)
+            return False
+
+    async def release_fold(self, session_id: str) -> None:
+        try:
+            await self.client.delete(self._fold_key(session_id))
+        except Exception:
+            ERRORS.labels("session_store").inc()
+            logger.exception("Session store fold release failed for session %s", session_id)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def open_session_store(
+    backend: str,
+    redis_url: str,
+    *,
+    max_sessions: int,
+    ttl: float,
+    profile_ttl: float,
+):
+    """
+    The store for `backend` ("redis" or "memory"). Falls back to memory,
+    with a warning, when Redis is unavailable at startup.
+    """
+    if backend == "redis":
+        if aioredis is None:
+            logger.warning("redis package not installed, using in-memory sessions")
+        else:
+            client = aioredis.from_url(redis_url, decode_responses=True)
+            try:
+                await client.ping()
+                return RedisSessionStore(client, ttl=ttl, profile_ttl=profile_ttl)
+            except Exception as e:
+                await client.aclose()
+                logger.warning("Redis at %s unavailable (%s), using in-memory sessions", redis_url, e)
+    return MemorySessionStore(max_sessions=max_sessions, ttl=ttl, profile_ttl=profile_ttl)
@@ -0,0 +1,64 @@
+import asyncio
+import random
+
+from langchain.agents import create_openai_tools_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import StructuredTool
+
+from agent_executor import BoundedAgentExecutor
+from loadtest import Latency, StubChatModel
+
+TOPICS = ["arsenal", "chelsea", "spurs", "liverpool", "everton", "fulham"]
+
+
+class Search:
+    """A search tool recording how many calls run at once; earlier calls take longer."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.tool = StructuredTool.from_function(
+            coroutine=self._search, name="tavily_search", description="Search the web."
+        )
+
+    async def _search(self, query: str) -> str:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.005 * (len(TOPICS) - TOPICS.index(query)))
+        finally:
+            self.in_flight -= 1
+        return f"results for {query}"
+
+
+def run_agent(max_concurrent_tools: int) -> tuple[Search, dict]:
+    search = Search()
+    model = StubChatModel(latency=Latency("const:0", random.Random(0)))
+    prompt = ChatPromptTemplate.from_messages([
+        ("human", "{input}"),
+        MessagesPlaceholder("agent_scratchpad"),
+    ])
+    executor = BoundedAgentExecutor(
+        agent=create_openai_tools_agent(model.bind_tools([search.tool]), [search.tool], prompt),
+        tools=[search.tool],
+        return_intermediate_steps=True,
+        max_concurrent_tools=max_concurrent_tools,
+    )
+    result = asyncio.run(executor.ainvoke({"input": " and ".join(TOPICS)}))
+    return search, result
+
+
+def test_tool_calls_are_capped_and_keep_their_order():
+    search, result = run_agent(max_concurrent_tools=2)
+    assert search.peak == 2
+    # Later calls finish first, yet results come back in call order
+    steps = result["intermediate_steps"]
+    assert [action.tool_input["query"] for action, _ in steps] == TOPICS
+    assert [observation for _, observation in steps] == [f"results for {topic}" for topic in TOPICS]
+    assert result["output"].startswith("word")
+
+
+def test_uncapped_step_runs_every_call_at_once():
+    search, result = run_agent(max_concurrent_tools=len(TOPICS))
+    assert search.peak == len(TOPICS)
+    assert [action.tool_input["query"] for action, _ in result["intermediate_steps"]] == TOPICS
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from schemas import BatchRequest, ChatResponse
+
+
+def item(session: int, message: str) -> dict:
+    return {
+        "message": message,
+        "session_id": f"00000000-0000-0000-0000-{session:012d}",
+        "user_id": str(session),
+        "access_token": "test",
+        "plan": "PAID",
+        "schema_version": 2,
+        "history": [],
+        "profile": {"favorite_sport": "football", "details": ""},
+    }
+
+
+def run_batch(client, items, **fields) -> list[dict]:
+    response = client.post("/chat/batch", json={"items": items, **fields})
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class Turns:
+    """Stands in for `main._run_turn`, recording what ran and how many ran at once."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.started: list[str] = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, payload, **kwargs) -> ChatResponse:
+        self.started.append(payload.message)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return ChatResponse(response=f"re: {payload.message}")
+
+
+def test_items_of_one_session_run_in_order(service, monkeypatch):
+    main, client = service
+    turns = Turns()
+    monkeypatch.setattr(main, "_run_turn", turns)
+
+    items = [item(1, "a1"), item(2, "b1"), item(1, "a2"), item(2, "b2"), item(1, "a3")]
+    lines = run_batch(client, items, concurrency=4)
+
+    assert [m for m in turns.started if m.startswith("a")] == ["a1", "a2", "a3"]
+    assert [m for m in turns.started if m.startswith("b")] == ["b1", "b2"]
+    results = [line for line in lines if line["type"] == "result"]
+    assert sorted(line["index"] for line in results) == list(range(5))
+    assert all(line["result"]["response"] == f"re: {items[line['index']]['message']}" for line in results)
+    assert lines[-1] == {**lines[-1], "type": "summary", "items": 5, "ok": 5, "failed": 0}
+
+
+def test_concurrency_is_capped(service, monkeypatch):
+    main, client = service
+    turns = Turns()
+    monkeypatch.setattr(main, "_run_turn", turns)
+
+    run_batch(client, [item(n, f"m{n}") for n in range(1, 11)], concurrency=3)
+    assert turns.peak == 3
+
+    # Asking for more than the service allows gets the service's cap
+    monkeypatch.setattr(main, "BATCH_MAX_CONCURRENCY", 2)
+    turns.peak = 0
+    run_batch(client, [item(n, f"m{n}") for n in range(1, 11)], concurrency=8)
+    assert turns.peak == 2
+
+
+def test_shed_items_wait_out_retry_after_and_try_again(service, monkeypatch):
+    main, client = service
+    attempts = {"ok": 0, "shed": 0}
+    slept = []
+    real_sleep = asyncio.sleep
+
+    async def shed(payload, **kwargs):
+        attempts[payload.message] += 1
+        if payload.message == "shed" or attempts["ok"] <= 2:
+            raise HTTPException(status_code=429, detail="Busy", headers={"Retry-After": "7"})
+        return ChatResponse(response="fine")
+
+    async def sleep(seconds):
+        # Only the batch's back-off asks for 7s; skip it, leave every other sleep alone
+        if seconds == 7:
+            slept.append(seconds)
+            seconds = 0
+        await real_sleep(seconds)
+
+    monkeypatch.setattr(main, "_run_turn", shed)
+    monkeypatch.setattr(main.asyncio, "sleep", sleep)
+    lines = run_batch(client, [item(1, "ok"), item(2, "shed")])
+
+    ok, still_shed = sorted(lines[:-1], key=lambda line: line["index"])
+    assert ok["status"] == 200 and attempts["ok"] == 3
+    # Still shed after the last retry: reported, not retried forever
+    assert still_shed["status"] == 429 and still_shed["error"] == "Busy"
+    assert attempts["shed"] == main.BATCH_OVERLOAD_RETRIES + 1
+    assert slept == [7] * (2 + main.BATCH_OVERLOAD_RETRIES)
+    assert lines[-1]["ok"] == 1 and lines[-1]["failed"] == 1
+
+
+def test_other_errors_are_not_retried(service, monkeypatch):
+    main, client = service
+    calls = []
+
+    async def bad_gateway(payload, **kwargs):
+        calls.append(payload.message)
+        raise HTTPException(status_code=502, detail="Upstream failed")
+
+    monkeypatch.setattr(main, "_run_turn", bad_gateway)
+    lines = run_batch(client, [item(1, "x")])
+    assert calls == ["x"]
+    assert lines[0]["status"] == 502 and lines[-1]["failed"] == 1
+
+
+def test_client_disconnect_cancels_the_remaining_items(service, monkeypatch):
+    main, client = service
+    cancelled = []
+
+    async def turn(payload, **kwargs):
+        if payload.message == "quick":
+            return ChatResponse(response="done")
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(payload.message)
+            raise
+
+    monkeypatch.setattr(main, "_run_turn", turn)
+    batch = BatchRequest(items=[item(1, "quick"), item(2, "slow"), item(3, "slower")])
+
+    async def leave_after_first_line():
+        response = await main.chat_batch(batch)
+        body = response.body_iterator
+        first = json.loads(await body.__anext__())
+        # What Starlette does once the client has gone away
+        await body.aclose()
+        await asyncio.sleep(0)
+        return first
+
+    first = client.portal.call(leave_after_first_line)
+    assert first["index"] == 0 and first["status"] == 200
+    assert sorted(cancelled) == ["slow", "slower"]
+
+
+def test_empty_and_oversized_batches_are_rejected(service, monkeypatch):
+    main, client = service
+    assert client.post("/chat/batch", json={"items": []}).status_code == 422
+    monkeypatch.setattr(main, "BATCH_MAX_ITEMS", 2)
+    response = client.post("/chat/batch", json={"items": [item(n, "x") for n in range(1, 4)]})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("concurrency", [0, -1])
+def test_concurrency_must_be_positive(service, concurrency):
+    _, client = service
+    response = client.post("/chat/batch", json={"items": [item(1, "x")], "concurrency": concurrency})
+    assert response.status_code == 422
@@ -0,0 +1,76 @@
+import time
+
+
+def open_session(ws, session_id: str) -> None:
+    ws.send_json({
+        "session_id": session_id,
+        "user_id": "77",
+        "access_token": "test",
+        "plan": "PAID",
+        "schema_version": 2,
+        "history": [],
+        "profile": {"favorite_sport": "football", "details": ""},
+    })
+    assert ws.receive_json()["type"] == "ready"
+
+
+def turn(ws, message: str) -> dict:
+    ws.send_json({"type": "message", "message": message})
+    while True:
+        event = ws.receive_json()
+        if event["type"] in ("done", "error"):
+            return event
+
+
+def stored(main, session_id: str, check, timeout: float = 2.0):
+    """The stored session once `check(entry)` holds (background folds take a moment)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        entry = main.sessions.cache.peek(session_id)
+        if check(entry) or time.monotonic() > deadline:
+            return entry
+        time.sleep(0.02)
+
+
+def test_confirmed_turns_are_folded_into_the_summary(service):
+    main, client = service
+    session_id = "00000000-0000-0000-0000-00000000a001"
+    turns = main.CONTEXT_RECENT_TURNS + 6
+    with client.websocket_connect("/chat/ws") as ws:
+        open_session(ws, session_id)
+        for n in range(turns):
+            message = f"tell me about the football club founded in {1880 + n}"
+            done = turn(ws, message)
+            assert done["type"] == "done"
+            # What the Django consumer sends once it has stored the turn
+            ws.send_json({"type": "turns", "turns": [{
+                "user_message": message,
+                "bot_message": done["response"],
+                "created_at": f"2026-10-18T12:00:{n:02d}+00:00",
+            }]})
+        entry = stored(main, session_id, lambda entry: entry.summary and not entry.pending)
+
+    assert entry.summary
+    assert entry.pending == []
+    assert len(entry.turns) < turns
+    assert entry.summary_until is not None
+
+
+def test_unconfirmed_turns_stay_bounded(service):
+    main, client = service
+    session_id = "00000000-0000-0000-0000-00000000a002"
+    with client.websocket_connect("/chat/ws") as ws:
+        open_session(ws, session_id)
+        for n in range(main.CONTEXT_RECENT_TURNS + 3):
+            assert turn(ws, f"who founded the club in {1900 + n}")["type"] == "done"
+        entry = stored(main, session_id, lambda entry: len(entry.pending) == main.CONTEXT_RECENT_TURNS)
+
+    assert len(entry.pending) == main.CONTEXT_RECENT_TURNS
+
+
+def test_invalid_turns_frame_is_ignored(service):
+    _, client = service
+    with client.websocket_connect("/chat/ws") as ws:
+        open_session(ws, "00000000-0000-0000-0000-00000000a003")
+        ws.send_json({"type": "turns", "turns": [{"user_message": "no timestamp"}]})
+        assert turn(ws, "what is a hat trick")["type"] == "done"
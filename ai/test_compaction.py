@@ -0,0 +1,72 @@
+import pytest
+
+from compaction import ResultCompactor, canonical_url, split_passages
+from context_window import TokenEstimator
+
+STORY = (
+    "Arsenal beat Chelsea two one at the Emirates on Saturday evening. "
+    "Bukayo Saka scored the winner in the eighty-first minute after a long move. "
+    "Chelsea had equalised through Cole Palmer just before half time. "
+    "The win keeps Arsenal two points clear at the top of the league table."
+)
+
+
+@pytest.fixture
+def compactor():
+    return ResultCompactor(TokenEstimator(), max_tokens=600, passages_per_result=2)
+
+
+def tavily(*results, answer=None) -> dict:
+    return {"query": "arsenal chelsea", "answer": answer, "results": list(results), "images": []}
+
+
+def test_canonical_url_ignores_scheme_www_query_and_slash():
+    assert canonical_url("https://www.Example.com/story/?utm_source=feed") == canonical_url("http://example.com/story")
+
+
+def test_split_passages_joins_short_fragments():
+    assert split_passages("Goal! Saka again. What a finish from the England winger tonight.") == [
+        "Goal! Saka again. What a finish from the England winger tonight."
+    ]
+
+
+def test_duplicates_are_dropped(compactor):
+    result = tavily(
+        {"title": "Arsenal 2-1 Chelsea", "url": "https://a.com/report", "content": STORY},
+        # The same story syndicated elsewhere, lightly edited
+        {"title": "Arsenal 2-1 Chelsea", "url": "https://b.com/x", "content": STORY.replace("Saturday", "Sunday")},
+        # The same page again
+        {"title": "Other", "url": "https://www.a.com/report/?ref=home", "content": "Different text about the derby."},
+        {"title": "Palmer injury", "url": "https://c.com/palmer", "content": "Cole Palmer limped off with a knee injury."},
+    )
+    urls = [item["url"] for item in compactor.compact("arsenal chelsea palmer injury", result)["results"]]
+    assert urls == ["https://a.com/report", "https://c.com/palmer"]
+
+
+def test_passages_per_result_are_capped_and_kept_in_order(compactor):
+    result = tavily({"title": "Report", "url": "https://a.com", "content": STORY})
+    [item] = compactor.compact("arsenal chelsea saka palmer league", result)["results"]
+    kept = split_passages(item["content"])
+    assert len(kept) == 2
+    passages = split_passages(STORY)
+    assert sorted(kept, key=passages.index) == kept
+
+
+def test_token_budget_is_respected():
+    estimator = TokenEstimator()
+    compactor = ResultCompactor(estimator, max_tokens=120, passages_per_result=3)
+    result = tavily(
+        *({"title": f"Report {i}", "url": f"https://site{i}.com", "content": f"Story {i}. {STORY}"} for i in range(6)),
+        answer="Arsenal won 2-1.",
+    )
+    compacted = compactor.compact("arsenal chelsea", result)
+    assert compacted["answer"] == "Arsenal won 2-1."
+    assert compacted["results"]
+    assert compactor._count(compacted) <= 120
+    assert compactor.stats()["calls"] == 1
+    assert compactor.compacted_tokens < compactor.raw_tokens
+
+
+def test_non_tavily_results_pass_through(compactor):
+    assert compactor.compact("q", "plain text") == "plain text"
+    assert compactor.compact("q", {"error": "quota"}) == {"error": "quota"}
@@ -0,0 +1,52 @@
+import asyncio
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from context_window import TokenEstimator, UsageCallback, build_context
+from session_cache import SessionEntry, Turn
+
+
+def test_calibration_is_per_model():
+    estimator = TokenEstimator(chars_per_token=4.0, alpha=0.5)
+    estimator.observe(3000, 1000, "gemini-2.5-flash")
+    assert estimator.ratio("gemini-2.5-flash") == 3.5
+    assert estimator.ratio("gemini-2.5-flash-lite") == 4.0
+    assert estimator.ratio() == 4.0
+    assert estimator.count("x" * 35, "gemini-2.5-flash") == 10
+    assert estimator.count("x" * 35) == 9
+
+
+def test_observations_without_a_model_are_ignored():
+    estimator = TokenEstimator()
+    estimator.observe(3000, 1000, None)
+    estimator.observe(0, 10, "gemini-2.5-flash")
+    assert estimator.ratios == {}
+
+
+def test_usage_callback_calibrates_the_model_that_ran():
+    estimator = TokenEstimator(alpha=1.0)
+    usage = UsageCallback(estimator)
+    run_id = uuid.uuid4()
+    message = AIMessage(content="ok", usage_metadata={"input_tokens": 5, "output_tokens": 1, "total_tokens": 6})
+
+    async def run():
+        await usage.on_chat_model_start(
+            {}, [[HumanMessage(content="x" * 8)]], run_id=run_id, metadata={"ls_model_name": "gemini-2.5-flash-lite"}
+        )
+        await usage.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+
+    asyncio.run(run())
+    # get_buffer_string renders the prompt as "Human: xxxxxxxx"
+    assert estimator.ratios == {"gemini-2.5-flash-lite": 15 / 5}
+    assert (usage.prompt_tokens, usage.completion_tokens, usage.llm_calls) == (5, 1, 1)
+
+
+def test_build_context_keeps_newest_turns_within_budget():
+    entry = SessionEntry(turns=[Turn("q" * 40, "a" * 40, f"2026-10-0{i}T00:00:00+00:00") for i in range(1, 6)])
+    window = build_context(entry, TokenEstimator(chars_per_token=4.0), budget=45, recent_turns=8)
+    # 20 tokens per turn: two fit, the three older ones overflow into the summary
+    assert len(window.messages) == 4
+    assert window.tokens == 40
+    assert [turn.created_at for turn in window.overflow] == [turn.created_at for turn in entry.turns[:3]]
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+import django_client
+from django_client import CircuitBreaker, CircuitOpenError, DjangoClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(django_client.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 9
+    assert not breaker.allow()
+
+
+def test_released_trial_can_be_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def client_for(handler, **kwargs) -> DjangoClient:
+    return DjangoClient("http://django", transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_server_errors_open_the_circuit_and_client_errors_do_not():
+    statuses = iter([404, 404, 500, 500])
+
+    async def run():
+        client = client_for(
+            lambda request: httpx.Response(next(statuses)),
+            breaker=CircuitBreaker(failure_threshold=2),
+        )
+        for _ in range(4):
+            await client.get("/x/", "token")
+        with pytest.raises(CircuitOpenError):
+            await client.get("/x/", "token")
+        await client.aclose()
+        return client.breaker
+
+    assert asyncio.run(run()).state == "open"
+
+
+def test_deadline_counts_as_a_failure():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    async def run():
+        client = client_for(slow, breaker=CircuitBreaker(failure_threshold=1))
+        with pytest.raises(httpx.TimeoutException):
+            await client.get("/x/", None, deadline=0.01)
+        await client.aclose()
+        return client.breaker
+
+    assert asyncio.run(run()).state == "open"
+
+
+def test_bearer_token_is_sent():
+    seen = {}
+
+    def handler(request):
+        seen.update(request.headers)
+        return httpx.Response(200)
+
+    async def run():
+        client = client_for(handler)
+        await client.get("/x/", "jwt")
+        await client.aclose()
+
+    asyncio.run(run())
+    assert seen["authorization"] == "Bearer jwt"
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import Runnable
+
+from hedging import HedgedModel, LatencyTracker
+
+
+class FakeModel(Runnable):
+    """Answers `reply` after `delay` seconds (or raises `error`), noting cancellations."""
+
+    def __init__(self, reply: str, delay: float = 0.0, error: Exception = None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        raise NotImplementedError
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return self.reply
+
+    async def astream(self, input, config=None, **kwargs):
+        yield await self.ainvoke(input, config)
+        for word in ("and", "more"):
+            yield word
+
+
+def hedged(primary, fallback) -> HedgedModel:
+    return HedgedModel(primary, fallback, initial_delay=0.05, min_delay=0.01, max_delay=1.0, min_samples=3)
+
+
+def test_fast_primary_is_not_hedged():
+    primary, fallback = FakeModel("primary"), FakeModel("fallback")
+    model = hedged(primary, fallback)
+    assert asyncio.run(model.ainvoke("hi")) == "primary"
+    assert fallback.calls == 0
+    assert model.outcomes == {"none": 1}
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    primary, fallback = FakeModel("primary", delay=5.0), FakeModel("fallback", delay=0.01)
+    model = hedged(primary, fallback)
+    assert asyncio.run(model.ainvoke("hi")) == "fallback"
+    assert primary.cancelled == 1
+    assert model.outcomes == {"fallback": 1}
+
+
+def test_slow_fallback_loses_and_is_cancelled():
+    primary, fallback = FakeModel("primary", delay=0.1), FakeModel("fallback", delay=5.0)
+    model = hedged(primary, fallback)
+    assert asyncio.run(model.ainvoke("hi")) == "primary"
+    assert fallback.calls == 1 and fallback.cancelled == 1
+    assert model.outcomes == {"primary": 1}
+
+
+def test_failed_primary_fails_over():
+    primary = FakeModel("primary", error=RuntimeError("quota"))
+    fallback = FakeModel("fallback")
+    model = hedged(primary, fallback)
+    assert asyncio.run(model.ainvoke("hi")) == "fallback"
+    assert model.outcomes == {"failover": 1}
+
+
+def test_both_failing_raises_the_first_error():
+    primary = FakeModel("primary", delay=0.1, error=RuntimeError("primary"))
+    fallback = FakeModel("fallback", error=RuntimeError("fallback"))
+    with pytest.raises(RuntimeError, match="fallback"):
+        asyncio.run(hedged(primary, fallback).ainvoke("hi"))
+
+
+def test_stream_is_hedged_on_first_chunk():
+    primary, fallback = FakeModel("primary", delay=5.0), FakeModel("fallback", delay=0.01)
+    model = hedged(primary, fallback)
+
+    async def collect():
+        return [chunk async for chunk in model.astream("hi")]
+
+    assert asyncio.run(collect()) == ["fallback", "and", "more"]
+    assert primary.cancelled == 1
+
+
+def test_delay_follows_the_latency_percentile():
+    model = hedged(FakeModel("primary"), FakeModel("fallback"))
+    assert model.delay("invoke") == 0.05
+    for seconds in (0.2, 0.4, 3.0):
+        model.trackers["invoke"].observe(seconds)
+    # p90 of three samples is the slowest, clamped to max_delay
+    assert model.delay("invoke") == 1.0
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=3)
+    assert tracker.percentile(50) is None
+    for seconds in (9.0, 1.0, 2.0, 3.0):
+        tracker.observe(seconds)
+    assert tracker.percentile(50) == 2.0
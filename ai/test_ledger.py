@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from ledger import RotatingJsonlWriter, TurnLedger
+
+
+def read(path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unserialisable_record_is_skipped(tmp_path):
+    writer = RotatingJsonlWriter(str(tmp_path / "turns.jsonl"))
+    writer.write([{"turn": 1}, {"turn": object()}, {"turn": 3}])
+    writer.close()
+    assert read(writer.path) == [{"turn": 1}, {"turn": 3}]
+
+
+def test_writer_rotates_past_max_bytes(tmp_path):
+    writer = RotatingJsonlWriter(str(tmp_path / "turns.jsonl"), max_bytes=30, backup_count=1)
+    for turn in range(3):
+        writer.write([{"turn": turn, "pad": "x" * 10}])
+    writer.close()
+    assert read(writer.path) == [{"turn": 2, "pad": "x" * 10}]
+    assert read(f"{writer.path}.1") == [{"turn": 1, "pad": "x" * 10}]
+
+
+def test_failed_batch_does_not_stop_the_ledger(tmp_path):
+    ledger = TurnLedger(str(tmp_path), max_delay=0.01)
+    write = ledger.writer.write
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("disk on fire")
+        write(batch)
+
+    ledger.writer.write = flaky
+
+    async def scenario():
+        ledger.start()
+        ledger.put({"turn": 1})
+        await asyncio.sleep(0.05)
+        ledger.put({"turn": 2})
+        await ledger.stop()
+
+    asyncio.run(scenario())
+    assert read(ledger.writer.path) == [{"turn": 2}]
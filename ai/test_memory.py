@@ -0,0 +1,139 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import memory as memory_module
+from memory import HashingEmbedder, LongTermMemory, Memory, VectorIndex
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(memory_module.time, "monotonic", clock)
+    return clock
+
+
+def turn(n: int, session: str, user_message: str, bot_message: str = "") -> dict:
+    return {
+        "id": n,
+        "session_id": session,
+        "user_message": user_message,
+        "bot_message": bot_message,
+        "created_at": f"2026-01-01T00:00:{n:02d}Z",
+    }
+
+
+def unit(i: int, dim: int = 8) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i] = 1.0
+    return vector
+
+
+def test_index_overwrites_the_oldest_items_once_full():
+    index = VectorIndex(dim=8, max_items=3, capacity=2)
+    for i in range(5):
+        index.add(unit(i), Memory(id=str(i), session_id="s", user_message=str(i), bot_message=""))
+    # Adding an indexed id again is a no-op
+    index.add(unit(7), Memory(id="4", session_id="s", user_message="dup", bot_message=""))
+
+    assert len(index) == 3
+    assert index.ids == {"2", "3", "4"}
+    assert [item.id for _, item in index.search(unit(3), k=1)] == ["3"]
+    assert {item.id for _, item in index.search(unit(4), k=5)} == {"2", "3", "4"}
+
+
+def test_search_skips_the_excluded_session():
+    index = VectorIndex(dim=8)
+    index.add(unit(0), Memory(id="1", session_id="current", user_message="", bot_message=""))
+    index.add(unit(0) * 0.5 + unit(1) * 0.5, Memory(id="2", session_id="earlier", user_message="", bot_message=""))
+
+    assert [item.id for _, item in index.search(unit(0), k=2)] == ["1", "2"]
+    assert [item.id for _, item in index.search(unit(0), k=2, exclude_session="current")] == ["2"]
+    assert index.search(unit(0), k=2, exclude_session="earlier")[0][1].id == "1"
+
+
+def make_memory(rows, **kwargs) -> tuple[LongTermMemory, list]:
+    calls = []
+
+    async def load(user_id, since):
+        calls.append(since)
+        # Yield without a timer: the clock fixture stops the loop's clock too
+        await asyncio.sleep(0)
+        return [row for row in rows if since is None or row["created_at"] > since]
+
+    return LongTermMemory(HashingEmbedder(), load, **kwargs), calls
+
+
+def test_recall_excludes_the_current_session_and_weak_matches(clock):
+    rows = [
+        turn(1, "current", "how do free throws work in basketball?", "Each one is worth a point."),
+        turn(2, "earlier", "how many free throws for a flagrant foul?", "Two free throws and possession."),
+        turn(3, "earlier", "who won the tour de france?", "Pogacar won."),
+    ]
+    memory, _ = make_memory(rows)
+    asyncio.run(memory.sync("7"))
+    question = "what happens after a foul on a three point shot, free throws?"
+
+    recalled = memory.recall("7", "current", question)
+    assert [item.id for item in recalled] == ["2"]
+    # Every stored turn scores above 0 for this question; a high bar drops them all
+    assert memory.recall("7", "other", question, min_score=0.99) == []
+    assert {item.id for item in memory.recall("7", "other", question, k=3, min_score=0.0)} == {"1", "2"}
+    # Sharing no word with any stored turn recalls nothing, whatever the hashed score
+    assert memory.recall("7", "other", "cricket", min_score=-1.0) == []
+    assert memory.recall("unknown", "current", question) == []
+
+
+def test_concurrent_syncs_share_one_load(clock):
+    rows = [turn(1, "a", "arsenal lineup"), turn(2, "a", "chelsea lineup")]
+    memory, calls = make_memory(rows, sync_interval=60)
+
+    async def scenario():
+        await asyncio.gather(*(memory.sync("7") for _ in range(5)))
+        await memory.sync("7")
+        return memory.stats()
+
+    assert asyncio.run(scenario()) == {"users": 1, "turns": 2}
+    assert calls == [None]
+
+    # Once due, only turns newer than the last one seen are fetched
+    rows.append(turn(3, "b", "spurs lineup"))
+    clock.now += 61
+    asyncio.run(memory.sync("7"))
+    assert calls == [None, rows[1]["created_at"]]
+    assert memory.stats()["turns"] == 3
+
+
+def test_failed_sync_is_retried_after_the_interval(clock):
+    calls = 0
+
+    async def load(user_id, since):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("django down")
+        return [turn(1, "a", "arsenal lineup")]
+
+    memory = LongTermMemory(HashingEmbedder(), load, sync_interval=60)
+    asyncio.run(memory.sync("7"))
+    asyncio.run(memory.sync("7"))
+    assert (calls, memory.stats()["turns"]) == (1, 0)
+    clock.now += 61
+    asyncio.run(memory.sync("7"))
+    assert (calls, memory.stats()["turns"]) == (2, 1)
+
+
+def test_least_recently_active_users_are_dropped(clock):
+    memory, _ = make_memory([], max_users=2)
+    for user_id in ("1", "2", "1", "3"):
+        memory.add(user_id, Memory(id=user_id, session_id="s", user_message="hi", bot_message=""))
+    assert list(memory._users) == ["1", "3"]
@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.fixture
+def admin(service, monkeypatch):
+    main, client = service
+    monkeypatch.setattr(main, "MEMPROF_ENABLED", True)
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "s3cret")
+    return client
+
+
+@pytest.mark.parametrize(
+    "token, status",
+    [
+        (b"s3cret", 200),
+        (b"wrong", 403),
+        (b"", 403),
+        # Header values are decoded as latin-1, so this arrives as non-ASCII text
+        ("s3crét".encode("latin-1"), 403),
+    ],
+)
+def test_admin_token(admin, token, status):
+    assert admin.get("/debug/memory", headers={"X-Admin-Token": token}).status_code == status
+
+
+def test_disabled_profiling_is_hidden(service):
+    _, client = service
+    assert client.get("/debug/memory", headers={"X-Admin-Token": "anything"}).status_code == 404
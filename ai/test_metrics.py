@@ -0,0 +1,37 @@
+from prometheus_client import REGISTRY
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_chat_turn_is_timed_by_request_and_stage(service, chat):
+    _, client = service
+    requests = sample("sportmate_request_seconds_count", path="/chat")
+    stages = {
+        route: sample("sportmate_stage_seconds_count", stage=route) for route in ("agent", "direct")
+    }
+
+    # Not asked elsewhere, so it is answered rather than served from the cache
+    chat("explain the backpass rule in football")
+
+    assert sample("sportmate_request_seconds_count", path="/chat") == requests + 1
+    assert sum(sample("sportmate_stage_seconds_count", stage=route) for route in stages) == sum(stages.values()) + 1
+    assert sample("sportmate_inflight_requests") == 0
+
+
+def test_metrics_endpoint_is_not_timed_itself(service):
+    _, client = service
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "sportmate_stage_seconds_bucket" in response.text
+    assert 'path="/metrics"' not in response.text
+
+
+def test_unmatched_paths_share_one_label(service):
+    _, client = service
+    before = sample("sportmate_request_seconds_count", path="other")
+    for path in ("/chat/nope", "/chat/nope/deeper", "/chat/x1y2z3"):
+        assert client.post(path, json={}).status_code in (404, 405)
+    assert sample("sportmate_request_seconds_count", path="other") == before + 3
+    assert sample("sportmate_request_seconds_count", path="/chat/nope") == 0
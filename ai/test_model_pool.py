@@ -0,0 +1,57 @@
+import pytest
+
+from model_pool import ModelPool, ModelTier, TierModels, parse_plan_tiers
+
+PLANS = {
+    "PAID": ("lite", "standard", "pro"),
+    "TRIAL": ("lite", "standard", "standard"),
+    "FREE": ("lite", "lite", "lite"),
+}
+
+
+def tier(name: str) -> TierModels:
+    return TierModels(tier=ModelTier(name, f"gemini-{name}"), plain=None, agent=None, direct=None)
+
+
+def make_pool(plans=PLANS) -> ModelPool:
+    return ModelPool({name: tier(name) for name in ("lite", "standard", "pro")}, plans)
+
+
+@pytest.mark.parametrize(
+    "spec, tiers",
+    [
+        ("lite,standard,pro", ("lite", "standard", "pro")),
+        (" lite , standard ,standard ", ("lite", "standard", "standard")),
+        ("lite", ("lite", "lite", "lite")),
+    ],
+)
+def test_parse_plan_tiers(spec, tiers):
+    assert parse_plan_tiers(spec) == tiers
+
+
+@pytest.mark.parametrize("spec", ["", "lite,standard", "lite,standard,pro,pro"])
+def test_parse_plan_tiers_needs_one_or_three_tiers(spec):
+    with pytest.raises(ValueError):
+        parse_plan_tiers(spec)
+
+
+def test_choose_picks_the_plans_tier_for_the_difficulty():
+    pool = make_pool()
+    assert pool.choose("PAID", "trivial").tier.name == "lite"
+    assert pool.choose("PAID", "normal").tier.name == "standard"
+    assert pool.choose("PAID", "hard").tier.name == "pro"
+    assert pool.choose("TRIAL", "hard").tier.name == "standard"
+    assert pool.choose("paid", "hard").tier.name == "pro"
+    assert pool.stats()["chosen"]["PAID/pro"] == 2
+
+
+@pytest.mark.parametrize("plan", [None, "", "ENTERPRISE"])
+def test_unknown_plans_are_served_as_free(plan):
+    pool = make_pool()
+    assert pool.choose(plan, "hard").tier.name == "lite"
+    assert pool.stats()["chosen"]["FREE/lite"] == 1
+
+
+def test_plans_must_use_configured_tiers():
+    with pytest.raises(ValueError, match=r"Plan PAID uses unknown model tiers \['ultra'\]"):
+        make_pool({**PLANS, "PAID": ("lite", "standard", "ultra")})
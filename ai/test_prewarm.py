@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from prewarm import DecayingCounter, Prewarmer
+from search_cache import SearchCache, normalize_query
+
+TTLS = {"live": 60.0, "news": 900.0, "general": 21600.0}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def prewarmer(clock):
+    async def fetch(query):
+        return {"query": query}
+
+    return Prewarmer(SearchCache(TTLS), fetch, max_sports=2, half_life=900.0, min_interval=15.0, tick=5.0)
+
+
+def hot_queries(prewarmer) -> set[str]:
+    return {query for query, _ in prewarmer.hot().values()}
+
+
+def test_nothing_is_hot_without_demand(prewarmer):
+    # Popular across Django, but nobody here has asked
+    prewarmer._baseline = {"football": 500, "tennis": 200}
+    assert prewarmer.hot() == {}
+
+
+def test_sport_queries_are_hot_while_fans_keep_asking_within_their_ttl(prewarmer, clock):
+    for _ in range(5):
+        prewarmer.record_sport("Football")
+    # A few turns per 15 minutes keep news warm, not live scores (60 s TTL)
+    assert hot_queries(prewarmer) == {"latest football news"}
+
+    for _ in range(30):
+        prewarmer.record_sport("football")
+    assert hot_queries(prewarmer) == {"latest football news", "football live scores today"}
+
+    clock.now += 6 * 3600
+    assert prewarmer.hot() == {}
+
+
+def test_only_the_busiest_sports_are_kept_warm(prewarmer):
+    for sport, turns in (("football", 9), ("tennis", 5), ("golf", 3)):
+        for _ in range(turns):
+            prewarmer.record_sport(sport)
+    assert hot_queries(prewarmer) == {"latest football news", "latest tennis news"}
+
+
+def test_searched_queries_are_hot_while_expected_within_their_ttl(prewarmer, clock):
+    prewarmer.record_search("history of the world cup")
+    assert set(prewarmer.hot()) == {normalize_query("history of the world cup")}
+    prewarmer.record_search("arsenal score now")
+    assert normalize_query("arsenal score now") not in prewarmer.hot()
+
+
+@pytest.mark.parametrize(
+    "query, rate, interval",
+    [
+        # Busy: as often as min_interval allows
+        ("arsenal live score", 10.0, 15.0),
+        # requests_per_refresh / rate
+        ("latest arsenal news", 0.1, 50.0),
+        # Quiet: a tick before the entry would expire
+        ("latest arsenal news", 0.001, 895.0),
+        ("arsenal live score", 0.0, 55.0),
+    ],
+)
+def test_interval(prewarmer, query, rate, interval):
+    assert prewarmer.interval(query, rate) == pytest.approx(interval)
+
+
+def test_decaying_counter_halves_every_half_life():
+    counter = DecayingCounter(half_life=60.0)
+    for _ in range(4):
+        counter.add("football", now=0.0)
+    assert counter.score("football", now=120.0) == pytest.approx(1.0)
+    counter.prune(1.5, now=120.0)
+    assert len(counter) == 0
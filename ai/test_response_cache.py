@@ -0,0 +1,81 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, is_standalone
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_near_duplicate_questions_hit():
+    cache = ResponseCache()
+    cache.put("how long is a rugby match", "football", "80 minutes")
+    assert cache.get("How long is a rugby match?", "Football") == "80 minutes"
+    assert cache.get("how long is a rugby match please", "football") == "80 minutes"
+    assert cache.get("how many players in a rugby team", "football") is None
+
+
+def test_answers_are_bucketed_by_sport():
+    cache = ResponseCache()
+    cache.put("what should i eat before a match", "football", "pasta")
+    assert cache.get("what should i eat before a match", "tennis") is None
+
+
+def test_questions_that_need_the_conversation_are_skipped():
+    assert not is_standalone("what did he say about that")
+    cache = ResponseCache()
+    cache.put("why did he do that", "football", "because")
+    assert len(cache) == 0
+
+
+def test_entries_expire(clock):
+    cache = ResponseCache(ttl=60)
+    cache.put("explain the offside rule", "football", "...")
+    clock.now += 61
+    assert cache.get("explain the offside rule", "football") is None
+    assert len(cache) == 0
+
+
+def test_oldest_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    for question in ("explain the offside rule", "how long is a rugby match", "what is a hat trick"):
+        cache.put(question, "football", question)
+    assert len(cache) == 2
+    assert cache.get("explain the offside rule", "football") is None
+
+
+def test_personalised_answers_are_not_shared(chat):
+    question = "give me tips to improve my heading technique"
+    assert not chat(question, profile={"favorite_sport": "football", "details": "I am a goalkeeper"})["cached"]
+    assert not chat(question, history=[
+        {"user_message": "hi", "bot_message": "hello!", "created_at": "2026-10-01T00:00:00Z"}
+    ])["cached"]
+    # Neither answer was stored; a context-free one is, and is then shared
+    assert not chat(question)["cached"]
+    assert chat(question)["cached"]
+
+
+@pytest.mark.parametrize(
+    "question, cacheable",
+    [
+        ("explain the offside rule", True),
+        ("explain the rules of the transfer window news", False),
+        ("how are the knicks doing right now", False),
+        ("what happened in the game today", False),
+    ],
+)
+def test_time_sensitive_questions_bypass_the_cache(service, question, cacheable):
+    main, _ = service
+    assert main._cacheable(question) is cacheable
@@ -0,0 +1,46 @@
+import pytest
+
+from router import Router
+
+
+@pytest.fixture(scope="module")
+def router():
+    return Router()
+
+
+@pytest.mark.parametrize(
+    "message, route",
+    [
+        # Evergreen phrasing about something that changes: the model vetoes it
+        ("what are the odds for the derby", "agent"),
+        ("what is the current ATP ranking", "agent"),
+        ("how is messi doing at inter miami", "agent"),
+        # ... and so does the live rule
+        ("what are the chances arsenal win the league this year", "agent"),
+        ("who won the f1 race today", "agent"),
+        ("what is the premier league table", "agent"),
+        # Rule vocabulary that is not about live data
+        ("how is a tennis tiebreak scored", "direct"),
+        ("table tennis rules", "direct"),
+        ("explain the offside rule", "direct"),
+        ("what does lbw mean in cricket", "direct"),
+        ("thanks that was helpful", "direct"),
+        # Neither evergreen nor live: the full agent
+        ("messi", "agent"),
+    ],
+)
+def test_route(router, message, route):
+    assert router.route(message).name == route
+
+
+@pytest.mark.parametrize(
+    "message, difficulty",
+    [
+        ("hi", "trivial"),
+        ("what is a hat trick", "trivial"),
+        ("how do i get better at chess openings", "normal"),
+        ("compare the tactics of guardiola and klopp", "hard"),
+    ],
+)
+def test_difficulty(router, message, difficulty):
+    assert router.difficulty(message) == difficulty
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from scheduler import Overloaded, PriorityScheduler
+from schemas import UserMessage
+
+PLANS = ("PAID", "TRIAL", "FREE")
+
+
+def make_scheduler(max_concurrency=1, timeout=1.0, max_queued=10) -> PriorityScheduler:
+    return PriorityScheduler(
+        max_concurrency,
+        {plan: timeout for plan in PLANS},
+        {plan: max_queued for plan in PLANS},
+    )
+
+
+def test_paid_is_served_before_free():
+    async def scenario():
+        scheduler = make_scheduler()
+        held = await scheduler.acquire("PAID")
+        served = []
+
+        async def turn(plan):
+            slot = await scheduler.acquire(plan)
+            served.append(plan)
+            slot.release()
+
+        tasks = [asyncio.create_task(turn(plan)) for plan in ("FREE", "TRIAL", "FREE", "PAID")]
+        await asyncio.sleep(0)
+        held.release()
+        await asyncio.gather(*tasks)
+        return served, scheduler.active
+
+    served, active = asyncio.run(scenario())
+    assert served == ["PAID", "TRIAL", "FREE", "FREE"]
+    assert active == 0
+
+
+def test_full_queue_is_shed():
+    async def scenario():
+        scheduler = make_scheduler(max_queued=1)
+        await scheduler.acquire("PAID")
+        waiter = asyncio.create_task(scheduler.acquire("FREE"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await scheduler.acquire("FREE")
+        waiter.cancel()
+        return shed.value, scheduler.shed
+
+    error, shed = asyncio.run(scenario())
+    assert error.plan == "FREE" and error.retry_after >= 1
+    assert shed["FREE"] == 1
+
+
+def test_queue_timeout_is_shed():
+    async def scenario():
+        scheduler = make_scheduler(timeout=0.01)
+        await scheduler.acquire("PAID")
+        with pytest.raises(Overloaded):
+            await scheduler.acquire("TRIAL")
+        return scheduler.shed["TRIAL"], scheduler._queued["TRIAL"]
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        scheduler = make_scheduler()
+        held = await scheduler.acquire("PAID")
+        first = asyncio.create_task(scheduler.acquire("PAID"))
+        second = asyncio.create_task(scheduler.acquire("FREE"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        held.release()
+        slot = await asyncio.wait_for(second, 0.5)
+        slot.release()
+        return scheduler.active, scheduler._queued
+
+    active, queued = asyncio.run(scenario())
+    assert active == 0
+    assert queued == {"PAID": 0, "TRIAL": 0, "FREE": 0}
+
+
+def test_stream_releases_its_slot_when_the_client_leaves_before_the_body(service):
+    main, client = service
+    payload = UserMessage(
+        message="who won the arsenal game last night?",
+        session_id="00000000-0000-0000-0000-999999999999",
+        user_id="999",
+        access_token="test",
+        plan="PAID",
+        schema_version=2,
+        history=[],
+        profile={"favorite_sport": "football", "details": ""},
+    )
+
+    async def gone(message):
+        raise OSError("client went away")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def disconnect_before_body():
+        response = await main.chat_stream(payload)
+        assert main.scheduler.active == 1
+        with pytest.raises(ClientDisconnect):
+            await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, gone)
+
+    client.portal.call(disconnect_before_body)
+    assert main.scheduler.active == 0
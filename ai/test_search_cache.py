@@ -0,0 +1,255 @@
+import asyncio
+import json
+
+import pytest
+from langchain_core.tools import StructuredTool
+from prometheus_client import REGISTRY
+
+import search_cache
+from search_cache import SearchCache, cached_search_tool, classify_query, normalize_query, speculate
+
+TTLS = {"live": 60.0, "news": 900.0, "general": 21600.0}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_normalize_ignores_case_order_and_filler():
+    assert normalize_query("What's the Arsenal score?") == normalize_query("score arsenal")
+
+
+@pytest.mark.parametrize(
+    "query, kind",
+    [
+        ("arsenal score today", "live"),
+        ("latest chelsea transfer news", "news"),
+        ("history of the world cup", "general"),
+    ],
+)
+def test_classify_query(query, kind):
+    assert classify_query(query) == kind
+
+
+def test_entries_expire_after_their_class_ttl(clock):
+    cache = SearchCache(TTLS)
+    cache.put("arsenal score", "2-1")
+    cache.put("offside rule history", "since 1863")
+    clock.now += 61
+    assert cache.get("arsenal score") is None
+    assert cache.get("offside rule history") == "since 1863"
+
+
+def test_least_recently_used_is_evicted():
+    cache = SearchCache(TTLS, max_entries=2)
+    cache.put("one", 1)
+    cache.put("two", 2)
+    cache.get("one")
+    cache.put("three", 3)
+    assert (cache.get("one"), cache.get("two"), cache.get("three")) == (1, None, 3)
+
+
+def test_concurrent_lookups_share_one_fetch():
+    calls = []
+
+    async def fetch(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return f"result for {query}"
+
+    async def run():
+        cache = SearchCache(TTLS)
+        results = await asyncio.gather(*(cache.get_or_fetch(q, fetch) for q in ("arsenal score", "Score Arsenal?") * 5))
+        again = await cache.get_or_fetch("arsenal score", fetch)
+        return cache, results, again
+
+    cache, results, again = asyncio.run(run())
+    assert len(calls) == 1
+    assert set(results) == {again}
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 9, 1)
+
+
+def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    calls = 0
+
+    async def fetch(query):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("tavily down")
+
+    async def run():
+        cache = SearchCache(TTLS)
+        results = await asyncio.gather(*(cache.get_or_fetch("arsenal", fetch) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await cache.get_or_fetch("arsenal", fetch)
+        return cache
+
+    cache = asyncio.run(run())
+    assert calls == 2
+    assert len(cache) == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_fetch():
+    async def fetch(query):
+        await asyncio.sleep(0.02)
+        return "2-1"
+
+    async def run():
+        cache = SearchCache(TTLS)
+        first = asyncio.create_task(cache.get_or_fetch("arsenal score", fetch))
+        second = asyncio.create_task(cache.get_or_fetch("arsenal score", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, cache.get("arsenal score")
+
+    assert asyncio.run(run()) == ("2-1", "2-1")
+
+
+@pytest.mark.parametrize(
+    "message, searches",
+    [
+        ("latest arsenal news", 1),
+        ("latest arsenal news and latest chelsea transfer news", 2),
+    ],
+)
+def test_stream_reports_each_search_once(service, message, searches):
+    _, client = service
+    payload = {
+        "message": message,
+        "session_id": f"00000000-0000-0000-0000-0000000b000{searches}",
+        "user_id": "5",
+        "access_token": "test",
+        "plan": "PAID",
+        "schema_version": 2,
+        "history": [],
+        "profile": {"favorite_sport": "football", "details": ""},
+    }
+    response = client.post("/chat/stream", json=payload)
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    kinds = [event["type"] for event in events if event["type"] != "token"]
+    assert kinds == ["tool"] * searches + ["done"]
+
+
+def test_results_are_transformed_once_as_they_are_stored(clock):
+    transformed = []
+
+    def transform(query, result):
+        transformed.append(query)
+        return {"compacted": result}
+
+    async def fetch(query):
+        return "raw"
+
+    async def scenario():
+        cache = SearchCache(TTLS, transform=transform)
+        results = [await cache.get_or_fetch("arsenal score", fetch) for _ in range(3)]
+        stored = cache.put("arsenal lineup", {"compacted": "ready"}, transform=False)
+        return results, stored
+
+    results, stored = asyncio.run(scenario())
+    assert results == [{"compacted": "raw"}] * 3
+    assert stored == {"compacted": "ready"}
+    assert transformed == ["arsenal score"]
+
+
+class Search:
+    """A search tool recording its queries; queries listed in `failing` raise."""
+
+    def __init__(self, delay: float = 0.01, failing: tuple = ()):
+        self.delay = delay
+        self.failing = failing
+        self.queries: list[str] = []
+        self.tool = StructuredTool.from_function(
+            coroutine=self._search, name="tavily_search", description="Search the web."
+        )
+
+    async def _search(self, query: str) -> str:
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        if query in self.failing:
+            raise RuntimeError("tavily down")
+        return f"results for {query}"
+
+
+def speculations(outcome: str) -> float:
+    return REGISTRY.get_sample_value("sportmate_speculative_searches_total", {"outcome": outcome}) or 0.0
+
+
+def test_overlapping_query_claims_the_speculative_search():
+    search = Search()
+    before = speculations("used")
+
+    async def scenario():
+        cache = SearchCache(TTLS)
+        tool = cached_search_tool(search.tool, cache)
+        with speculate(search.tool, cache, "who won the arsenal game last night?") as speculation:
+            claimed = await tool.ainvoke({"query": "arsenal game result last night"})
+            other = await tool.ainvoke({"query": "chelsea transfer news"})
+        return speculation, claimed, other, cache
+
+    speculation, claimed, other, cache = asyncio.run(scenario())
+    # Only the unrelated query started a search of its own
+    assert search.queries == ["who won the arsenal game last night?", "chelsea transfer news"]
+    assert claimed == "results for who won the arsenal game last night?"
+    assert other == "results for chelsea transfer news"
+    assert speculation.used and speculations("used") == before + 1
+    assert cache.get("arsenal game result last night") == claimed
+
+
+def test_failed_speculation_falls_back_to_a_regular_search():
+    search = Search(failing=("arsenal score today",))
+
+    async def scenario():
+        cache = SearchCache(TTLS)
+        tool = cached_search_tool(search.tool, cache)
+        with speculate(search.tool, cache, "arsenal score today"):
+            return await tool.ainvoke({"query": "arsenal score"})
+
+    assert asyncio.run(scenario()) == "results for arsenal score"
+    assert search.queries == ["arsenal score today", "arsenal score"]
+
+
+def test_unclaimed_speculation_is_cancelled_or_counted_unused():
+    before = {outcome: speculations(outcome) for outcome in ("started", "cancelled", "unused")}
+
+    async def scenario():
+        cache = SearchCache(TTLS)
+        slow = speculate(Search(delay=10).tool, cache, "arsenal score today")
+        with slow:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        quick = speculate(Search(delay=0).tool, cache, "chelsea score today")
+        with quick:
+            await quick.task
+        return slow, quick, cache
+
+    slow, quick, cache = asyncio.run(scenario())
+    assert slow.task.cancelled() and not slow.used
+    assert quick.task.done() and not quick.used
+    # The unused result is still cached for the next turn
+    assert cache.get("chelsea score today") == "results for chelsea score today"
+    assert speculations("started") == before["started"] + 2
+    assert speculations("cancelled") == before["cancelled"] + 1
+    assert speculations("unused") == before["unused"] + 1
+
+
+def test_cached_query_is_not_speculated():
+    search = Search()
+    cache = SearchCache(TTLS)
+    cache.put("arsenal score today", "2-1")
+    assert speculate(search.tool, cache, "Arsenal score today?") is None
+    assert search.queries == []
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from session_cache import SessionEntry, Turn
+from session_store import MemorySessionStore, RedisSessionStore, dump_entry, load_entry
+
+
+class Clock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # fakeredis expires keys against the wall clock
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+def make_entry() -> SessionEntry:
+    return SessionEntry(
+        turns=[Turn("who won?", "Arsenal, 2-1.", "2026-10-18T18:00:00+00:00")],
+        last_seen="2026-10-18T18:00:00+00:00",
+        pending=[Turn("and the scorers?", "Saka and Odegaard.")],
+        summary="The user supports Arsenal.",
+        summary_until="2026-10-17T12:00:00+00:00",
+        expires_at=123.0,
+    )
+
+
+def redis_store(**kwargs) -> RedisSessionStore:
+    return RedisSessionStore(fakeredis.FakeAsyncRedis(decode_responses=True), **kwargs)
+
+
+def test_entry_round_trip_drops_local_fields():
+    entry = make_entry()
+    loaded = load_entry(dump_entry(entry))
+    assert loaded.turns == entry.turns and loaded.pending == entry.pending
+    assert (loaded.summary, loaded.summary_until, loaded.last_seen) == (
+        entry.summary, entry.summary_until, entry.last_seen
+    )
+    assert loaded.expires_at == 0.0
+
+
+def test_redis_entry_expires_after_its_ttl(clock):
+    async def scenario():
+        store = redis_store(ttl=60)
+        await store.put("s1", make_entry())
+        clock.now += 50
+        # A read slides the TTL
+        first = await store.get("s1")
+        clock.now += 50
+        second = await store.get("s1")
+        clock.now += 61
+        return first, second, await store.get("s1")
+
+    first, second, expired = asyncio.run(scenario())
+    assert first.turns == make_entry().turns
+    assert second is not None
+    assert expired is None
+
+
+def test_redis_update_round_trips(clock):
+    async def scenario():
+        store = redis_store()
+        await store.put("s1", make_entry())
+        result = await store.update("s1", lambda entry: entry.fold("Summary.", entry.turns))
+        return result, await store.get("s1"), await store.update("missing", lambda entry: True)
+
+    result, entry, missing = asyncio.run(scenario())
+    assert result is True
+    assert entry.summary == "Summary." and entry.turns == []
+    assert missing is None
+
+
+@pytest.mark.parametrize("make_store", [redis_store, MemorySessionStore], ids=["redis", "memory"])
+def test_fold_is_claimed_once_until_released_or_lapsed(make_store, clock, monkeypatch):
+    monkeypatch.setattr(time, "monotonic", clock)
+
+    async def scenario():
+        store = make_store()
+        claims = [await store.claim_fold("s1", 30), await store.claim_fold("s1", 30)]
+        await store.release_fold("s1")
+        claims.append(await store.claim_fold("s1", 30))
+        clock.now += 31
+        claims.append(await store.claim_fold("s1", 30))
+        return claims
+
+    assert asyncio.run(scenario()) == [True, False, True, True]
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+def test_ready_fails_until_warm_up_has_finished(service, monkeypatch):
+    main, client = service
+    # Let the app's own warm-up finish, then run a fresh one
+    deadline = time.monotonic() + 5
+    while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    monkeypatch.setattr(main, "_ready", False)
+    monkeypatch.setattr(main, "_warmup_report", {})
+    monkeypatch.setattr(main, "WARMUP_TIMEOUT", 0.5)
+
+    async def prompts():
+        await asyncio.sleep(0.05)
+
+    async def django():
+        raise ConnectionError("refused")
+
+    async def gemini():
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(main, "_warm_prompts", prompts)
+    monkeypatch.setattr(main, "_warm_django", django)
+    monkeypatch.setattr(main, "_warm_gemini", gemini)
+
+    warm_up = client.portal.start_task_soon(main._warm_up)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+    warm_up.result(timeout=5)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ready"] is True
+    assert isinstance(body["warmup"]["prompts"], float)
+    assert body["warmup"]["django"] == "failed: refused"
+    assert body["warmup"]["gemini"] == "timed out"
@@ -0,0 +1,138 @@
+import asyncio
+
+import httpx
+
+import write_behind
+from write_behind import WriteBehindQueue
+
+
+def test_unexpected_send_error_drops_the_batch_and_keeps_going():
+    sent = []
+
+    async def send(batch):
+        if batch == [{"n": 1}]:
+            raise ValueError("bad record")
+        sent.extend(batch)
+
+    async def scenario():
+        queue = WriteBehindQueue(send, max_batch=1, max_delay=0.01)
+        queue.start()
+        queue.put({"n": 1})
+        queue.put({"n": 2})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert sent == [{"n": 2}]
+    assert (queue.sent, queue.dropped) == (1, 1)
+
+
+class Sender:
+    """`send` failing with each of `errors` in turn, then succeeding."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.batches: list[list[dict]] = []
+        self.attempts = 0
+
+    async def __call__(self, batch):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(batch)
+
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://django/c/chat-history/bulk/")
+    return httpx.HTTPStatusError("failed", request=request, response=httpx.Response(code, request=request))
+
+
+def test_full_batch_goes_out_without_waiting():
+    send = Sender()
+
+    async def scenario():
+        queue = WriteBehindQueue(send, max_batch=3, max_delay=0.5)
+        queue.start()
+        for n in range(4):
+            queue.put({"n": n})
+        await asyncio.sleep(0.05)
+        sent_early = list(send.batches)
+        await queue.stop()
+        return sent_early
+
+    assert asyncio.run(scenario()) == [[{"n": 0}, {"n": 1}, {"n": 2}]]
+    assert send.batches[1:] == [[{"n": 3}]]
+
+
+def test_partial_batch_goes_out_after_max_delay():
+    send = Sender()
+
+    async def scenario():
+        queue = WriteBehindQueue(send, max_batch=50, max_delay=0.05)
+        queue.start()
+        queue.put({"n": 0})
+        queue.put({"n": 1})
+        await asyncio.sleep(0.01)
+        before = list(send.batches)
+        await asyncio.sleep(0.1)
+        after = list(send.batches)
+        await queue.stop()
+        return before, after
+
+    assert asyncio.run(scenario()) == ([], [[{"n": 0}, {"n": 1}]])
+
+
+def test_server_errors_are_retried_with_backoff(monkeypatch):
+    send = Sender(status_error(503), httpx.ConnectError("refused"), status_error(502))
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    async def scenario():
+        queue = WriteBehindQueue(send, max_batch=1, max_delay=0.01, backoff=0.5, max_backoff=1.5)
+        monkeypatch.setattr(write_behind.asyncio, "sleep", record_sleep)
+        await queue._send_with_retry([{"n": 0}])
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert delays == [0.5, 1.0, 1.5]
+    assert send.batches == [[{"n": 0}]]
+    assert (queue.sent, queue.dropped) == (1, 0)
+
+
+def test_rejected_batch_is_not_retried():
+    send = Sender(status_error(400))
+
+    async def scenario():
+        queue = WriteBehindQueue(send, max_batch=1, max_delay=0.01)
+        await queue._send_with_retry([{"n": 0}])
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert send.attempts == 1
+    assert queue.dropped == 1
+
+
+async def _mirror(main, payload):
+    # _mirror_turn spawns tasks, so it runs on the app's loop
+    return main._mirror_turn(payload, "Arsenal.")
+
+
+def test_turns_are_only_mirrored_with_a_service_token(service, monkeypatch):
+    main, client = service
+    payload = main.UserMessage(
+        message="who won?", session_id="00000000-0000-0000-0000-00000000c001", user_id="3", access_token="t"
+    )
+    queued = []
+    monkeypatch.setattr(main.mirror_queue, "put", queued.append)
+
+    monkeypatch.setattr(main, "AI_SERVICE_TOKEN", "")
+    client.portal.call(lambda: _mirror(main, payload))
+    assert queued == []
+
+    monkeypatch.setattr(main, "AI_SERVICE_TOKEN", "secret")
+    turn_id = client.portal.call(lambda: _mirror(main, payload))
+    assert [turn["id"] for turn in queued] == [turn_id]
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+logger = logging.getLogger("sportmate")
+
+
+class WriteBehindQueue:
+    """
+    Buffers records in memory and ships them to `send` in batches.
+
+    A batch goes out once `max_batch` records are waiting or `max_delay`
+    seconds after its first record arrived, whichever comes first. Failed
+    batches are retried with exponential backoff; `stop()` drains whatever
+    is still queued before the service exits.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[list[dict]], Awaitable[None]],
+        *,
+        max_batch: int = 50,
+        max_delay: float = 1.0,
+        max_queue: int = 10_000,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 10.0,
+    ):
+        self.send = send
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._worker: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def put(self, record: dict) -> None:
+        """Queue `record` without waiting; drops it if the buffer is full."""
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("Write-behind queue full, dropping record")
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush queued records, giving up after `timeout` seconds."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Write-behind flush timed out with %d records left", len(self))
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            flush_at = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = flush_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._send_with_retry(batch)
+            except Exception:
+                # Anything `send` did not expect must not stop the worker
+                self.dropped += len(batch)
+                logger.exception("Dropping write-behind batch of %d records", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send_with_retry(self, batch: list[dict]) -> None:
+        delay = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.send(batch)
+                self.sent += len(batch)
+                return
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code < 500:
+                    # The batch itself was rejected; retrying won't help
+                    break
+                logger.warning("Write-behind batch attempt %d failed: %s", attempt, e)
+            except httpx.HTTPError as e:
+                logger.warning("Write-behind batch attempt %d failed: %s", attempt, e)
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+        self.dropped += len(batch)
+        logger.error("Dropping write-behind batch of %d records", len(batch))
@@ -8,6 +8,7 @@ from .views import (
     UpdatePasswordView,
     ProfileView,
     AboutView,
+    FavoriteSportsView,
 )
 
 urlpatterns = [
@@ -19,4 +20,5 @@ urlpatterns = [
     path('update-password/', UpdatePasswordView.as_view()),
     path('profile/', ProfileView.as_view()),
     path('about/', AboutView.as_view()),
+    path('favorite-sports/', FavoriteSportsView.as_view()),
 ]
\ No newline at end of file
@@ -3,7 +3,8 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.contrib.auth import authenticate, get_user_model
 from django.db import IntegrityError, transaction
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.db.models.functions import Lower, Trim
 from django.core.mail import EmailMultiAlternatives
 from datetime import datetime, timedelta
 from .serializers import (
@@ -18,6 +19,7 @@ from .serializers import (
     OTPVerifySerializer,
 )
 from .models import OTP
+from chatbot.permissions import IsAIService
 from .utils import generate_unique_username
 import random
 import logging
@@ -350,3 +352,29 @@ class AboutView(APIView):
         return Response({
             "message": "About updated successfully."
         }, status=status.HTTP_200_OK)
+
+
+class FavoriteSportsView(APIView):
+    """
+    Most common favourite sports among active users, used by the AI
+    service to decide which sports to pre-warm searches for.
+    """
+    authentication_classes = []
+    permission_classes = [IsAIService]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+
+        sports = (
+            User.objects.filter(is_active=True)
+            .exclude(favorite_sport__isnull=True)
+            .exclude(favorite_sport='')
+            .annotate(sport=Lower(Trim('favorite_sport')))
+            .values('sport')
+            .annotate(users=Count('id'))
+            .order_by('-users')[:limit]
+        )
+        return Response(list(sports), status=status.HTTP_200_OK)
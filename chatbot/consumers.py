@@ -0,0 +1,112 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+from urllib.parse import parse_qs
+from .models import ChatClass
+from .serializers import ChatbotSerializer, ChatContextTurnSerializer
+from .views import _active_subscription, _fastapi_payload, _free_limit_reached, _record_turn
+import json
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    A ChatClass session over one WebSocket: ws/c/chatbot/<session_id>/?token=<JWT>.
+
+    The JWT, chat ownership and subscription are checked once on connect,
+    and one upstream socket to the AI service's /chat/ws carries the
+    session's history and profile once. Each client frame {"message": ...}
+    is then checked against the user's free limit in the database (shared
+    with their other sockets and HTTP turns) and answered on the same
+    socket with the AI service's token / tool / done / error events;
+    completed turns are stored and counted as in ChatbotStreamView, and
+    sent back upstream as a "turns" frame so the AI service knows they are
+    stored and can fold them into the session summary.
+    """
+
+    upstream = None
+
+    async def connect(self):
+        token = parse_qs(self.scope["query_string"].decode()).get("token", [""])[0]
+        session = await self._open_session(token, self.scope["url_route"]["kwargs"]["session_id"])
+        if session is None:
+            # Rejects the handshake with a 403
+            await self.close()
+            return
+        self.user, self.chat_class, self.active_sub, start = session
+
+        try:
+            self.upstream = await connect(f"{settings.FASTAPI_WS_BASE}/chat/ws")
+            await self.upstream.send(json.dumps(start))
+            ready = json.loads(await self.upstream.recv())
+        except (OSError, WebSocketException, ValueError):
+            await self._close_upstream()
+            await self.close()
+            return
+        await self.accept()
+        await self.send_json(ready)
+
+    async def disconnect(self, close_code):
+        await self._close_upstream()
+
+    async def receive_json(self, content, **kwargs):
+        serializer = ChatbotSerializer(data=content if isinstance(content, dict) else {})
+        if not serializer.is_valid():
+            await self.send_json({"type": "error", "status": 400, "detail": serializer.errors})
+            return
+        if await database_sync_to_async(_free_limit_reached)(self.user, self.active_sub):
+            await self.send_json({"type": "error", "status": 400, "detail": "You have reached your free limit."})
+            return
+
+        message = serializer.validated_data['message']
+        try:
+            await self.upstream.send(json.dumps({"type": "message", "message": message}))
+            async for frame in self.upstream:
+                event = json.loads(frame)
+                if event.get("type") == "done":
+                    # Only completed answers are persisted and counted
+                    turn = await database_sync_to_async(_record_turn)(
+                        self.user, self.chat_class, message, event.get("response", ""), event.get("turn_id")
+                    )
+                    await self.upstream.send(
+                        json.dumps({"type": "turns", "turns": [ChatContextTurnSerializer(turn).data]})
+                    )
+                await self.send_json(event)
+                if event.get("type") in ("done", "error"):
+                    return
+        except ConnectionClosed:
+            pass
+        await self.send_json({"type": "error", "status": 502, "detail": "Lost connection to FastAPI."})
+        await self.close(code=1011)
+
+    @database_sync_to_async
+    def _open_session(self, token, session_id):
+        """
+        (user, chat class, subscription, AI service start frame), or None if
+        the token is invalid or the chat isn't the user's.
+        """
+        if not token:
+            return None
+        auth = JWTAuthentication()
+        try:
+            user = auth.get_user(auth.get_validated_token(token))
+        except (InvalidToken, AuthenticationFailed):
+            return None
+
+        chat_class = ChatClass.objects.filter(id=session_id, user=user).first()
+        if chat_class is None:
+            return None
+        active_sub = _active_subscription(user)
+
+        start = _fastapi_payload(user, active_sub, chat_class, "", token)
+        del start["message"]
+        return user, chat_class, active_sub, start
+
+    async def _close_upstream(self):
+        if self.upstream is not None:
+            await self.upstream.close()
+            self.upstream = None
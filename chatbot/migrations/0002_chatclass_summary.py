@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatclass',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chatclass',
+            name='summary_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
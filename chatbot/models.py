@@ -8,6 +8,9 @@ class ChatClass(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     chat_class = models.CharField(max_length=100, blank=True, null=True, default="Latest Class")
+    # Rolling summary of the turns up to summary_until, kept by the AI service
+    summary = models.TextField(blank=True, default="")
+    summary_until = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
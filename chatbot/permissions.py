@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework import permissions
+
+
+class IsAIService(permissions.BasePermission):
+    """Allows requests signed with the shared AI_SERVICE_TOKEN header."""
+
+    def has_permission(self, request, view):
+        token = request.headers.get("X-Service-Token", "")
+        return bool(settings.AI_SERVICE_TOKEN) and constant_time_compare(token, settings.AI_SERVICE_TOKEN)
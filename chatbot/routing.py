@@ -0,0 +1,6 @@
+from django.urls import path
+from .consumers import ChatConsumer
+
+websocket_urlpatterns = [
+    path("ws/c/chatbot/<uuid:session_id>/", ChatConsumer.as_asgi()),
+]
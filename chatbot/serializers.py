@@ -13,11 +13,37 @@ class ChatHistorySerializer(serializers.ModelSerializer):
         model = ChatHistory
         fields = "__all__"
 
+class ChatContextTurnSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChatHistory
+        fields = ['user_message', 'bot_message', 'created_at']
+
+class MemoryTurnSerializer(serializers.ModelSerializer):
+    session_id = serializers.UUIDField(source='parent_id', read_only=True)
+
+    class Meta:
+        model = ChatHistory
+        fields = ['id', 'session_id', 'user_message', 'bot_message', 'created_at']
+
+class MirroredTurnSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    session_id = serializers.UUIDField()
+    user_message = serializers.CharField()
+    bot_message = serializers.CharField(allow_blank=True)
+
+class ChatHistoryBulkSerializer(serializers.Serializer):
+    turns = MirroredTurnSerializer(many=True)
+
 class ChatClassSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatClass
         fields = "__all__"
     
+class ChatSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChatClass
+        fields = ['summary', 'summary_until']
+
 class ChatbotSaveSerializer(serializers.Serializer):
     pin_date = serializers.DateTimeField(required=True)
 
@@ -1,3 +1,169 @@
-from django.test import TestCase
+import json
+import threading
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import ChatClass, ChatHistory, FreeLimit
+from .routing import websocket_urlpatterns
+
+User = get_user_model()
+
+
+class ChatTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email="fan@example.com", username="fan", is_active=True)
+        self.chat_class = ChatClass.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def chat(self, path="", message="who won last night?"):
+        return self.client.post(f"/c/chatbot/{self.chat_class.id}/{path}", {"message": message}, format="json")
+
+
+class FastAPITimeoutTests(ChatTestCase):
+    def test_chat_timeout_is_503(self):
+        with mock.patch("chatbot.views.requests.post", side_effect=requests.ReadTimeout) as post:
+            response = self.chat()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(post.call_args.kwargs["timeout"], (settings.FASTAPI_CONNECT_TIMEOUT, settings.FASTAPI_READ_TIMEOUT))
+
+    def test_stream_connect_timeout_is_503(self):
+        with mock.patch("chatbot.views.requests.post", side_effect=requests.ConnectTimeout):
+            response = self.chat("stream/")
+        self.assertEqual(response.status_code, 503)
+
+
+class ChatOwnershipTests(ChatTestCase):
+    def setUp(self):
+        super().setUp()
+        other = User.objects.create(email="rival@example.com", username="rival", is_active=True)
+        self.chat_class = ChatClass.objects.create(user=other)
+
+    def test_another_users_session_is_404(self):
+        for path in ("", "stream/"):
+            with mock.patch("chatbot.views.requests.post") as post:
+                response = self.chat(path)
+            self.assertEqual(response.status_code, 404)
+            post.assert_not_called()
+
+
+class ChatStreamTests(ChatTestCase):
+    def test_events_are_relayed_before_the_upstream_finishes(self):
+        finish = threading.Event()
+
+        def iter_lines(decode_unicode=False):
+            yield "data: " + json.dumps({"type": "token", "text": "Arsenal"})
+            # Held open until the test has seen the first chunk
+            finish.wait(5)
+            yield "data: " + json.dumps({"type": "done", "response": "Arsenal won.", "turn_id": None})
+
+        upstream = mock.Mock(status_code=200, iter_lines=iter_lines)
+        with mock.patch("chatbot.views.requests.post", return_value=upstream):
+            response = self.chat("stream/")
+        self.assertTrue(response.is_async)
+
+        async def consume():
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+            finished_early = finish.is_set()
+            finish.set()
+            return first, finished_early, [chunk async for chunk in chunks]
+
+        first, finished_early, rest = async_to_sync(consume)()
+        self.assertIn(b"Arsenal", first)
+        self.assertFalse(finished_early)
+        self.assertEqual(len(rest), 1)
+        upstream.close.assert_called_once()
+        self.assertEqual(ChatHistory.objects.get(parent=self.chat_class).bot_message, "Arsenal won.")
+
+
+class FakeUpstream:
+    """The AI service's /chat/ws: ready on connect, then one answer per message."""
+
+    def __init__(self):
+        self.frames = []
+        self.confirmed = []
+
+    async def send(self, data):
+        frame = json.loads(data)
+        if frame.get("type") == "message":
+            self.frames = [json.dumps({"type": "done", "response": "Arsenal won.", "turn_id": None})]
+        elif frame.get("type") == "turns":
+            self.confirmed.extend(frame["turns"])
+
+    async def recv(self):
+        return json.dumps({"type": "ready"})
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.frames:
+            raise StopAsyncIteration
+        return self.frames.pop(0)
+
+    async def close(self):
+        pass
+
+
+class ChatConsumerTests(TransactionTestCase):
+    # Consumers reach the database from worker threads, outside a test transaction
+    def setUp(self):
+        self.user = User.objects.create(email="fan@example.com", username="fan", is_active=True)
+        self.chat_class = ChatClass.objects.create(user=self.user)
+
+    async def open_socket(self, upstream=None):
+        async def connect(url):
+            return upstream or FakeUpstream()
+
+        path = f"/ws/c/chatbot/{self.chat_class.id}/?token={AccessToken.for_user(self.user)}"
+        socket = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        with mock.patch("chatbot.consumers.connect", connect):
+            connected, _ = await socket.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await socket.receive_json_from())["type"], "ready")
+        return socket
+
+    def test_free_limit_is_shared_across_sockets(self):
+        FreeLimit.objects.filter(user=self.user).update(limit=5)
+
+        async def scenario():
+            first, second = await self.open_socket(), await self.open_socket()
+            await first.send_json_to({"message": "who won?"})
+            answer = await first.receive_json_from()
+            # The first socket's turn used up the limit for the second one too
+            await second.send_json_to({"message": "who won?"})
+            refused = await second.receive_json_from()
+            await first.disconnect()
+            await second.disconnect()
+            return answer, refused
+
+        answer, refused = async_to_sync(scenario)()
+        self.assertEqual(answer["type"], "done")
+        self.assertEqual((refused["type"], refused["status"]), ("error", 400))
+
+    def test_stored_turns_are_confirmed_upstream(self):
+        upstream = FakeUpstream()
+
+        async def scenario():
+            socket = await self.open_socket(upstream)
+            await socket.send_json_to({"message": "who won?"})
+            await socket.receive_json_from()
+            await socket.disconnect()
+
+        async_to_sync(scenario)()
+        stored = ChatHistory.objects.get(parent=self.chat_class)
+        [confirmed] = upstream.confirmed
+        self.assertEqual(confirmed["user_message"], "who won?")
+        self.assertEqual(confirmed["bot_message"], "Arsenal won.")
+        self.assertEqual(parse_datetime(confirmed["created_at"]), stored.created_at)
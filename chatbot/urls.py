@@ -1,19 +1,27 @@
 from django.urls import path
 from .views import (
     ChatbotView,
+    ChatbotStreamView,
     ChatbotHistoryView,
     ChatclassListView,
     CreateChatClassView,
     ChatbotSavedView,
     EexportChatHistory,
     ChatbotListView,
+    ChatSummaryView,
+    ChatHistoryBulkView,
+    MemoryTurnsView,
 )
 
 urlpatterns = [
     path("chatbot/<uuid:session_id>/", ChatbotView.as_view()),
+    path("chatbot/<uuid:session_id>/stream/", ChatbotStreamView.as_view()),
     path("chatclass/", ChatclassListView.as_view()),
     path("create-chat-class/", CreateChatClassView.as_view()),
+    path("chat-history/bulk/", ChatHistoryBulkView.as_view()),
     path("chat-history/<uuid:pk>/", ChatbotHistoryView.as_view()),
+    path("chat-summary/<uuid:pk>/", ChatSummaryView.as_view()),
+    path("memory-turns/<uuid:user_id>/", MemoryTurnsView.as_view()),
     path("chat-save/<uuid:session_id>/", ChatbotSavedView.as_view()),
     path("save-list/", ChatbotListView.as_view()),
     path("export-chat-history/<uuid:class_id>/", EexportChatHistory.as_view()),
@@ -1,10 +1,13 @@
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions, generics
 from django.contrib.auth import get_user_model
-from django.http import FileResponse, Http404
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db.models import F
+from django.utils.dateparse import parse_datetime
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
@@ -16,70 +19,214 @@ from .serializers import (
     ChatClassSerializer,
     ChatClassCreateSerializer,
     ChatbotSaveSerializer,
-    ChatbotListSerializer
+    ChatbotListSerializer,
+    ChatSummarySerializer,
+    ChatContextTurnSerializer,
+    ChatHistoryBulkSerializer,
+    MemoryTurnSerializer,
 )
+from .permissions import IsAIService
 import requests
+import json
 
 User = get_user_model()
 
+def _active_subscription(user):
+    return Subscription.objects.filter(user=user).order_by('-start_date').first()
+
+def _free_limit_reached(user, active_sub):
+    return FreeLimit.objects.filter(user=user).first().limit > 5 and active_sub.subscription_type == 'free'
+
+def _overloaded_response(upstream):
+    """Pass the AI service's load-shedding 429 (and Retry-After) through."""
+    response = Response({"detail": "SportMate is busy, please retry shortly."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    if "Retry-After" in upstream.headers:
+        response["Retry-After"] = upstream.headers["Retry-After"]
+    return response
+
+def _unavailable_response():
+    """The AI service did not answer within FASTAPI_READ_TIMEOUT (or connect in time)."""
+    return Response({"detail": "SportMate is busy, please retry shortly."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+def _fastapi_timeout():
+    return (settings.FASTAPI_CONNECT_TIMEOUT, settings.FASTAPI_READ_TIMEOUT)
+
+def _bearer_token(request):
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        return None
+    return auth_header.split(" ")[1]
+
+def _fastapi_payload(user, active_sub, chat_class, message, jwt_token):
+    """
+    Chat request for the AI service (schema v2). The rolling summary, the
+    turns after it and the user's profile travel inline so FastAPI does not
+    have to call back into Django for them.
+    """
+    turns = chat_class.chathistory_set.order_by('-created_at')
+    if chat_class.summary_until:
+        turns = turns.filter(created_at__gt=chat_class.summary_until)
+    turns = list(turns[:settings.CHAT_CONTEXT_MAX_TURNS])[::-1]
+
+    return {
+        "schema_version": 2,
+        "message": message,
+        "session_id": str(chat_class.id),  # Convert UUID to string
+        "user_id": str(user.id),
+        "access_token": jwt_token,  # 👈 Pass JWT to FastAPI
+        "plan": active_sub.subscription_type.upper() if active_sub else "FREE",
+        "history": ChatContextTurnSerializer(turns, many=True).data,
+        "summary": chat_class.summary,
+        "summary_until": chat_class.summary_until.isoformat() if chat_class.summary_until else None,
+        "profile": {
+            "favorite_sport": user.favorite_sport,
+            "details": user.details,
+        },
+    }
+
+def _record_turn(user, chat_class, user_message, bot_message, turn_id=None):
+    fields = {
+        "parent": chat_class,  # Reference to ChatClass
+        "user": user,
+        "user_message": user_message,
+        "bot_message": bot_message,
+    }
+    if turn_id:
+        # The AI service may already have mirrored this turn under turn_id
+        turn, _ = ChatHistory.objects.get_or_create(id=turn_id, defaults=fields)
+    else:
+        turn = ChatHistory.objects.create(**fields)
+
+    # Increment the free limit
+    FreeLimit.objects.filter(user=user).update(limit=F('limit') + 1)
+    return turn
+
 class ChatbotView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, session_id=None):
         user = request.user
-        active_sub = Subscription.objects.filter(user=user).order_by('-start_date').first()
+        active_sub = _active_subscription(user)
 
         # Check if user has reached their free limit
-        if FreeLimit.objects.filter(user=user).first().limit > 5 and active_sub.subscription_type == 'free':
+        if _free_limit_reached(user, active_sub):
             return Response({"detail": "You have reached your free limit."}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = ChatbotSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
         # 👇 Extract the JWT token from the request headers
-        auth_header = request.headers.get("Authorization", "")
-        if not auth_header.startswith("Bearer "):
+        jwt_token = _bearer_token(request)
+        if jwt_token is None:
             return Response({"detail": "Invalid token header."}, status=400)
 
-        jwt_token = auth_header.split(" ")[1]
+        # Only the user's own session; its history goes into the prompt
+        chat_class = get_object_or_404(ChatClass, id=session_id, user=user)
 
-        fastapi_url = "http://127.0.0.1:8011/chat"
-        print(request.user.id)
-        payload = {
-            "message": serializer.validated_data['message'],
-            "session_id": str(session_id),  # Convert UUID to string
-            "user_id": 1,  # Convert UUID to string
-            "access_token": jwt_token  # 👈 Pass JWT to FastAPI
-        }
+        fastapi_url = f"{settings.FASTAPI_BASE}/chat"
+        payload = _fastapi_payload(user, active_sub, chat_class, serializer.validated_data['message'], jwt_token)
 
         headers = {"Content-Type": "application/json"}
 
         try:
-            response = requests.post(fastapi_url, json=payload, headers=headers)
+            response = requests.post(fastapi_url, json=payload, headers=headers, timeout=_fastapi_timeout())
+        except requests.Timeout:
+            return _unavailable_response()
         except requests.RequestException:
             return Response({"detail": "Failed to connect to FastAPI."}, status=status.HTTP_502_BAD_GATEWAY)
 
         if response.status_code == 200:
-            bot_response = response.json().get("response", "")
+            data = response.json()
+            bot_response = data.get("response", "")
 
-            # Assuming session_id corresponds to a ChatClass object
-            chat_class = ChatClass.objects.get(id=session_id)
+            _record_turn(user, chat_class, serializer.validated_data['message'], bot_response, data.get("turn_id"))
 
-            # Now create the ChatHistory object
-            ChatHistory.objects.create(
-                parent=chat_class,  # Reference to ChatClass
-                user=user,
-                user_message=serializer.validated_data['message'],
-                bot_message=bot_response
-            )
+            return Response({"response": bot_response}, status=status.HTTP_200_OK)
 
+        if response.status_code == 429:
+            return _overloaded_response(response)
 
-            # Increment the free limit
-            FreeLimit.objects.filter(user=user).update(limit=F('limit') + 1)
+        return Response({"detail": "Error from FastAPI."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            return Response({"response": bot_response}, status=status.HTTP_200_OK)
+class ChatbotStreamView(APIView):
+    """
+    Relays the FastAPI `/chat/stream` Server-Sent-Events to the client as
+    they arrive and stores the finished turn once the `done` event is seen.
 
-        return Response({"detail": "Error from FastAPI."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    The relay is an async generator: served over ASGI (daphne), Django
+    buffers a sync streaming body whole. Upstream lines are still read with
+    `requests`, one at a time in a worker thread.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, session_id=None):
+        user = request.user
+        active_sub = _active_subscription(user)
+
+        if _free_limit_reached(user, active_sub):
+            return Response({"detail": "You have reached your free limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ChatbotSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        jwt_token = _bearer_token(request)
+        if jwt_token is None:
+            return Response({"detail": "Invalid token header."}, status=400)
+
+        chat_class = get_object_or_404(ChatClass, id=session_id, user=user)
+        message = serializer.validated_data['message']
+        payload = _fastapi_payload(user, active_sub, chat_class, message, jwt_token)
+
+        try:
+            upstream = requests.post(
+                f"{settings.FASTAPI_BASE}/chat/stream",
+                json=payload,
+                headers={"Accept": "text/event-stream"},
+                stream=True,
+                timeout=_fastapi_timeout(),
+            )
+        except requests.Timeout:
+            return _unavailable_response()
+        except requests.RequestException:
+            return Response({"detail": "Failed to connect to FastAPI."}, status=status.HTTP_502_BAD_GATEWAY)
+
+        if upstream.status_code == 429:
+            upstream.close()
+            return _overloaded_response(upstream)
+
+        if upstream.status_code != 200:
+            upstream.close()
+            return Response({"detail": "Error from FastAPI."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        async def relay():
+            lines = upstream.iter_lines(decode_unicode=True)
+            next_line = sync_to_async(next, thread_sensitive=False)
+            bot_response = None
+            turn_id = None
+            try:
+                while (line := await next_line(lines, None)) is not None:
+                    if not line or not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    if event.get("type") == "done":
+                        bot_response = event.get("response", "")
+                        turn_id = event.get("turn_id")
+                    yield f"{line}\n\n"
+            except requests.RequestException:
+                # Includes a stream that stalls past FASTAPI_READ_TIMEOUT
+                error = {"type": "error", "detail": "Lost connection to FastAPI."}
+                yield f"data: {json.dumps(error)}\n\n"
+            finally:
+                upstream.close()
+
+            # Only completed answers are persisted and counted
+            if bot_response is not None:
+                await sync_to_async(_record_turn)(user, chat_class, message, bot_response, turn_id)
+
+        response = StreamingHttpResponse(relay(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
 
 class CreateChatClassView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -101,10 +248,86 @@ class ChatbotHistoryView(APIView):
 
     def get(self, request, pk=None):
         chat_class = get_object_or_404(ChatClass, id=pk)
-        histories = chat_class.chathistory_set.all()  # or use 'chat_class.histories.all()' if you set related_name
+        histories = chat_class.chathistory_set.order_by('created_at')  # or use 'chat_class.histories' if you set related_name
+
+        # ?after=<created_at> returns only the turns stored after that point,
+        # so the AI service can top up its cached copy of the session
+        after = request.query_params.get('after')
+        if after:
+            after_dt = parse_datetime(after)
+            if after_dt is None:
+                return Response({"detail": "Invalid 'after' timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+            histories = histories.filter(created_at__gt=after_dt)
+
         serializer = ChatHistorySerializer(histories, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class ChatHistoryBulkView(APIView):
+    """
+    Batched chat turns mirrored by the AI service's write-behind queue.
+    Turns keep the id the AI service gave them, so a turn that was already
+    stored by ChatbotView (or an earlier retry) is skipped.
+    """
+    authentication_classes = []
+    permission_classes = [IsAIService]
+
+    def post(self, request):
+        serializer = ChatHistoryBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        turns = serializer.validated_data['turns']
+
+        chat_classes = ChatClass.objects.in_bulk({turn['session_id'] for turn in turns})
+        rows = [
+            ChatHistory(
+                id=turn['id'],
+                parent=chat_classes[turn['session_id']],
+                user_id=chat_classes[turn['session_id']].user_id,
+                user_message=turn['user_message'],
+                bot_message=turn['bot_message'],
+            )
+            for turn in turns
+            if turn['session_id'] in chat_classes
+        ]
+        ChatHistory.objects.bulk_create(rows, ignore_conflicts=True)
+
+        return Response({"received": len(turns), "accepted": len(rows)}, status=status.HTTP_200_OK)
+
+class MemoryTurnsView(APIView):
+    """
+    A user's turns across all their chat sessions, oldest first, for the AI
+    service's long-term memory index. Without `?after=` the latest `limit`
+    turns are returned; with it, the first `limit` turns stored after that
+    point, so the index can be topped up.
+    """
+    authentication_classes = []
+    permission_classes = [IsAIService]
+
+    def get(self, request, user_id):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 500)), 1), 5000)
+        except ValueError:
+            limit = 500
+
+        turns = ChatHistory.objects.filter(user_id=user_id)
+        after = request.query_params.get('after')
+        if after:
+            after_dt = parse_datetime(after)
+            if after_dt is None:
+                return Response({"detail": "Invalid 'after' timestamp."}, status=status.HTTP_400_BAD_REQUEST)
+            turns = list(turns.filter(created_at__gt=after_dt).order_by('created_at')[:limit])
+        else:
+            turns = list(turns.order_by('-created_at')[:limit])[::-1]
+
+        return Response(MemoryTurnSerializer(turns, many=True).data, status=status.HTTP_200_OK)
+
+class ChatSummaryView(generics.RetrieveUpdateAPIView):
+    """Rolling conversation summary the AI service folds older turns into."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ChatSummarySerializer
+
+    def get_queryset(self):
+        return ChatClass.objects.filter(user=self.request.user)
+
 class ChatbotSavedView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
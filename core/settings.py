@@ -27,6 +27,8 @@ ALLOWED_HOSTS = [
 # Application definition
 
 INSTALLED_APPS = [
+    # ASGI runserver, for the chat WebSocket; must precede staticfiles
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -47,6 +49,7 @@ INSTALLED_APPS += [
 INSTALLED_APPS += [
     'rest_framework',
     'corsheaders',
+    'channels',
 ]
 
 MIDDLEWARE = [
@@ -105,6 +108,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+# HTTP plus the chat WebSocket (chatbot/routing.py)
+ASGI_APPLICATION = 'core.asgi.application'
 
 
 # Database
@@ -195,6 +200,18 @@ STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 
+# AI service (ai/main.py)
+FASTAPI_BASE = env("FASTAPI_BASE", default="http://127.0.0.1:8011")
+FASTAPI_WS_BASE = env("FASTAPI_WS_BASE", default=FASTAPI_BASE.replace("http", "ws", 1))
+# Seconds to connect to the AI service, and to wait for its answer (or,
+# when streaming, for its next event); above its TURN_DEADLINE
+FASTAPI_CONNECT_TIMEOUT = env.float("FASTAPI_CONNECT_TIMEOUT", default=3.0)
+FASTAPI_READ_TIMEOUT = env.float("FASTAPI_READ_TIMEOUT", default=75.0)
+# Most unsummarised turns pushed along with each chat request
+CHAT_CONTEXT_MAX_TURNS = env.int("CHAT_CONTEXT_MAX_TURNS", default=50)
+# Shared secret the AI service sends on service-to-service calls
+AI_SERVICE_TOKEN = env("AI_SERVICE_TOKEN", default="")
+
 # email settings
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = env("SMTP_HOST")